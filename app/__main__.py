@@ -0,0 +1,27 @@
+# app/__main__.py
+"""
+Avvio del servizio: `python -m app`.
+
+Con WEB_WORKERS > 1 (0 = una per CPU) uvicorn avvia più processi; ognuno ha il proprio
+client Motor (pool MONGO_*) e solo uno esegue sweeper e relay (BACKGROUND_TASKS).
+Gli eventi SSE tra worker richiedono i change stream (replica set): EVENTS_SOURCE=in_process
+vale solo con WEB_WORKERS=1.
+"""
+import uvicorn
+
+from app.core.config import settings
+from app.core.workers import default_workers
+
+
+def main() -> None:
+    uvicorn.run(
+        "app.main:app",
+        host=settings.web_host,
+        port=settings.web_port,
+        workers=settings.web_workers or default_workers(),
+        timeout_graceful_shutdown=settings.web_graceful_shutdown_seconds,
+    )
+
+
+if __name__ == "__main__":
+    main()
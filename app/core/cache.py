@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache in-process LRU con scadenza (TTL), pensata per un singolo event loop asyncio.
+
+    - le entry possono avere dei "tag" per invalidazioni mirate (es. tutte le liste di un utente);
+    - get_or_load fa single-flight: miss concorrenti sulla stessa chiave eseguono un solo loader;
+    - un valore caricato mentre la chiave veniva invalidata non viene salvato (niente dati stantii).
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, Tuple[Hashable, ...]]]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def get(self, key: Hashable) -> Any:
+        """Ritorna il valore in cache oppure _MISSING (non aggiorna i contatori)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: Iterable[Hashable] = (),
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        if key in self._data:
+            self._remove(key)
+        tags = tuple(tags)
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        self._data[key] = (self._clock() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_entries:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._generation += 1
+        self._remove(key)
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        self._generation += 1
+        for key in self._tags.pop(tag, set()):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._data.clear()
+        self._tags.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Optional[Callable[[Any], Iterable[Hashable]]] = None,
+    ) -> Any:
+        value = self.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # un'altra richiesta sta già caricando questa chiave: aspettiamo il suo risultato
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # evita il warning "exception was never retrieved" senza waiter
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if generation == self._generation:
+            self.set(key, value, tags(value) if tags else ())
+        future.set_result(value)
+        return value
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -1,15 +1,85 @@
 import os
+from typing import Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     env: str = os.getenv("ENV", "unit-test")
     jwt_algorithm: str
-    jwt_public_key: str 
+    jwt_public_key: str = ""   # vuota se si usa solo il JWKS
+    jwt_jwks_file: Optional[str] = None
+    jwt_cache_max_entries: int = 10_000
+    jwt_cache_max_ttl_seconds: float = 300
+    jwt_jwks_min_reload_seconds: float = 5   # intervallo minimo tra due ricariche del JWKS (kid sconosciuti)
     mongo_uri: str
     mongo_db_name: str
+    # pool Motor per processo: con N worker le connessioni verso Mongo sono fino a N * max_pool_size
+    mongo_max_pool_size: int = 50
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = None
     rabbitmq_username: str
     rabbitmq_password: str
     rabbitmq_url: str
+    rabbitmq_channel_pool_size: int = 4
+    rabbitmq_publish_timeout: float = 5.0
+    rabbitmq_fail_fast: bool = True
+    storage_backend: str = "mongo"      # "mongo" | "memory" (dev/CI/benchmark, nessuna persistenza)
+    students_storage: str = "embedded"  # "embedded" (campo students) | "members" (collection assignment_members)
+    content_offload_bytes: int = 0      # content >= soglia in GridFS (solo mongo); 0 = sempre nel documento
+    web_host: str = "0.0.0.0"
+    web_port: int = 5050
+    web_workers: int = 1                # 0 = una per CPU disponibile
+    web_graceful_shutdown_seconds: int = 10  # poi le connessioni aperte (es. stream SSE) vengono chiuse
+    background_tasks: str = "auto"      # "auto" (un solo worker, via lock) | "always" | "never"
+    background_lock_file: str = "/tmp/assignment-service.background.lock"
+    # "blocking": indici e RabbitMQ pronti prima di servire (storico); "background": si serve subito,
+    # indici/broker/change stream in background e readiness senza RabbitMQ
+    startup_mode: str = "blocking"
+    events_enabled: bool = True
+    events_source: str = "auto"         # "auto" | "change_stream" (replica set) | "in_process" (solo WEB_WORKERS=1)
+    events_queue_size: int = 256        # eventi in coda per client SSE prima del "reset"
+    events_replay_size: int = 1024      # eventi recenti rigiocabili con Last-Event-ID
+    events_heartbeat_seconds: float = 15
+    export_batch_size: int = 500
+    batch_max_items: int = 1000
+    accept_legacy_assignment_ids: bool = True
+    metrics_enabled: bool = True
+    health_interval_seconds: float = 5.0
+    health_timeout_seconds: float = 2.0
+    health_max_sweep_lag_seconds: float = 300
+    # cache delle letture per processo: invalidata solo dalle scritture dello stesso processo, quindi
+    # con più repliche/worker stato e dettaglio possono restare vecchi fino a cache_ttl_seconds
+    cache_enabled: bool = False
+    cache_ttl_seconds: float = 5.0
+    cache_max_entries: int = 10_000
+    sweep_mode: str = "poll"            # "poll" | "timer"
+    sweep_interval_seconds: float = 30  # in modalità timer è l'intervallo di riconciliazione
+    sweep_timer_preload: int = 1000
+    sweep_batch_size: int = 500
+    sweep_publish_concurrency: int = 32
+    sweep_lease_ttl_seconds: float = 90
+    outbox_batch_size: int = 100
+    outbox_poll_seconds: float = 1.0
+    outbox_claim_seconds: float = 30
+    outbox_retry_base_seconds: float = 2
+
+    @model_validator(mode="after")
+    def _require_jwt_key(self) -> "Settings":
+        # senza chiave né JWKS il servizio partirebbe rifiutando ogni richiesta: meglio fallire qui
+        if not self.jwt_public_key and not self.jwt_jwks_file:
+            raise ValueError("Impostare JWT_PUBLIC_KEY oppure JWT_JWKS_FILE")
+        return self
+
+    @model_validator(mode="after")
+    def _single_worker_events(self) -> "Settings":
+        # gli eventi in-process arrivano solo ai client SSE del worker che ha fatto la scrittura
+        if self.events_enabled and self.events_source == "in_process" and self.web_workers != 1:
+            raise ValueError("EVENTS_SOURCE=in_process richiede WEB_WORKERS=1: con più worker usare i change stream")
+        return self
 
     class Config:
         env_file = None  # nessun file .env, solo ENV
@@ -1,6 +1,13 @@
+from typing import TYPE_CHECKING, Optional
 from fastapi import Request
 from app.database.assignment_repo import AssignmentRepo
-from app.services.publisher_service import AssignmentPublisher
+from app.services.event_bus import AssignmentEventBus
+from app.services.health_service import HealthMonitor
+from app.services.outbox_service import OutboxRelay
+from app.services.sweeper_service import DeadlineSweeper
+
+if TYPE_CHECKING:  # aio_pika si importa solo nel worker che pubblica
+    from app.services.publisher_service import AssignmentPublisher
 
 def get_repository(request: Request) -> AssignmentRepo:
     repo = getattr(request.app.state, "assignment_repo", None)
@@ -8,8 +15,27 @@ def get_repository(request: Request) -> AssignmentRepo:
         raise RuntimeError("Repository non inizializzato")
     return repo
 
-def get_publisher(request: Request) -> AssignmentPublisher:
+def get_publisher(request: Request) -> "AssignmentPublisher":
     publisher = getattr(request.app.state, "assignment_publisher", None)
     if publisher is None:
         raise RuntimeError("Publiscer non inizializzato")
-    return publisher
\ No newline at end of file
+    return publisher
+
+def get_sweeper(request: Request) -> Optional[DeadlineSweeper]:
+    # opzionale: serve solo a notificare le nuove deadline allo scheduler
+    return getattr(request.app.state, "deadline_sweeper", None)
+
+
+def get_health_monitor(request: Request) -> Optional[HealthMonitor]:
+    # None finché il lifespan non l'ha avviato: la readiness risponde 503
+    return getattr(request.app.state, "health_monitor", None)
+
+
+def get_outbox_relay(request: Request) -> Optional[OutboxRelay]:
+    # opzionale: serve solo a svegliare il relay appena viene scritto un evento
+    return getattr(request.app.state, "outbox_relay", None)
+
+
+def get_event_bus(request: Request) -> Optional[AssignmentEventBus]:
+    # None se gli eventi SSE sono disattivati (EVENTS_ENABLED=false)
+    return getattr(request.app.state, "event_bus", None)
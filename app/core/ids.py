@@ -0,0 +1,70 @@
+import os
+import re
+import threading
+import time
+
+# Crockford base32: niente I, L, O, U
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+ASSIGNMENT_ID_PREFIX = "as-"
+_ULID_ID = re.compile(rf"^{ASSIGNMENT_ID_PREFIX}[0-9A-HJKMNP-TV-Z]{{26}}$")
+_LEGACY_ID = re.compile(rf"^{ASSIGNMENT_ID_PREFIX}\d{{5}}$")
+
+
+class _MonotonicULID:
+    """
+    Generatore ULID (48 bit di timestamp in ms + 80 bit casuali).
+    Nello stesso millisecondo la parte casuale viene incrementata, quindi gli ID generati
+    da un processo sono strettamente crescenti anche in ordine lessicografico.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._last_random += 1
+                if self._last_random > _RANDOM_MAX:
+                    # overflow (2^80 ID nello stesso ms): passiamo al millisecondo successivo
+                    now_ms += 1
+                    self._last_random = int.from_bytes(os.urandom(10), "big")
+            else:
+                self._last_random = int.from_bytes(os.urandom(10), "big")
+            self._last_ms = now_ms
+            value = (now_ms << _RANDOM_BITS) | self._last_random
+
+        chars = []
+        for _ in range(26):
+            chars.append(_ALPHABET[value & 0x1F])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+_generator = _MonotonicULID()
+
+
+def new_ulid() -> str:
+    return _generator.new()
+
+
+def new_assignment_id() -> str:
+    """ID ordinato nel tempo e senza collisioni: `as-` + ULID (26 caratteri)."""
+    return f"{ASSIGNMENT_ID_PREFIX}{new_ulid()}"
+
+
+def is_legacy_assignment_id(value: str) -> bool:
+    """Vecchio formato `as-XXXXX` (5 cifre casuali)."""
+    return bool(_LEGACY_ID.match(value))
+
+
+def is_valid_assignment_id(value: str, accept_legacy: bool = True) -> bool:
+    if _ULID_ID.match(value):
+        return True
+    return accept_legacy and is_legacy_assignment_id(value)
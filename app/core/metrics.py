@@ -0,0 +1,203 @@
+# app/core/metrics.py
+"""
+Metriche in-process esposte in formato testo Prometheus (nessuna dipendenza esterna).
+
+Le osservazioni costano un bisect sui bucket e qualche somma, senza lock: tutto gira
+nello stesso event loop. Il rendering avviene solo quando Prometheus interroga /metrics.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# bucket in secondi: da 0.5 ms (cache hit) fino a 10 s (timeout di publish/sweep lunghi)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per serie: [conteggi per bucket (non cumulativi) + overflow, somma, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def time(self, *labels: str) -> "_Timer":
+        """Context manager che osserva la durata del blocco."""
+        return _Timer(self, labels)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = _labels(self.labelnames, labels, f'le="{_fmt(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            base = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{base} {_fmt(total)}"
+            yield f"{self.name}_count{base} {count}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """Insieme di metriche più gauge calcolati al momento dello scrape (es. statistiche delle cache)."""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._gauges: Dict[str, Tuple[str, str, Callable[[], Dict[str, float]]]] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help: str, label: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """Gauge letto a ogni scrape: `fn` ritorna {valore_label: valore}. Una nuova registrazione sostituisce la precedente."""
+        self._gauges[name] = (help, label, fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, (help, label, fn) in self._gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in fn().items():
+                lines.append(f'{name}{{{label}="{_escape(key)}"}} {_fmt(value)}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latenza delle richieste HTTP per route.", ("method", "route", "status")
+)
+REPO_CALL_SECONDS = REGISTRY.histogram(
+    "assignment_repo_call_duration_seconds", "Latenza dei metodi del repository MongoDB.", ("method", "outcome")
+)
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "assignment_publish_duration_seconds", "Latenza di un publish RabbitMQ fino alla conferma.", ("outcome",)
+)
+SWEEP_SECONDS = REGISTRY.histogram(
+    "deadline_sweep_duration_seconds", "Durata di una passata dello sweeper delle deadline.",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+SWEEP_TRANSITIONED = REGISTRY.counter(
+    "deadline_sweep_transitioned_total", "Assignment chiusi dallo sweeper."
+)
+SWEEP_PUBLISH_FAILURES = REGISTRY.counter(
+    "deadline_sweep_publish_failures_total", "Eventi di chiusura non confermati da RabbitMQ."
+)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (niente BaseHTTPMiddleware: nessun task o stream aggiuntivo per richiesta).
+    Misura solo i path con `prefix`, etichettando con il template della route per tenere bassa la cardinalità.
+    """
+
+    def __init__(self, app, prefix: str = "/api/v1/assignments", histogram: Optional[Histogram] = None):
+        self.app = app
+        self.prefix = prefix
+        self.histogram = histogram or HTTP_REQUEST_SECONDS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.histogram.observe(time.perf_counter() - start, scope["method"], route, status)
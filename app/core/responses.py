@@ -0,0 +1,45 @@
+from typing import Any, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse che serializza con pydantic-core (modelli, datetime, ecc.) senza passare
+    da jsonable_encoder/json.dumps. Se il contenuto è già in bytes viene inviato così com'è.
+    Restituirla da un endpoint bypassa anche la validazione del response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return to_json(content)
+
+
+def parse_byte_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    Intervallo (inizio, fine inclusa) di un header `Range: bytes=...` su `length` byte.
+    None = risposta intera (header assente, non interpretabile o con più intervalli);
+    ValueError se l'intervallo non è soddisfacibile (416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not sep or not (first or last):
+        return None
+    if not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None  # anche più intervalli ("0-1,5-9"): si risponde con tutto il contenuto
+    if not first:
+        suffix = int(last)  # bytes=-N: ultimi N byte
+        if suffix == 0 or length == 0:
+            raise ValueError("Intervallo non soddisfacibile")
+        return max(0, length - suffix), length - 1
+    start = int(first)
+    if last and start > int(last):
+        return None
+    end = int(last) if last else length - 1
+    if start >= length:
+        raise ValueError("Intervallo non soddisfacibile")
+    return start, min(end, length - 1)
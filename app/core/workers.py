@@ -0,0 +1,70 @@
+# app/core/workers.py
+"""
+Ruoli dei processi in modalità multi-worker (uvicorn --workers N).
+
+Ogni worker serve HTTP; uno solo per pod ("background") esegue anche sweeper delle deadline
+e relay dell'outbox, e quindi è l'unico ad aprire la connessione RabbitMQ. Il ruolo si ottiene
+con un lock esclusivo su file: il kernel lo rilascia se il processo muore e il worker che
+uvicorn riavvia al suo posto lo riprende all'avvio. Tra pod diversi resta il lease su Mongo.
+"""
+import logging
+import os
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: nessun coordinamento tra processi
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_MODES = ("auto", "always", "never")
+
+
+class BackgroundRole:
+    """Ruolo "background" di questo processo; `release()` libera il lock (anche implicito all'uscita)."""
+
+    def __init__(self, handle: Optional[IO] = None):
+        self._handle = handle
+
+    def release(self) -> None:
+        if self._handle is not None:
+            self._handle.close()  # chiudere il file rilascia il flock
+            self._handle = None
+
+
+def claim_background_role(mode: str, lock_file: str) -> Optional[BackgroundRole]:
+    """
+    - "always": ogni processo esegue i task di background (single-process, comportamento storico);
+    - "never":  solo HTTP (es. deployment separato per sweeper/relay);
+    - "auto":   il primo processo che ottiene il lock su `lock_file`.
+    Ritorna None se questo processo non deve eseguire i task di background.
+    """
+    if mode not in BACKGROUND_MODES:
+        raise ValueError(f"Modalità dei task di background non valida: {mode}")
+    if mode == "never":
+        return None
+    if mode == "always" or fcntl is None:
+        return BackgroundRole()
+
+    handle = open(lock_file, "a+")
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        logger.info("Task di background già in carico a un altro worker (%s): solo HTTP.", lock_file)
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    logger.info("Worker %s designato per sweeper e relay dell'outbox.", os.getpid())
+    return BackgroundRole(handle)
+
+
+def default_workers() -> int:
+    """CPU effettivamente assegnate al processo (rispetta affinity/cpuset del container)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
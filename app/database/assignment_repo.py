@@ -1,14 +1,35 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import List, Sequence, Optional, Tuple
-from app.schemas.assignment import Assignment, AssignmentCreate
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, List, Sequence, Optional, Tuple
+from app.database.content_repo import ContentBlob
+from app.schemas.assignment import Assignment, AssignmentCreate, AssignmentStats, AssignmentView
+from app.schemas.events import AssignmentStatusEvent
+
+# posizione di keyset pagination: (createdAt, assignmentId) dell'ultimo elemento visto
+PageKey = Tuple[datetime, str]
+# impronta di una pagina per gli ETag: (numero di elementi, somma delle version, updatedAt più recente,
+# assignmentId della finestra): gli ID distinguono una delete da una modifica che lascia uguali le somme
+PageStamp = Tuple[int, int, Optional[datetime], List[str]]
+# eventi da accodare per ogni assignment cancellato / spostato, nella stessa scrittura che lo modifica
+DeletedEvent = Callable[[str], AssignmentStatusEvent]
+ShiftedEvent = Callable[[str, datetime], AssignmentStatusEvent]
+# campi che bastano a pubblicare un evento SSE: chi lo riceve (teacher + roster) e lo stato
+AUDIENCE_FIELDS = ("assignmentId", "teacherId", "students", "status")
 
 class AssignmentRepo(ABC):
     @abstractmethod
-    async def create(self, data: AssignmentCreate) -> str:
-        """Crea un assignment e ritorna l'ID generato."""
+    async def create(self, data: AssignmentCreate, events: Sequence[AssignmentStatusEvent] = ()) -> str:
+        """Crea un assignment e, nella stessa operazione, accoda `events` nell'outbox. Ritorna l'ID."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        """Inserisce più assignment in un'unica scrittura non ordinata e accoda gli eventi di quelli inseriti.
+        Ritorna, allineato ad `assignments`, None se inserito oppure il messaggio d'errore."""
         raise NotImplementedError
 
     @abstractmethod
@@ -21,18 +42,158 @@ class AssignmentRepo(ABC):
         """Ritorna gli assignment per un dato studente."""
         raise NotImplementedError
 
+    @abstractmethod
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        """Ritorna una pagina di assignment del teacher ordinata per (createdAt, assignmentId),
+        partendo dopo `after` e proiettando solo `fields` (None = tutti i campi)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        """Come find_page_for_teacher, per gli assignment di uno studente."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        """Itera (async generator) i documenti grezzi del teacher man mano che arrivano dal cursore."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        """Come iter_for_teacher, per gli assignment di uno studente."""
+        raise NotImplementedError
+
     @abstractmethod
     async def find_one(self, assignment_id: str) -> Optional[Assignment]:
         """Ritorna un assignment per ID, oppure None se non esiste."""
         raise NotImplementedError
 
     @abstractmethod
-    async def delete(self, assignment_id: str) -> bool:
-        """Cancella un assignment. Ritorna True se qualcosa è stato cancellato."""
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        """Solo AUDIENCE_FIELDS degli assignment esistenti tra quelli indicati (ordine non garantito)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        """Assignment per ID solo se appartiene al teacher (controllo nella query), altrimenti None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        """Assignment per ID solo se lo studente è assegnato; `students` contiene solo lo studente stesso."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        """Solo la `version` dell'assignment del teacher (None se non c'è match): niente documento da leggere."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        """Solo la `version` dell'assignment se lo studente è assegnato (None altrimenti)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        """Impronta della stessa finestra di find_page_for_teacher, calcolata sull'indice."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        """Impronta della stessa finestra di find_page_for_student."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        """Contatori del teacher (aggiornati da create/delete/sweep), scaduti e prime `upcoming` deadline aperte."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rebuild_stats(self) -> int:
+        """Ricalcola da zero i contatori di tutti i teacher (riconciliazione); ritorna i teacher ricalcolati."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        """Contenuto salvato fuori dal documento (contentRef); None se non c'è."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, assignment_id: str) -> bool:
+        """Probe economico (solo indice) per distinguere 403 da 404."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        """Cancella un assignment e, se c'era, accoda `deleted_event(id)` nell'outbox nella stessa operazione.
+        Ritorna True se qualcosa è stato cancellato."""
         raise NotImplementedError
     
     @abstractmethod
-    async def update_assignment_state(self, ts: datetime) -> List[str]:
-        """Aggiorna lo stato degli assignment presenti nel database se la sua deadline è minore a now, 
-        ritorna il numero di aggiornamente effettuati"""
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        """Cancella gli assignment del teacher (tutti, o solo `assignment_ids`) accodando `deleted_event`
+        per ognuno insieme al blocco che lo cancella. Ritorna gli ID cancellati."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        """Sposta di `delta` la deadline degli assignment aperti del teacher, accodando
+        `shifted_event(id, nuova deadline)` insieme al blocco aggiornato. Ritorna (ID, nuova deadline)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        """Accoda eventi nell'outbox (pubblicati poi dal relay)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+        """Segna 'completed' (al massimo `limit`) assignment con deadline < ts e ritorna
+        gli ID transizionati da QUESTA chiamata (sicuro con più repliche concorrenti)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        """Deadline più vecchia tra gli assignment scaduti ma non ancora chiusi (lag dello sweeper)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def ping(self) -> None:
+        """Round-trip minimo verso lo storage; solleva eccezione se non raggiungibile."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        """Ritorna (in ordine crescente) le prossime `limit` deadline >= after di assignment non completati."""
         raise NotImplementedError
@@ -0,0 +1,220 @@
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache
+from app.database.assignment_repo import AssignmentRepo, DeletedEvent, PageKey, PageStamp, ShiftedEvent
+from app.database.content_repo import ContentBlob
+from app.schemas.assignment import Assignment, AssignmentStats, AssignmentView
+from app.schemas.events import AssignmentStatusEvent
+
+
+def _user_tag(user_id: str) -> tuple:
+    return ("user", str(user_id))
+
+def _assignment_tag(assignment_id: str) -> tuple:
+    return ("assignment", str(assignment_id))
+
+def _list_tags(user_id: str):
+    # una lista va invalidata sia se cambia qualcosa per l'utente (create)
+    # sia se cambia/sparisce uno degli assignment che contiene (delete, sweep)
+    def tags(items: Sequence) -> List[tuple]:
+        return [_user_tag(user_id), *(_assignment_tag(a.assignmentId) for a in items)]
+    return tags
+
+
+class CachedAssignmentRepository(AssignmentRepo):
+    """
+    Decorator read-through di un AssignmentRepo: mette in cache find_one e le liste per utente
+    (TTL + LRU, single-flight) e invalida su create/delete/update_assignment_state.
+
+    L'invalidazione vede solo le scritture che passano da questo decorator, cioè da questo processo:
+    quelle di altre repliche o di altri worker (incluso lo sweep, che gira in un solo worker)
+    diventano visibili alla scadenza delle entry, quindi con un ritardo massimo di `ttl_seconds`.
+    Per questo è disattivata di default (CACHE_ENABLED).
+    """
+
+    def __init__(self, inner: AssignmentRepo, max_entries: int = 10_000, ttl_seconds: float = 5.0):
+        self.inner = inner
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+    def _invalidate_created(self, assignment: Assignment) -> None:
+        # anche le entry negative (None / exists=False) sono taggate con l'assignment
+        self.cache.invalidate_tag(_assignment_tag(assignment.assignmentId))
+        self.cache.invalidate_tag(_user_tag(assignment.teacherId))
+        for student_id in assignment.students:
+            self.cache.invalidate_tag(_user_tag(student_id))
+
+    async def create(self, assignment: Assignment, events: Sequence[AssignmentStatusEvent] = ()) -> str:
+        inserted_id = await self.inner.create(assignment, events=events)
+        self._invalidate_created(assignment)
+        return inserted_id
+
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        errors = await self.inner.create_many(assignments, events=events)
+        for assignment in assignments:
+            self._invalidate_created(assignment)
+        return errors
+
+    async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
+        return await self.cache.get_or_load(
+            ("teacher", str(teacher_id)),
+            lambda: self.inner.find_for_teacher(teacher_id),
+            _list_tags(teacher_id),
+        )
+
+    async def find_for_student(self, student_id: str) -> Sequence[Assignment]:
+        return await self.cache.get_or_load(
+            ("student", str(student_id)),
+            lambda: self.inner.find_for_student(student_id),
+            _list_tags(student_id),
+        )
+
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        key = ("teacher_page", str(teacher_id), limit, after, tuple(fields) if fields else None)
+        return await self.cache.get_or_load(
+            key,
+            lambda: self.inner.find_page_for_teacher(teacher_id, limit=limit, after=after, fields=fields),
+            _list_tags(teacher_id),
+        )
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        key = ("student_page", str(student_id), limit, after, tuple(fields) if fields else None)
+        return await self.cache.get_or_load(
+            key,
+            lambda: self.inner.find_page_for_student(student_id, limit=limit, after=after, fields=fields),
+            _list_tags(student_id),
+        )
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        # l'export è uno stream: non ha senso tenerlo in cache
+        return self.inner.iter_for_teacher(teacher_id, batch_size=batch_size, fields=fields)
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self.inner.iter_for_student(student_id, batch_size=batch_size, fields=fields)
+
+    async def find_one(self, assignment_id: str) -> Optional[Assignment]:
+        return await self.cache.get_or_load(
+            ("one", str(assignment_id)),
+            lambda: self.inner.find_one(assignment_id),
+            lambda _: [_assignment_tag(assignment_id)],
+        )
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        # letta attorno a una scrittura per pubblicarne l'evento: in cache sarebbe già vecchia
+        return await self.inner.find_audiences(assignment_ids)
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        return await self.cache.get_or_load(
+            ("one_teacher", str(assignment_id), str(teacher_id)),
+            lambda: self.inner.find_one_for_teacher(assignment_id, teacher_id),
+            lambda _: [_assignment_tag(assignment_id)],
+        )
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        return await self.cache.get_or_load(
+            ("one_student", str(assignment_id), str(student_id)),
+            lambda: self.inner.find_one_for_student(assignment_id, student_id),
+            lambda _: [_assignment_tag(assignment_id)],
+        )
+
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        return await self.inner.version_for_teacher(assignment_id, teacher_id)
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        return await self.inner.version_for_student(assignment_id, student_id)
+
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self.inner.page_stamp_for_teacher(teacher_id, limit, after)
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self.inner.page_stamp_for_student(student_id, limit, after)
+
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        return await self.inner.stats_for_teacher(teacher_id, now, upcoming)
+
+    async def rebuild_stats(self) -> int:
+        return await self.inner.rebuild_stats()
+
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        return await self.inner.open_content(content_ref)
+
+    async def exists(self, assignment_id: str) -> bool:
+        return await self.cache.get_or_load(
+            ("exists", str(assignment_id)),
+            lambda: self.inner.exists(assignment_id),
+            lambda _: [_assignment_tag(assignment_id)],
+        )
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        deleted = await self.inner.delete(assignment_id, deleted_event)
+        self.cache.invalidate_tag(_assignment_tag(assignment_id))
+        return deleted
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        deleted = await self.inner.delete_many(teacher_id, assignment_ids, deleted_event)
+        for assignment_id in deleted:
+            self.cache.invalidate_tag(_assignment_tag(assignment_id))
+        return deleted
+
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        shifted = await self.inner.shift_deadlines(teacher_id, delta, assignment_ids, shifted_event)
+        for assignment_id, _ in shifted:
+            self.cache.invalidate_tag(_assignment_tag(assignment_id))
+        return shifted
+
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        await self.inner.enqueue_events(events)
+
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+        changed = await self.inner.update_assignment_state(ts, limit=limit)
+        for assignment_id in changed or []:
+            self.cache.invalidate_tag(_assignment_tag(assignment_id))
+        return changed
+
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        return await self.inner.oldest_overdue(now)
+
+    async def ping(self) -> None:
+        await self.inner.ping()
+
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        return await self.inner.upcoming_deadlines(after, limit)
+
+    async def ensure_indexes(self):
+        await self.inner.ensure_indexes()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import hashlib
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+CHUNK_SIZE = 255 * 1024  # come i chunk di GridFS: una lettura per chunk
+
+
+def content_ref(data: bytes) -> str:
+    """Riferimento del contenuto: sha256, così contenuti identici sono salvati una volta sola."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ContentBlob(ABC):
+    """Contenuto di un assignment leggibile a intervalli di byte (risposte 206 / Range)."""
+
+    length: int
+
+    @abstractmethod
+    def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Byte da `start` a `end` inclusi, a blocchi."""
+        raise NotImplementedError
+
+
+class InlineContent(ContentBlob):
+    """Contenuto rimasto nel documento dell'assignment (sotto soglia o storage inline)."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.length = len(data)
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        for pos in range(start, end + 1, CHUNK_SIZE):
+            yield self.data[pos:min(pos + CHUNK_SIZE, end + 1)]
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.database.assignment_repo import (
+    AUDIENCE_FIELDS, AssignmentRepo, DeletedEvent, PageKey, PageStamp, ShiftedEvent,
+)
+from app.database.content_repo import ContentBlob
+from app.schemas.assignment import Assignment, AssignmentStats, AssignmentView
+from app.schemas.events import CREATED, DEADLINE_CHANGED, DELETED, STATUS_CHANGED, AssignmentChange, AssignmentStatusEvent
+from app.services.event_bus import AssignmentEventBus
+
+
+AUDIENCE_BATCH_SIZE = 1000  # documenti per batch quando si legge il pubblico di tutti gli assignment di un teacher
+
+
+def _audience(a: Union[Assignment, AssignmentView]) -> List[str]:
+    return [a.teacherId, *a.students]
+
+
+class EventingAssignmentRepository(AssignmentRepo):
+    """
+    Decorator di un AssignmentRepo che alimenta l'AssignmentEventBus dalle scritture di questo processo
+    (route e sweeper): sorgente degli eventi SSE quando i change stream non sono disponibili
+    (mongod standalone, backend in memoria). Con più worker ogni processo vede solo le proprie scritture.
+
+    Per delete, sweep e spostamento delle deadline il pubblico (teacher + studenti) va letto dal repo:
+    lo si fa solo se ci sono client SSE collegati, e leggendo solo AUDIENCE_FIELDS.
+
+    Con l'avvio in background la sorgente si sceglie dopo che il pod serve già richieste:
+    `enabled = False` quando un change stream prende il suo posto.
+    """
+
+    def __init__(self, inner: AssignmentRepo, bus: AssignmentEventBus):
+        self.inner = inner
+        self.bus = bus
+        self.enabled = True
+
+    def _listening(self) -> bool:
+        return self.enabled and self.bus.has_subscribers()
+
+    def _publish(self, a: Union[Assignment, AssignmentView], change: AssignmentChange) -> None:
+        if self.enabled:
+            self.bus.publish(change, _audience(a))
+
+    async def _load(self, assignment_ids: Iterable[str]) -> List[AssignmentView]:
+        return await self.inner.find_audiences(list(assignment_ids))
+
+    async def _load_for_teacher(self, teacher_id: str) -> List[AssignmentView]:
+        return [
+            AssignmentView.model_construct(**d)
+            async for d in self.inner.iter_for_teacher(teacher_id, batch_size=AUDIENCE_BATCH_SIZE, fields=AUDIENCE_FIELDS)
+        ]
+
+    async def create(self, assignment: Assignment, events: Sequence[AssignmentStatusEvent] = ()) -> str:
+        inserted_id = await self.inner.create(assignment, events=events)
+        self._publish(assignment, AssignmentChange(type=CREATED, assignmentId=assignment.assignmentId, status=assignment.status))
+        return inserted_id
+
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        errors = await self.inner.create_many(assignments, events=events)
+        for a, error in zip(assignments, errors):
+            if error is None:
+                self._publish(a, AssignmentChange(type=CREATED, assignmentId=a.assignmentId, status=a.status))
+        return errors
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        before = await self._load([assignment_id]) if self._listening() else []
+        deleted = await self.inner.delete(assignment_id, deleted_event)
+        if deleted and before:
+            self._publish(before[0], AssignmentChange(type=DELETED, assignmentId=before[0].assignmentId, status="deleted"))
+        return deleted
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        before: Dict[str, AssignmentView] = {}
+        if self._listening():
+            found = (
+                await self._load_for_teacher(teacher_id) if assignment_ids is None
+                else await self._load(assignment_ids)
+            )
+            before = {a.assignmentId: a for a in found}
+        deleted = await self.inner.delete_many(teacher_id, assignment_ids, deleted_event)
+        for assignment_id in deleted:
+            a = before.get(assignment_id)
+            if a is not None:
+                self._publish(a, AssignmentChange(type=DELETED, assignmentId=assignment_id, status="deleted"))
+        return deleted
+
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        shifted = await self.inner.shift_deadlines(teacher_id, delta, assignment_ids, shifted_event)
+        if shifted and self._listening():
+            deadlines = dict(shifted)
+            for a in await self._load(deadlines):
+                self._publish(a, AssignmentChange(
+                    type=DEADLINE_CHANGED, assignmentId=a.assignmentId, status=a.status, deadline=deadlines[a.assignmentId],
+                ))
+        return shifted
+
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+        completed = await self.inner.update_assignment_state(ts, limit=limit)
+        if completed and self._listening():
+            for a in await self._load(completed):
+                self._publish(a, AssignmentChange(type=STATUS_CHANGED, assignmentId=a.assignmentId, status="completed"))
+        return completed
+
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        await self.inner.enqueue_events(events)
+
+    async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
+        return await self.inner.find_for_teacher(teacher_id)
+
+    async def find_for_student(self, student_id: str) -> Sequence[Assignment]:
+        return await self.inner.find_for_student(student_id)
+
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self.inner.find_page_for_teacher(teacher_id, limit=limit, after=after, fields=fields)
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self.inner.find_page_for_student(student_id, limit=limit, after=after, fields=fields)
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self.inner.iter_for_teacher(teacher_id, batch_size=batch_size, fields=fields)
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self.inner.iter_for_student(student_id, batch_size=batch_size, fields=fields)
+
+    async def find_one(self, assignment_id: str) -> Optional[Assignment]:
+        return await self.inner.find_one(assignment_id)
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        return await self.inner.find_audiences(assignment_ids)
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        return await self.inner.find_one_for_teacher(assignment_id, teacher_id)
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        return await self.inner.find_one_for_student(assignment_id, student_id)
+
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        return await self.inner.version_for_teacher(assignment_id, teacher_id)
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        return await self.inner.version_for_student(assignment_id, student_id)
+
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self.inner.page_stamp_for_teacher(teacher_id, limit, after)
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self.inner.page_stamp_for_student(student_id, limit, after)
+
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        return await self.inner.stats_for_teacher(teacher_id, now, upcoming)
+
+    async def rebuild_stats(self) -> int:
+        return await self.inner.rebuild_stats()
+
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        return await self.inner.open_content(content_ref)
+
+    async def exists(self, assignment_id: str) -> bool:
+        return await self.inner.exists(assignment_id)
+
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        return await self.inner.upcoming_deadlines(after, limit)
+
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        return await self.inner.oldest_overdue(now)
+
+    async def ping(self) -> None:
+        await self.inner.ping()
+
+    async def ensure_indexes(self):
+        await self.inner.ensure_indexes()
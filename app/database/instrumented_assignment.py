@@ -0,0 +1,167 @@
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from app.core.metrics import REPO_CALL_SECONDS, Histogram
+from app.database.assignment_repo import AssignmentRepo, DeletedEvent, PageKey, PageStamp, ShiftedEvent
+from app.database.content_repo import ContentBlob
+from app.schemas.assignment import Assignment, AssignmentStats, AssignmentView
+from app.schemas.events import AssignmentStatusEvent
+
+
+class InstrumentedAssignmentRepository(AssignmentRepo):
+    """
+    Decorator di un AssignmentRepo che misura la latenza di ogni metodo (label method/outcome).
+    Va messo sotto la cache, così misura solo le chiamate che arrivano davvero a MongoDB.
+    """
+
+    def __init__(self, inner: AssignmentRepo, histogram: Optional[Histogram] = None):
+        self.inner = inner
+        self.histogram = histogram or REPO_CALL_SECONDS
+
+    async def _call(self, method: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            self.histogram.observe(time.perf_counter() - start, method, outcome)
+
+    async def _iter(self, method: str, iterator: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        # per gli stream si misura l'intera iterazione (tempo di consumo del client incluso)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async for d in iterator:
+                yield d
+            outcome = "ok"
+        finally:
+            self.histogram.observe(time.perf_counter() - start, method, outcome)
+
+    async def create(self, assignment: Assignment, events: Sequence[AssignmentStatusEvent] = ()) -> str:
+        return await self._call("create", self.inner.create, assignment, events=events)
+
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        return await self._call("create_many", self.inner.create_many, assignments, events=events)
+
+    async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
+        return await self._call("find_for_teacher", self.inner.find_for_teacher, teacher_id)
+
+    async def find_for_student(self, student_id: str) -> Sequence[Assignment]:
+        return await self._call("find_for_student", self.inner.find_for_student, student_id)
+
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self._call(
+            "find_page_for_teacher", self.inner.find_page_for_teacher, teacher_id, limit=limit, after=after, fields=fields
+        )
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self._call(
+            "find_page_for_student", self.inner.find_page_for_student, student_id, limit=limit, after=after, fields=fields
+        )
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter("iter_for_teacher", self.inner.iter_for_teacher(teacher_id, batch_size=batch_size, fields=fields))
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter("iter_for_student", self.inner.iter_for_student(student_id, batch_size=batch_size, fields=fields))
+
+    async def find_one(self, assignment_id: str) -> Optional[Assignment]:
+        return await self._call("find_one", self.inner.find_one, assignment_id)
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        return await self._call("find_audiences", self.inner.find_audiences, assignment_ids)
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        return await self._call("find_one_for_teacher", self.inner.find_one_for_teacher, assignment_id, teacher_id)
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        return await self._call("find_one_for_student", self.inner.find_one_for_student, assignment_id, student_id)
+
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        return await self._call("version_for_teacher", self.inner.version_for_teacher, assignment_id, teacher_id)
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        return await self._call("version_for_student", self.inner.version_for_student, assignment_id, student_id)
+
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self._call("page_stamp_for_teacher", self.inner.page_stamp_for_teacher, teacher_id, limit, after)
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self._call("page_stamp_for_student", self.inner.page_stamp_for_student, student_id, limit, after)
+
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        return await self._call("stats_for_teacher", self.inner.stats_for_teacher, teacher_id, now, upcoming)
+
+    async def rebuild_stats(self) -> int:
+        return await self._call("rebuild_stats", self.inner.rebuild_stats)
+
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        return await self._call("open_content", self.inner.open_content, content_ref)
+
+    async def exists(self, assignment_id: str) -> bool:
+        return await self._call("exists", self.inner.exists, assignment_id)
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        return await self._call("delete", self.inner.delete, assignment_id, deleted_event)
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        return await self._call("delete_many", self.inner.delete_many, teacher_id, assignment_ids, deleted_event)
+
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        return await self._call(
+            "shift_deadlines", self.inner.shift_deadlines, teacher_id, delta, assignment_ids, shifted_event
+        )
+
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        await self._call("enqueue_events", self.inner.enqueue_events, events)
+
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+        return await self._call("update_assignment_state", self.inner.update_assignment_state, ts, limit=limit)
+
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        return await self._call("upcoming_deadlines", self.inner.upcoming_deadlines, after, limit)
+
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        return await self._call("oldest_overdue", self.inner.oldest_overdue, now)
+
+    async def ping(self) -> None:
+        await self._call("ping", self.inner.ping)
+
+    async def ensure_indexes(self):
+        await self.inner.ensure_indexes()
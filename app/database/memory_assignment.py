@@ -0,0 +1,376 @@
+# app/database/memory_assignment.py
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.database.assignment_repo import (
+    AUDIENCE_FIELDS, AssignmentRepo, DeletedEvent, PageKey, PageStamp, ShiftedEvent,
+)
+from app.database.content_repo import ContentBlob
+from app.database.outbox_repo import OutboxEntry, OutboxRepo
+from app.schemas.assignment import Assignment, AssignmentStats, AssignmentView, UpcomingDeadline
+from app.schemas.events import AssignmentStatusEvent
+
+_MAX_BACKOFF_EXPONENT = 6  # come MongoOutboxRepository
+
+
+def _utc(ts: datetime) -> datetime:
+    # chiavi confrontabili: i datetime naive sono UTC (come quelli letti da Mongo)
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def _page_key(a: Assignment) -> PageKey:
+    return _utc(a.createdAt), a.assignmentId
+
+
+def _discard(keys: list, key) -> None:
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+class MemoryOutboxRepository(OutboxRepo):
+    """Outbox in memoria con le stesse regole di quella su Mongo (claim a tempo, ack, backoff esponenziale)."""
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+
+    def add(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        now = datetime.now(timezone.utc)
+        for event in events:
+            # come l'_id su Mongo: lo stesso messageId non viene accodato due volte
+            self._entries.setdefault(
+                event.messageId or event.assignmentId,
+                {"event": event, "createdAt": now, "attempts": 0, "nextAttemptAt": now},
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def claim_batch(self, now: datetime, limit: int, claim_seconds: float) -> List[OutboxEntry]:
+        now = _utc(now)
+        ready = sorted(
+            (e["nextAttemptAt"], e["createdAt"], message_id)
+            for message_id, e in self._entries.items()
+            if e["nextAttemptAt"] <= now
+        )[:limit]
+        claimed = []
+        for _, _, message_id in ready:
+            entry = self._entries[message_id]
+            entry["nextAttemptAt"] = now + timedelta(seconds=claim_seconds)
+            claimed.append((message_id, entry["event"]))
+        return claimed
+
+    async def ack(self, ids: Sequence[str]) -> None:
+        for message_id in ids:
+            self._entries.pop(message_id, None)
+
+    async def retry(self, ids: Sequence[str], now: datetime, base_delay_seconds: float) -> None:
+        for message_id in ids:
+            entry = self._entries.get(message_id)
+            if entry is None:
+                continue
+            delay = base_delay_seconds * 2 ** min(entry["attempts"], _MAX_BACKOFF_EXPONENT)
+            entry["nextAttemptAt"] = _utc(now) + timedelta(seconds=delay)
+            entry["attempts"] += 1
+
+    async def ensure_indexes(self):
+        return None
+
+
+class MemoryAssignmentRepository(AssignmentRepo):
+    """
+    Backend in memoria (dev locale, CI, benchmark): stessi contratti del repository Mongo, senza rete.
+
+    Indici:
+    - hash su assignmentId (lookup O(1));
+    - per teacher e per studente, liste ordinate di (createdAt, assignmentId): keyset pagination con bisect;
+    - lista ordinata di (deadline, assignmentId) dei soli assignment aperti: lo sweep prende
+      il prefisso scaduto senza scandire la collezione (e la stessa lista per teacher per le statistiche);
+    - contatori aperti/completati per teacher, aggiornati a ogni scrittura.
+
+    Gli Assignment restituiti sono gli oggetti conservati: vanno trattati come sola lettura
+    (come quelli restituiti dalla cache).
+    """
+
+    def __init__(self, outbox: Optional[MemoryOutboxRepository] = None):
+        self.outbox = outbox if outbox is not None else MemoryOutboxRepository()
+        self._items: Dict[str, Assignment] = {}
+        self._by_teacher: Dict[str, List[PageKey]] = {}
+        self._by_student: Dict[str, List[PageKey]] = {}
+        self._deadlines: List[Tuple[datetime, str]] = []
+        self._teacher_deadlines: Dict[str, List[Tuple[datetime, str]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # ---------- indici ----------
+
+    def _index(self, a: Assignment) -> None:
+        key = _page_key(a)
+        insort(self._by_teacher.setdefault(a.teacherId, []), key)
+        for student_id in dict.fromkeys(a.students):
+            insort(self._by_student.setdefault(student_id, []), key)
+        if a.status != "completed":
+            insort(self._deadlines, (_utc(a.deadline), a.assignmentId))
+            insort(self._teacher_deadlines.setdefault(a.teacherId, []), (_utc(a.deadline), a.assignmentId))
+        self._count(a.teacherId, a.status, 1)
+
+    def _unindex(self, a: Assignment) -> None:
+        key = _page_key(a)
+        _discard(self._by_teacher.get(a.teacherId, []), key)
+        for student_id in dict.fromkeys(a.students):
+            _discard(self._by_student.get(student_id, []), key)
+        if a.status != "completed":
+            _discard(self._deadlines, (_utc(a.deadline), a.assignmentId))
+            _discard(self._teacher_deadlines.get(a.teacherId, []), (_utc(a.deadline), a.assignmentId))
+        self._count(a.teacherId, a.status, -1)
+
+    def _count(self, teacher_id: str, status: str, delta: int) -> None:
+        counters = self._stats.setdefault(teacher_id, {"open": 0, "completed": 0})
+        counters["completed" if status == "completed" else "open"] += delta
+
+    def _insert(self, a: Assignment) -> None:
+        if a.assignmentId in self._items:
+            raise ValueError(f"assignmentId duplicato: {a.assignmentId}")
+        if a.updatedAt is None:
+            a.updatedAt = a.createdAt
+        self._items[a.assignmentId] = a
+        self._index(a)
+
+    def _remove(self, assignment_id: str) -> bool:
+        a = self._items.pop(assignment_id, None)
+        if a is None:
+            return False
+        self._unindex(a)
+        return True
+
+    # ---------- scrittura ----------
+
+    async def create(self, assignment: Assignment, events: Sequence[AssignmentStatusEvent] = ()) -> str:
+        self._insert(assignment)
+        self.outbox.add(events)
+        return assignment.assignmentId
+
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        errors: List[Optional[str]] = []
+        for a in assignments:
+            try:
+                self._insert(a)
+                errors.append(None)
+            except ValueError as exc:
+                errors.append(str(exc))
+        inserted = {a.assignmentId for a, err in zip(assignments, errors) if err is None}
+        self.outbox.add([e for e in events if e.assignmentId in inserted])
+        return errors
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        if not self._remove(str(assignment_id)):
+            return False
+        if deleted_event is not None:
+            self.outbox.add([deleted_event(str(assignment_id))])
+        return True
+
+    def _owned(self, teacher_id: str, assignment_ids: Optional[Sequence[str]]) -> List[Assignment]:
+        if assignment_ids is None:
+            return [self._items[k[1]] for k in self._by_teacher.get(str(teacher_id), [])]
+        owned = (self._items.get(str(a)) for a in dict.fromkeys(assignment_ids))
+        return [a for a in owned if a is not None and a.teacherId == str(teacher_id)]
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        deleted = [a.assignmentId for a in self._owned(teacher_id, assignment_ids)]
+        for assignment_id in deleted:
+            self._remove(assignment_id)
+        if deleted_event is not None:
+            self.outbox.add([deleted_event(a) for a in deleted])
+        return deleted
+
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        shifted: List[Tuple[str, datetime]] = []
+        for a in self._owned(teacher_id, assignment_ids):
+            if a.status == "completed":
+                continue
+            teacher_deadlines = self._teacher_deadlines[a.teacherId]
+            _discard(self._deadlines, (_utc(a.deadline), a.assignmentId))
+            _discard(teacher_deadlines, (_utc(a.deadline), a.assignmentId))
+            a.deadline = a.deadline + delta
+            a.updatedAt = datetime.now(timezone.utc)
+            a.version += 1
+            insort(self._deadlines, (_utc(a.deadline), a.assignmentId))
+            insort(teacher_deadlines, (_utc(a.deadline), a.assignmentId))
+            shifted.append((a.assignmentId, a.deadline))
+        if shifted_event is not None:
+            self.outbox.add([shifted_event(a, deadline) for a, deadline in shifted])
+        return shifted
+
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        self.outbox.add(events)
+
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+        # prefisso scaduto dell'indice delle deadline (deadline < ts), i più vecchi per primi
+        end = bisect_left(self._deadlines, (_utc(ts),))
+        if limit:
+            end = min(end, limit)
+        due = self._deadlines[:end]
+        del self._deadlines[:end]
+        for deadline, assignment_id in due:
+            a = self._items[assignment_id]
+            _discard(self._teacher_deadlines[a.teacherId], (deadline, assignment_id))
+            self._count(a.teacherId, a.status, -1)
+            self._count(a.teacherId, "completed", 1)
+            a.status = "completed"
+            a.completedAt = ts
+            a.updatedAt = ts
+            a.version += 1
+        return [assignment_id for _, assignment_id in due]
+
+    # ---------- lettura ----------
+
+    def _page_keys(self, keys: List[PageKey], limit: Optional[int], after: Optional[PageKey]) -> List[PageKey]:
+        # prima chiave strettamente maggiore di `after`
+        start = 0 if after is None else bisect_right(keys, (_utc(after[0]), after[1]))
+        return keys[start:start + limit] if limit else keys[start:]
+
+    @staticmethod
+    def _view(a: Assignment, fields: Optional[Sequence[str]]) -> AssignmentView:
+        return AssignmentView.model_construct(**a.model_dump(include=set(fields) if fields else None))
+
+    async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
+        return [self._items[k[1]] for k in self._by_teacher.get(str(teacher_id), [])]
+
+    async def find_for_student(self, student_id: str) -> Sequence[Assignment]:
+        return [self._items[k[1]] for k in self._by_student.get(str(student_id), [])]
+
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        keys = self._page_keys(self._by_teacher.get(str(teacher_id), []), limit, after)
+        return [self._view(self._items[k[1]], fields) for k in keys]
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        keys = self._page_keys(self._by_student.get(str(student_id), []), limit, after)
+        return [self._view(self._items[k[1]], fields) for k in keys]
+
+    async def _iter(self, keys: List[PageKey], fields: Optional[Sequence[str]]) -> AsyncIterator[dict]:
+        include = set(fields) if fields else None
+        for k in list(keys):  # copia: lo stream non vede le scritture concorrenti a metà
+            a = self._items.get(k[1])
+            if a is not None:
+                yield a.model_dump(include=include)
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter(self._by_teacher.get(str(teacher_id), []), fields)
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter(self._by_student.get(str(student_id), []), fields)
+
+    async def find_one(self, assignment_id: str) -> Optional[Assignment]:
+        return self._items.get(str(assignment_id))
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        found = (self._items.get(str(a)) for a in dict.fromkeys(assignment_ids))
+        return [self._view(a, AUDIENCE_FIELDS) for a in found if a is not None]
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        a = self._items.get(str(assignment_id))
+        return a if a is not None and a.teacherId == str(teacher_id) else None
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        a = self._items.get(str(assignment_id))
+        if a is None or str(student_id) not in a.students:
+            return None
+        return a.model_copy(update={"students": [str(student_id)]})
+
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        a = await self.find_one_for_teacher(assignment_id, teacher_id)
+        return a.version if a is not None else None
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        a = self._items.get(str(assignment_id))
+        return a.version if a is not None and str(student_id) in a.students else None
+
+    def _page_stamp(self, keys: List[PageKey], limit: Optional[int], after: Optional[PageKey]) -> PageStamp:
+        page = [self._items[k[1]] for k in self._page_keys(keys, limit, after)]
+        stamps = [_utc(a.updatedAt) for a in page if a.updatedAt is not None]
+        return len(page), sum(a.version for a in page), max(stamps) if stamps else None, [a.assignmentId for a in page]
+
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return self._page_stamp(self._by_teacher.get(str(teacher_id), []), limit, after)
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return self._page_stamp(self._by_student.get(str(student_id), []), limit, after)
+
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        teacher_id = str(teacher_id)
+        counters = self._stats.get(teacher_id, {})
+        deadlines = self._teacher_deadlines.get(teacher_id, [])
+        split = bisect_left(deadlines, (_utc(now),))
+        return AssignmentStats(
+            teacherId=teacher_id,
+            total=counters.get("open", 0) + counters.get("completed", 0),
+            open=counters.get("open", 0),
+            completed=counters.get("completed", 0),
+            overdue=split,
+            upcomingDeadlines=[
+                UpcomingDeadline(assignmentId=a, deadline=d) for d, a in deadlines[split:split + max(upcoming, 0)]
+            ],
+        )
+
+    async def rebuild_stats(self) -> int:
+        self._stats = {}
+        for a in self._items.values():
+            self._count(a.teacherId, a.status, 1)
+        return len(self._stats)
+
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        return None  # i contenuti restano sempre nel documento
+
+    async def exists(self, assignment_id: str) -> bool:
+        return str(assignment_id) in self._items
+
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        start = bisect_left(self._deadlines, (_utc(after),))
+        return [d for d, _ in self._deadlines[start:start + limit]]
+
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        if self._deadlines and self._deadlines[0][0] < _utc(now):
+            return self._deadlines[0][0]
+        return None
+
+    async def ping(self) -> None:
+        return None
+
+    async def ensure_indexes(self):
+        return None
@@ -0,0 +1,97 @@
+# app/database/migrate_content.py
+"""
+Sposta in GridFS i `content` già salvati nei documenti degli assignment, e pulisce i contenuti orfani.
+
+    python -m app.database.migrate_content --threshold 65536   [--batch-size 200]
+    python -m app.database.migrate_content --gc                 [--grace-seconds 3600]
+
+Legge MONGO_URI / MONGO_DB_NAME dall'ambiente (o da --mongo-uri / --db).
+Idempotente e riprendibile: il contenuto viene scritto in GridFS prima di togliere `content` dal
+documento, quindi un'interruzione al più lascia un file senza riferimenti (rimosso da --gc).
+Si può eseguire a servizio attivo; per i nuovi assignment impostare CONTENT_OFFLOAD_BYTES.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.database.content_repo import content_ref
+from app.database.migrate_members import _pages
+from app.database.mongo_content import MongoContentStore
+
+logger = logging.getLogger(__name__)
+
+
+def _candidates(threshold: int) -> dict:
+    # filtro sulla lunghezza in caratteri (limite inferiore dei byte UTF-8), verificata poi in byte
+    return {"content": {"$type": "string"}, "$expr": {"$gte": [{"$strLenCP": "$content"}, threshold // 4]}}
+
+
+async def offload_contents(db: AsyncIOMotorDatabase, threshold: int, batch_size: int = 200) -> int:
+    """Sposta in GridFS i contenuti di almeno `threshold` byte; ritorna il numero di assignment migrati."""
+    col = db["assignments"]
+    store = MongoContentStore(db)
+    migrated = 0
+    async for docs in _pages(col, _candidates(threshold), {"_id": 1, "content": 1}, batch_size):
+        for d in docs:
+            data = d["content"].encode("utf-8")
+            if len(data) < threshold:
+                continue
+            ref = content_ref(data)
+            await store.put(ref, data)
+            # il filtro sul content evita di perdere una modifica concorrente
+            res = await col.update_one(
+                {"_id": d["_id"], "content": d["content"]},
+                {
+                    "$unset": {"content": ""},
+                    "$set": {"contentRef": ref, "contentLength": len(data), "updatedAt": datetime.now(timezone.utc)},
+                    "$inc": {"version": 1},
+                },
+            )
+            migrated += res.modified_count
+        logger.info("Contenuti spostati in GridFS: %d", migrated)
+    return migrated
+
+
+async def run(mongo_uri: str, db_name: str, threshold: Optional[int], gc: bool, batch_size: int, grace: timedelta) -> int:
+    client = AsyncIOMotorClient(mongo_uri, uuidRepresentation="standard")
+    try:
+        db = client[db_name]
+        if gc:
+            return await MongoContentStore(db).collect_garbage(db["assignments"], grace=grace)
+        return await offload_contents(db, threshold, batch_size)
+    finally:
+        client.close()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--threshold", type=int, help="Byte minimi (UTF-8) per spostare un content in GridFS")
+    action.add_argument("--gc", action="store_true", help="Rimuove i contenuti non più referenziati")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default=os.getenv("MONGO_DB_NAME"))
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--grace-seconds", type=int, default=3600)
+    args = parser.parse_args(argv)
+    if not args.mongo_uri or not args.db:
+        parser.error("MONGO_URI e MONGO_DB_NAME (o --mongo-uri / --db) sono obbligatori")
+    if args.threshold is not None and args.threshold <= 0:
+        parser.error("--threshold deve essere positivo")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s :: %(message)s")
+    count = asyncio.run(run(
+        args.mongo_uri, args.db, args.threshold, args.gc, args.batch_size, timedelta(seconds=args.grace_seconds),
+    ))
+    if args.gc:
+        logger.info("Completato: %d contenuti orfani rimossi", count)
+    else:
+        logger.info("Completato: %d contenuti spostati in GridFS (soglia %d byte)", count, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
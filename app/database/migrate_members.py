@@ -0,0 +1,114 @@
+# app/database/migrate_members.py
+"""
+Migrazione del layout delle iscrizioni tra `students` embedded e la collection `assignment_members`.
+
+    python -m app.database.migrate_members --to members   [--batch-size 200]
+    python -m app.database.migrate_members --to embedded  [--batch-size 200]
+
+Legge MONGO_URI / MONGO_DB_NAME dall'ambiente (o da --mongo-uri / --db).
+Entrambe le direzioni sono idempotenti e riprendibili: un assignment viene marcato come migrato
+(rimozione di `students` o di `studentCount`) solo dopo che i suoi membri sono stati scritti/letti,
+quindi un'interruzione al più fa riscrivere dei membri già presenti (ignorati).
+Eseguirla a servizio fermo, o con STUDENTS_STORAGE già impostato sul layout di destinazione.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.database.mongo_members import (
+    MEMBERS_COLLECTION,
+    MongoMemberAssignmentRepository,
+    insert_members,
+    member_docs,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _pages(col, filt: dict, projection: dict, batch_size: int):
+    # paginazione per _id: i documenti aggiornati escono dal filtro, un cursore aperto potrebbe saltarne
+    last_id = None
+    while True:
+        page = filt if last_id is None else {**filt, "_id": {"$gt": last_id}}
+        docs = await col.find(page, projection).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not docs:
+            return
+        last_id = docs[-1]["_id"]
+        yield docs
+
+
+async def migrate_to_members(db: AsyncIOMotorDatabase, batch_size: int = 200) -> int:
+    """Sposta `students` nella collection dei membri; ritorna il numero di assignment migrati."""
+    repo = MongoMemberAssignmentRepository(db)
+    await repo.ensure_indexes()
+    migrated = 0
+    async for docs in _pages(
+        db["assignments"], {"students": {"$exists": True}},
+        {"_id": 1, "assignmentId": 1, "createdAt": 1, "students": 1}, batch_size,
+    ):
+        await insert_members(
+            repo.members,
+            [m for d in docs for m in member_docs(d["assignmentId"], d.get("createdAt"), d.get("students") or [])],
+        )
+        for d in docs:
+            await repo.col.update_one(
+                {"_id": d["_id"]},
+                {"$unset": {"students": ""}, "$set": {"studentCount": len(set(d.get("students") or []))}},
+            )
+        migrated += len(docs)
+        logger.info("Migrati %d assignment verso %s", migrated, MEMBERS_COLLECTION)
+    return migrated
+
+
+async def migrate_to_embedded(db: AsyncIOMotorDatabase, batch_size: int = 200) -> int:
+    """Ricopia i membri nel campo `students` e li rimuove dalla collection; ritorna gli assignment migrati."""
+    repo = MongoMemberAssignmentRepository(db)
+    migrated = 0
+    async for docs in _pages(
+        db["assignments"], {"students": {"$exists": False}}, {"_id": 1, "assignmentId": 1}, batch_size,
+    ):
+        ids = [d["assignmentId"] for d in docs]
+        rosters = await repo._rosters(ids)
+        for d in docs:
+            await repo.col.update_one(
+                {"_id": d["_id"]},
+                {"$set": {"students": rosters.get(d["assignmentId"], [])}, "$unset": {"studentCount": ""}},
+            )
+        await repo._delete_members(ids)
+        migrated += len(docs)
+        logger.info("Migrati %d assignment verso il layout embedded", migrated)
+    return migrated
+
+
+async def run(to: str, mongo_uri: str, db_name: str, batch_size: int) -> int:
+    client = AsyncIOMotorClient(mongo_uri, uuidRepresentation="standard")
+    try:
+        db = client[db_name]
+        if to == "members":
+            return await migrate_to_members(db, batch_size)
+        return await migrate_to_embedded(db, batch_size)
+    finally:
+        client.close()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", choices=("members", "embedded"), required=True)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default=os.getenv("MONGO_DB_NAME"))
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args(argv)
+    if not args.mongo_uri or not args.db:
+        parser.error("MONGO_URI e MONGO_DB_NAME (o --mongo-uri / --db) sono obbligatori")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s :: %(message)s")
+    migrated = asyncio.run(run(args.to, args.mongo_uri, args.db, args.batch_size))
+    logger.info("Completato: %d assignment migrati (--to %s)", migrated, args.to)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,292 @@
 # app/repositories/mongo_assignment.py
-from datetime import datetime, timezone
-from typing import Sequence, Optional, List, Tuple
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+import asyncio
+from collections import defaultdict
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Sequence, Optional, List, Tuple, TypeVar
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
-from app.database.assignment_repo import AssignmentRepo
-from app.schemas.assignment import Assignment
+from app.database.assignment_repo import (
+    AUDIENCE_FIELDS, AssignmentRepo, DeletedEvent, PageKey, PageStamp, ShiftedEvent,
+)
+from app.database.content_repo import ContentBlob, content_ref
+from app.database.mongo_content import MongoContentStore
+from app.database.mongo_indexes import IndexSet
+from app.database.mongo_outbox import OUTBOX_COLLECTION, outbox_doc
+from app.schemas.assignment import Assignment, AssignmentStats, AssignmentView, UpcomingDeadline
+from app.schemas.events import AssignmentStatusEvent
+
+logger = logging.getLogger(__name__)
+
+PAGE_SORT = [("createdAt", 1), ("assignmentId", 1)]
+
+ASSIGNMENT_ID_INDEX = "assignmentId_unique"
+ASSIGNMENT_ID_LEGACY_INDEX = "assignmentId_nonunique"
+_DUPLICATE_KEY = 11000
+_INDEX_CONFLICT = (85, 86)  # IndexOptionsConflict / IndexKeySpecsConflict
+_ILLEGAL_OPERATION = 20     # transazioni non supportate (mongod standalone)
+_INDEX_NOT_FOUND = 27
+BULK_CHUNK_SIZE = 1000      # documenti per round-trip nelle operazioni bulk
+
+# indici di paginazione con updatedAt e version in coda: le impronte per gli ETag si calcolano sull'indice
+TEACHER_PAGE_INDEX = [("teacherId", 1), *PAGE_SORT, ("updatedAt", 1), ("version", 1)]
+STUDENT_PAGE_INDEX = [("students", 1), *PAGE_SORT, ("updatedAt", 1), ("version", 1)]
+_SUPERSEDED_INDEXES = ("teacherId_1_createdAt_1_assignmentId_1", "students_1_createdAt_1_assignmentId_1")
+
+# versione successiva anche per i documenti creati prima del campo (version implicita 1)
+VERSION = {"$ifNull": ["$version", 1]}
+NEXT_VERSION = {"$add": [VERSION, 1]}
+
+# riduzione di una finestra di documenti alla sua impronta (vedi PageStamp); campi tutti negli indici di pagina
+STAMP_PROJECT = {"$project": {"_id": 0, "assignmentId": 1, "updatedAt": 1, "version": 1}}
+STAMP_GROUP = {
+    "$group": {
+        "_id": None,
+        "count": {"$sum": 1},
+        "versions": {"$sum": VERSION},
+        "updatedAt": {"$max": "$updatedAt"},
+        "ids": {"$push": "$assignmentId"},
+    }
+}
+
+
+def page_stamp(rows: List[dict]) -> PageStamp:
+    """PageStamp dal risultato di STAMP_GROUP (nessuna riga: finestra vuota)."""
+    if not rows:
+        return 0, 0, None, []
+    return rows[0]["count"], rows[0]["versions"], rows[0]["updatedAt"], rows[0]["ids"]
+
+# contatori per teacher: {_id: teacherId, open, completed}, aggiornati con $inc dalle scritture
+STATS_COLLECTION = "assignment_stats"
+# scaduti e prossime deadline di un teacher: query coperte, senza leggere i documenti
+TEACHER_DEADLINE_INDEX = [("teacherId", 1), ("status", 1), ("deadline", 1), ("assignmentId", 1)]
+
+# ricostruzione dei contatori (riconciliazione): un solo passaggio sulla collection
+_STATS_REBUILD = [
+    {"$group": {
+        "_id": "$teacherId",
+        "open": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 0, 1]}},
+        "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+    }},
+]
+
+# (teacherId, status) -> variazione dei contatori
+StatsDelta = Dict[str, Dict[str, int]]
+
+T = TypeVar("T")
+
+
+def stats_delta(rows: Iterable[Tuple[str, Optional[str]]], sign: int = 1) -> StatsDelta:
+    """Variazione dei contatori per assignment aggiunti (`sign`=1) o rimossi (-1), dati teacherId e status."""
+    delta: StatsDelta = defaultdict(lambda: {"open": 0, "completed": 0})
+    for teacher_id, status in rows:
+        delta[teacher_id]["completed" if status == "completed" else "open"] += sign
+    return delta
+
+
+def _write_errors(exc: BulkWriteError) -> Dict[int, str]:
+    """Documenti rifiutati da un insert_many: {indice nel batch: messaggio}."""
+    return {e["index"]: e.get("errmsg", "Inserimento fallito") for e in exc.details.get("writeErrors", [])}
+
+# proiezione per i lettori studenti: tutto tranne il roster (di cui si restituisce solo lo studente)
+_STUDENT_VIEW_FIELDS = {f: 1 for f in Assignment.model_fields if f != "students"}
+
+# contenuto spostato in GridFS: (contentRef, lunghezza in byte)
+ContentPointer = Tuple[str, int]
 
 
 class MongoAssignmentRepository(AssignmentRepo):
-    def __init__(self, db: AsyncIOMotorDatabase):
+    """
+    Con `content_offload_bytes` > 0 i contenuti di almeno quella dimensione vanno in GridFS
+    (MongoContentStore, deduplicati per sha256) e il documento tiene solo contentRef/contentLength:
+    liste, find_one e sweep non li leggono più. La lettura dei contenuti già spostati funziona
+    sempre, anche con la soglia disattivata.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, content_offload_bytes: int = 0):
+        self.client = db.client
         self.col = db["assignments"]
+        self.outbox = db[OUTBOX_COLLECTION]
+        self.stats = db[STATS_COLLECTION]
+        self.contents = MongoContentStore(db)
+        self.content_offload_bytes = content_offload_bytes
+        self._transactions: Optional[bool] = None  # None = non ancora verificato
 
+    # I documenti letti dalla collection sono stati scritti da noi a partire da modelli già validati:
+    # model_construct evita di rivalidarli a ogni lettura (ed ignora i campi extra come _id).
     def _from_doc(self, d: dict) -> Assignment:
-        base = {k: v for k, v in d.items() if k not in {"_id"}}
-        return Assignment(**base)
+        return Assignment.model_construct(**d)
+
+    def _view_from_doc(self, d: dict) -> AssignmentView:
+        return AssignmentView.model_construct(**d)
+
+    @staticmethod
+    def _page_filter(filt: dict, after: Optional[PageKey]) -> dict:
+        if after is None:
+            return filt
+        created_at, assignment_id = after
+        return {
+            **filt,
+            "$or": [
+                {"createdAt": {"$gt": created_at}},
+                {"createdAt": created_at, "assignmentId": {"$gt": assignment_id}},
+            ],
+        }
+
+    @staticmethod
+    def _projection(fields: Optional[Sequence[str]]) -> dict:
+        if fields is None:
+            return {"_id": 0}
+        projection = {f: 1 for f in fields}
+        projection["_id"] = 0
+        return projection
 
-    def _to_doc_from_model(self, a: Assignment) -> dict:
+    async def _find_page(
+        self,
+        filt: dict,
+        limit: Optional[int],
+        after: Optional[PageKey],
+        fields: Optional[Sequence[str]],
+    ) -> List[AssignmentView]:
+        cursor = self.col.find(self._page_filter(filt, after), self._projection(fields)).sort(PAGE_SORT)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [self._view_from_doc(d) async for d in cursor]
+
+    async def _offload_contents(self, assignments: Sequence[Assignment]) -> Dict[str, ContentPointer]:
+        """Scrive in GridFS i contenuti sopra soglia (prima dei documenti: mai un contentRef orfano)."""
+        if self.content_offload_bytes <= 0:
+            return {}
+        pointers: Dict[str, ContentPointer] = {}
+        stored = set()
+        for a in assignments:
+            data = (a.content or "").encode("utf-8")
+            if len(data) < self.content_offload_bytes:
+                continue
+            ref = content_ref(data)
+            if ref not in stored:  # stesso contenuto più volte nello stesso batch
+                await self.contents.put(ref, data)
+                stored.add(ref)
+            pointers[a.assignmentId] = (ref, len(data))
+        return pointers
+
+    def _to_doc_from_model(self, a: Assignment, content: Optional[ContentPointer] = None) -> dict:
         doc = a.model_dump()
+        if content is not None:
+            del doc["content"]
+            doc["contentRef"], doc["contentLength"] = content
 
         doc.setdefault("createdAt", datetime.now(timezone.utc))
         doc.setdefault("status", "open")
         doc.setdefault("completedAt", None)
+        if doc.get("updatedAt") is None:
+            doc["updatedAt"] = doc["createdAt"]
         return doc
 
-    async def create(self, assignment: Assignment) -> str:
+    async def create(self, assignment: Assignment, events: Sequence[AssignmentStatusEvent] = ()) -> str:
         """
-        Inserisce un Assignment completo (con id già generato nel service).
+        Inserisce un Assignment completo (con id già generato nel service), i documenti collegati,
+        i relativi eventi nell'outbox e i contatori, nella stessa transazione quando il cluster la supporta.
         """
-        doc = self._to_doc_from_model(assignment)
-        await self.col.insert_one(doc)
+        pointers = await self._offload_contents([assignment])
+        doc = self._to_doc_from_model(assignment, pointers.get(assignment.assignmentId))
+        outbox_docs = [outbox_doc(e) for e in events]
+        delta = stats_delta([(doc["teacherId"], doc["status"])])
+
+        async def write(session=None):
+            await self.col.insert_one(doc, session=session)
+            await self._insert_linked([assignment], session=session)
+            if outbox_docs:
+                await self.outbox.insert_many(outbox_docs, session=session)
+            await self._inc_stats(delta, session=session)
+
+        await self._atomically(write)
         return assignment.assignmentId
 
+    async def _atomically(self, write: Callable[..., Awaitable[T]]) -> T:
+        """
+        Esegue `write(session)` in una transazione quando il cluster la supporta.
+        Su mongod standalone (rilevato al primo tentativo) esegue `write()` senza sessione:
+        le scritture vanno in ordine, prima l'assignment e poi l'evento
+        (al peggio si perde l'evento, mai un evento fantasma).
+        """
+        if self._transactions is not False:
+            try:
+                async with await self.client.start_session() as session:
+                    result = await session.with_transaction(write)
+                self._transactions = True
+                return result
+            except OperationFailure as exc:
+                if exc.code != _ILLEGAL_OPERATION:
+                    raise
+                logger.warning("Transazioni non supportate da MongoDB (%s): outbox scritto dopo l'insert.", exc)
+                self._transactions = False
+        return await write()
+
+    async def _insert_linked(self, assignments: Sequence[Assignment], session=None) -> None:
+        """Documenti collegati agli assignment appena inseriti, nella stessa scrittura (es. i membri)."""
+
+    async def _insert_batch(
+        self,
+        assignments: Sequence[Assignment],
+        docs: Sequence[dict],
+        events: Sequence[AssignmentStatusEvent],
+        session=None,
+    ) -> Dict[int, str]:
+        """insert_many non ordinato + collegati, contatori e outbox dei soli inseriti; ritorna {indice: errore}."""
+        rejected: Dict[int, str] = {}
+        try:
+            await self.col.insert_many(list(docs), ordered=False, session=session)
+        except BulkWriteError as exc:
+            if session is not None:
+                raise  # in transazione l'errore annulla tutto il batch: lo ripete create_many
+            rejected = _write_errors(exc)
+        await self._insert_linked([a for i, a in enumerate(assignments) if i not in rejected], session=session)
+        inserted = [d for i, d in enumerate(docs) if i not in rejected]
+        inserted_ids = {d["assignmentId"] for d in inserted}
+        await self._inc_stats(stats_delta((d["teacherId"], d["status"]) for d in inserted), session=session)
+        outbox_docs = [outbox_doc(e) for e in events if e.assignmentId in inserted_ids]
+        if outbox_docs:
+            await self.outbox.insert_many(outbox_docs, session=session)
+        return rejected
+
+    async def create_many(
+        self, assignments: Sequence[Assignment], events: Sequence[AssignmentStatusEvent] = ()
+    ) -> List[Optional[str]]:
+        """
+        Un solo insert_many non ordinato: un documento non valido non blocca gli altri.
+        Assignment, eventi "open" e contatori vanno nella stessa transazione come in create;
+        in transazione un documento rifiutato la annulla, e la si ripete senza i rifiutati.
+        """
+        errors: List[Optional[str]] = [None] * len(assignments)
+        if not assignments:
+            return errors
+
+        pointers = await self._offload_contents(assignments)
+        docs = [self._to_doc_from_model(a, pointers.get(a.assignmentId)) for a in assignments]
+        pending = list(range(len(docs)))
+        while pending:
+            try:
+                rejected = await self._atomically(partial(
+                    self._insert_batch, [assignments[i] for i in pending], [docs[i] for i in pending], events
+                ))
+                retry = False
+            except BulkWriteError as exc:
+                rejected = _write_errors(exc)
+                if not rejected:
+                    raise
+                retry = True
+            for i, message in rejected.items():
+                errors[pending[i]] = message
+            if not retry:
+                break
+            pending = [index for i, index in enumerate(pending) if i not in rejected]
+        return errors
+
     async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
         cursor = self.col.find({"teacherId": str(teacher_id)})
         docs: List[dict] = [d async for d in cursor]
@@ -41,35 +297,392 @@ class MongoAssignmentRepository(AssignmentRepo):
         docs: List[dict] = [d async for d in cursor]
         return [self._from_doc(d) for d in docs]
 
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self._find_page({"teacherId": str(teacher_id)}, limit, after, fields)
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        return await self._find_page({"students": str(student_id)}, limit, after, fields)
+
+    async def _iter(self, filt: dict, batch_size: int, fields: Optional[Sequence[str]]) -> AsyncIterator[dict]:
+        cursor = self.col.find(filt, self._projection(fields)).sort(PAGE_SORT).batch_size(batch_size)
+        async for d in cursor:
+            yield d
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter({"teacherId": str(teacher_id)}, batch_size, fields)
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter({"students": str(student_id)}, batch_size, fields)
+
     async def find_one(self, assignment_id: str) -> Optional[Assignment]:
         d = await self.col.find_one({"assignmentId": str(assignment_id)})
         return self._from_doc(d) if d else None
 
-    async def delete(self, assignment_id: str) -> bool:
-        res = await self.col.delete_one({"assignmentId": str(assignment_id)})
-        return res.deleted_count > 0
+    async def _find_in(self, assignment_ids: Sequence[str], fields: Optional[Sequence[str]]) -> List[dict]:
+        """Documenti per ID con `$in` a blocchi di BULK_CHUNK_SIZE (un round-trip per blocco)."""
+        ids = list(dict.fromkeys(str(a) for a in assignment_ids))
+        docs: List[dict] = []
+        for i in range(0, len(ids), BULK_CHUNK_SIZE):
+            cursor = self.col.find({"assignmentId": {"$in": ids[i:i + BULK_CHUNK_SIZE]}}, self._projection(fields))
+            docs.extend([d async for d in cursor])
+        return docs
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        return [self._view_from_doc(d) for d in await self._find_in(assignment_ids, AUDIENCE_FIELDS)]
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        d = await self.col.find_one({"assignmentId": str(assignment_id), "teacherId": str(teacher_id)})
+        return self._from_doc(d) if d else None
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        student_id = str(student_id)
+        d = await self.col.find_one(
+            {"assignmentId": str(assignment_id), "students": student_id},
+            {**_STUDENT_VIEW_FIELDS, "_id": 0, "students": {"$elemMatch": {"$eq": student_id}}},
+        )
+        return self._from_doc(d) if d else None
+
+    async def _version(self, filt: dict) -> Optional[int]:
+        # un lookup sull'indice e solo il campo version in risposta: niente content né roster
+        d = await self.col.find_one(filt, {"_id": 0, "version": 1})
+        return d.get("version", 1) if d else None
+
+    async def version_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[int]:
+        return await self._version({"assignmentId": str(assignment_id), "teacherId": str(teacher_id)})
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        return await self._version({"assignmentId": str(assignment_id), "students": str(student_id)})
+
+    async def _page_stamp(self, filt: dict, limit: Optional[int], after: Optional[PageKey]) -> PageStamp:
+        # stessa finestra della pagina, ma proiettando solo ID, updatedAt e version: servita dagli indici *_PAGE_INDEX
+        pipeline: List[dict] = [{"$match": self._page_filter(filt, after)}, {"$sort": dict(PAGE_SORT)}]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [STAMP_PROJECT, STAMP_GROUP]
+        return page_stamp(await self.col.aggregate(pipeline).to_list(length=1))
+
+    async def page_stamp_for_teacher(
+        self, teacher_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self._page_stamp({"teacherId": str(teacher_id)}, limit, after)
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        return await self._page_stamp({"students": str(student_id)}, limit, after)
+
+    async def _inc_stats(self, delta: StatsDelta, session=None) -> None:
+        # un contatore toccato non è più "da rimuovere" per la riconciliazione in corso (vedi rebuild_stats)
+        changes = [(t, c) for t, c in delta.items() if t is not None and any(c.values())]
+        if len(changes) == 1:
+            # caso comune (scritture di un solo teacher): un update senza bulk
+            teacher_id, counters = changes[0]
+            await self.stats.update_one(
+                {"_id": teacher_id}, {"$inc": counters, "$unset": {"staleSince": ""}}, upsert=True, session=session
+            )
+        elif changes:
+            # sweep: un solo round-trip per tutti i teacher del batch
+            await self.stats.bulk_write(
+                [UpdateOne({"_id": t}, {"$inc": c, "$unset": {"staleSince": ""}}, upsert=True) for t, c in changes],
+                ordered=False,
+                session=session,
+            )
+
+    async def _next_deadlines(self, pending: dict, now: datetime, limit: int) -> List[dict]:
+        if limit <= 0:
+            return []
+        cursor = (
+            self.col.find({**pending, "deadline": {"$gte": now}}, {"_id": 0, "assignmentId": 1, "deadline": 1})
+            .sort("deadline", 1)
+            .limit(limit)
+        )
+        return await cursor.to_list(length=None)
+
+    async def stats_for_teacher(self, teacher_id: str, now: datetime, upcoming: int) -> AssignmentStats:
+        teacher_id = str(teacher_id)
+        pending = {"teacherId": teacher_id, "status": {"$ne": "completed"}}
+        # contatori: un lookup per _id; scaduti e prossime deadline: range su TEACHER_DEADLINE_INDEX
+        counters, overdue, deadlines = await asyncio.gather(
+            self.stats.find_one({"_id": teacher_id}),
+            self.col.count_documents({**pending, "deadline": {"$lt": now}}),
+            self._next_deadlines(pending, now, upcoming),
+        )
+        counters = counters or {}
+        open_count, completed = max(counters.get("open", 0), 0), max(counters.get("completed", 0), 0)
+        return AssignmentStats(
+            teacherId=teacher_id,
+            total=open_count + completed,
+            open=open_count,
+            completed=completed,
+            overdue=overdue,
+            upcomingDeadlines=[UpcomingDeadline(**d) for d in deadlines],
+        )
+
+    async def rebuild_stats(self) -> int:
+        """
+        Ricalcola i contatori con un $group su tutti gli assignment e li sostituisce con $merge.
+        I teacher che non hanno più assignment vengono rimossi: prima del $group ogni contatore è
+        marcato con `staleSince`, che $merge (replace) e ogni $inc tolgono; restano marcati solo quelli
+        né ricalcolati né toccati durante la ricostruzione. Le scritture concorrenti possono lasciare
+        uno scarto fino alla successiva, ma non cancellano un contatore appena aggiornato.
+        """
+        run_at = datetime.now(timezone.utc).replace(microsecond=0)
+        await self.stats.update_many({}, {"$set": {"staleSince": run_at}})
+        await self.col.aggregate([
+            *_STATS_REBUILD,
+            {"$set": {"reconciledAt": run_at}},
+            {"$merge": {"into": STATS_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]).to_list(length=None)
+        await self.stats.delete_many({"staleSince": run_at})
+        return await self.stats.count_documents({"reconciledAt": run_at})
+
+    async def open_content(self, content_ref: str) -> Optional[ContentBlob]:
+        return await self.contents.open(content_ref)
+
+    async def exists(self, assignment_id: str) -> bool:
+        # coperta dall'indice su assignmentId: nessun documento viene letto
+        d = await self.col.find_one({"assignmentId": str(assignment_id)}, {"_id": 0, "assignmentId": 1})
+        return d is not None
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        async def write(session=None) -> bool:
+            # teacherId e status del documento rimosso: servono ai contatori
+            d = await self.col.find_one_and_delete(
+                {"assignmentId": str(assignment_id)}, {"_id": 0, "teacherId": 1, "status": 1}, session=session
+            )
+            if d is None:
+                return False
+            await self._inc_stats(stats_delta([(d.get("teacherId"), d.get("status"))], sign=-1), session=session)
+            if deleted_event is not None:
+                await self._enqueue([deleted_event(str(assignment_id))], session=session)
+            return True
+
+        # con un evento da accodare: stessa transazione della cancellazione, come in create
+        return await (self._atomically(write) if deleted_event is not None else write())
     
-    async def update_assignment_state(self, ts: datetime) -> List[str]:
+    @staticmethod
+    def _owned_filter(teacher_id: str, assignment_ids: Optional[Sequence[str]]) -> dict:
+        # l'ownership è nel filtro stesso: ID di altri teacher semplicemente non matchano
+        filt = {"teacherId": str(teacher_id)}
+        if assignment_ids is not None:
+            filt["assignmentId"] = {"$in": [str(a) for a in assignment_ids]}
+        return filt
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        filt = self._owned_filter(teacher_id, assignment_ids)
 
-        # 1) Leggo gli assignment scaduti e non completati
+        async def delete_chunk(session=None) -> List[str]:
+            # un chunk per round-trip: lettura dei soli ID e delete_many con lo stesso filtro di ownership;
+            # una delete per stato, così i contatori scalano quanto rimosso davvero anche con uno sweep in corso
+            docs = await self.col.find(
+                filt, {"_id": 1, "assignmentId": 1}, session=session
+            ).limit(BULK_CHUNK_SIZE).to_list(length=None)
+            if not docs:
+                return []
+            ids = [d["_id"] for d in docs]
+            removed = {}
+            for status, status_filt in (("completed", "completed"), ("open", {"$ne": "completed"})):
+                res = await self.col.delete_many({"_id": {"$in": ids}, **filt, "status": status_filt}, session=session)
+                removed[status] = -res.deleted_count
+            await self._inc_stats({str(teacher_id): removed}, session=session)
+            chunk = [d["assignmentId"] for d in docs]
+            if deleted_event is not None:
+                await self._enqueue([deleted_event(a) for a in chunk], session=session)
+            return chunk
+
+        deleted: List[str] = []
+        while True:
+            # ogni chunk in una transazione con i suoi eventi "deleted"
+            chunk = await (self._atomically(delete_chunk) if deleted_event is not None else delete_chunk())
+            deleted.extend(chunk)
+            if len(chunk) < BULK_CHUNK_SIZE:
+                return deleted
+
+    async def shift_deadlines(
+        self,
+        teacher_id: str,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+        shifted_event: Optional[ShiftedEvent] = None,
+    ) -> List[Tuple[str, datetime]]:
+        filt = {**self._owned_filter(teacher_id, assignment_ids), "status": {"$ne": "completed"}}
+        shift_ms = int(delta.total_seconds() * 1000)
+
+        async def shift_chunk(last_id, session=None) -> Tuple[list, List[Tuple[str, datetime]]]:
+            page = filt if last_id is None else {**filt, "_id": {"$gt": last_id}}
+            docs = await self.col.find(
+                page, {"_id": 1}, session=session
+            ).sort("_id", 1).limit(BULK_CHUNK_SIZE).to_list(length=None)
+            if not docs:
+                return [], []
+            ids = [d["_id"] for d in docs]
+            await self.col.update_many(
+                {"_id": {"$in": ids}, **filt},
+                [{"$set": {
+                    "deadline": {"$add": ["$deadline", shift_ms]},
+                    "updatedAt": "$$NOW",
+                    "version": NEXT_VERSION,
+                }}],
+                session=session,
+            )
+            updated = self.col.find({"_id": {"$in": ids}}, {"_id": 0, "assignmentId": 1, "deadline": 1}, session=session)
+            chunk = [(d["assignmentId"], d["deadline"]) async for d in updated]
+            if shifted_event is not None:
+                await self._enqueue([shifted_event(a, deadline) for a, deadline in chunk], session=session)
+            return ids, chunk
+
+        shifted: List[Tuple[str, datetime]] = []
+        last_id = None
+        while True:
+            write = partial(shift_chunk, last_id)
+            ids, chunk = await (self._atomically(write) if shifted_event is not None else write())
+            shifted.extend(chunk)
+            if len(ids) < BULK_CHUNK_SIZE:
+                return shifted
+            last_id = ids[-1]
+
+    async def enqueue_events(self, events: Sequence[AssignmentStatusEvent]) -> None:
+        if not events:
+            return
+        try:
+            await self.outbox.insert_many([outbox_doc(e) for e in events], ordered=False)
+        except BulkWriteError as exc:
+            # duplicati di messageId: l'evento è già in coda
+            if any(e.get("code") != _DUPLICATE_KEY for e in exc.details.get("writeErrors", [])):
+                raise
+
+    async def _enqueue(self, events: Sequence[AssignmentStatusEvent], session=None) -> None:
+        """
+        enqueue_events dentro una transazione: un duplicato di messageId la annullerebbe,
+        quindi si leggono prima quelli già in coda (con la stessa sessione) e si inseriscono gli altri.
+        """
+        if session is None:
+            await self.enqueue_events(events)
+            return
+        docs = {d["_id"]: d for d in (outbox_doc(e) for e in events)}
+        if not docs:
+            return
+        queued = self.outbox.find({"_id": {"$in": list(docs)}}, {"_id": 1}, session=session)
+        async for d in queued:
+            docs.pop(d["_id"], None)
+        if docs:
+            await self.outbox.insert_many(list(docs.values()), session=session)
+
+    async def update_assignment_state(self, ts: datetime, limit: Optional[int] = None) -> List[str]:
+
+        # 1) Leggo (al massimo `limit`) assignment scaduti e non completati, i più vecchi per primi
         filt = {"deadline": {"$lt": ts}, "status": {"$ne": "completed"}}
-        docs = await self.col.find(filt, {"_id": 1, "assignmentId": 1}).to_list(length=None)
+        cursor = self.col.find(filt, {"_id": 1}).sort("deadline", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        docs = await cursor.to_list(length=None)
         if not docs:
-            return ([])
+            return []
 
         ids = [d["_id"] for d in docs]
-        assignment_ids = [d.get("assignmentId") for d in docs if d.get("assignmentId") is not None]
 
-        # 2) Aggiorno solo quelli trovati
+        # 2) Li "reclamo" con un token: il filtro su status garantisce che, tra più repliche,
+        #    ogni documento venga transizionato da una sola
+        token = uuid.uuid4().hex
         res = await self.col.update_many(
             {"_id": {"$in": ids}, "status": {"$ne": "completed"}},
-            {"$set": {"status": "completed", "completedAt": ts}},
+            [{"$set": {
+                "status": "completed", "completedAt": ts, "sweepId": token, "updatedAt": ts, "version": NEXT_VERSION,
+            }}],
         )
+        if res.modified_count == 0:
+            return []
+
+        # 3) Ritorno solo quelli effettivamente transizionati da questa chiamata
+        claimed = await self.col.find(
+            {"_id": {"$in": ids}, "sweepId": token}, {"_id": 0, "assignmentId": 1, "teacherId": 1}
+        ).to_list(length=None)
+        # da aperti a completati (un'interruzione qui la sistema la riconciliazione dei contatori)
+        moved = stats_delta((d.get("teacherId"), "completed") for d in claimed)
+        for counters in moved.values():
+            counters["open"] = -counters["completed"]
+        await self._inc_stats(moved)
+        return [d["assignmentId"] for d in claimed if d.get("assignmentId") is not None]
+
+    async def upcoming_deadlines(self, after: datetime, limit: int) -> List[datetime]:
+        # servito dall'indice (deadline, status)
+        cursor = (
+            self.col.find({"deadline": {"$gte": after}, "status": {"$ne": "completed"}}, {"_id": 0, "deadline": 1})
+            .sort("deadline", 1)
+            .limit(limit)
+        )
+        return [d["deadline"] async for d in cursor]
+
+    async def oldest_overdue(self, now: datetime) -> Optional[datetime]:
+        # prima voce dell'indice (deadline, status): query coperta
+        d = await self.col.find_one(
+            {"deadline": {"$lt": now}, "status": {"$ne": "completed"}},
+            {"_id": 0, "deadline": 1},
+            sort=[("deadline", 1)],
+        )
+        return d["deadline"] if d else None
+
+    async def ping(self) -> None:
+        await self.col.database.command("ping")
+
+    async def _ensure_assignment_id_index(self, indexes: IndexSet):
+        """
+        Indice univoco su assignmentId. Se la collection contiene ancora ID legacy duplicati
+        (vecchio formato `as-XXXXX`) si ripiega su un indice non univoco e si logga come sistemare.
+        Se uno dei due esiste già non si tocca: dopo aver droppato quello legacy si riprova l'univoco.
+        """
+        try:
+            await indexes.ensure("assignmentId", unique=True, name=ASSIGNMENT_ID_INDEX)
+        except OperationFailure as exc:
+            if exc.code != _DUPLICATE_KEY and exc.code not in _INDEX_CONFLICT:
+                raise
+            logger.warning(
+                "Indice univoco su assignmentId non disponibile (%s). Compat mode: uso l'indice "
+                "non univoco '%s'; rimuovere i duplicati legacy e droppare l'indice per passare a quello univoco.",
+                exc, ASSIGNMENT_ID_LEGACY_INDEX,
+            )
+            await indexes.ensure("assignmentId", name=ASSIGNMENT_ID_LEGACY_INDEX)
+
+    async def _ensure_collection_indexes(self, indexes: IndexSet) -> None:
+        await self._ensure_assignment_id_index(indexes)
+        # indici composti per la keyset pagination: il prefisso copre anche i filtri semplici
+        await indexes.ensure(TEACHER_PAGE_INDEX)
+        await indexes.ensure(STUDENT_PAGE_INDEX)
+        for name in _SUPERSEDED_INDEXES:
+            if name not in indexes.names:
+                continue
+            # prefissi dei nuovi indici: solo costo in scrittura
+            try:
+                await self.col.drop_index(name)
+            except OperationFailure as exc:
+                if exc.code != _INDEX_NOT_FOUND:  # già rimosso da un'altra replica
+                    raise
+        await indexes.ensure([("deadline", 1), ("status", 1)])
+        await indexes.ensure(TEACHER_DEADLINE_INDEX)
+        # solo i documenti con contenuto in GridFS: lookup dei riferimenti nella garbage collection
+        await indexes.ensure([("contentRef", 1)], partialFilterExpression={"contentRef": {"$type": "string"}})
 
-        if (res.modified_count > 0):
-            return assignment_ids
-    
     async def ensure_indexes(self):
-        await self.col.create_index("teacherId")
-        await self.col.create_index("students")
-        await self.col.create_index([("deadline", 1), ("status", 1)])
+        # un solo listIndexes: a regime (indici già presenti) nessun createIndex all'avvio
+        await self._ensure_collection_indexes(await IndexSet.load(self.col))
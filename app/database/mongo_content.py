@@ -0,0 +1,123 @@
+# app/database/mongo_content.py
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+from app.database.content_repo import CHUNK_SIZE, ContentBlob
+
+logger = logging.getLogger(__name__)
+
+CONTENT_BUCKET = "assignment_content"
+
+
+class GridFSContent(ContentBlob):
+    def __init__(self, grid_out):
+        self._out = grid_out
+        self.length = grid_out.length
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        # seek sul chunk giusto: si leggono solo i chunk dell'intervallo richiesto
+        self._out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = await self._out.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+
+
+class MongoContentStore:
+    """
+    Contenuti degli assignment in GridFS (bucket `assignment_content`), deduplicati per sha256:
+    lo stesso testo assegnato a più classi occupa spazio una volta sola e i file sono immutabili.
+
+    Ogni upload ha un proprio file (_id ObjectId nuovo); la collection `<bucket>.refs` associa
+    {_id: sha256, fileId} e viene scritta solo a upload completato, con un insert atomico.
+    Due upload concorrenti dello stesso contenuto non condividono mai chunk: chi perde l'insert
+    cancella il proprio file e usa quello pubblicato. I file caricati prima dei refs hanno
+    _id = sha256 e si leggono ancora direttamente.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, bucket_name: str = CONTENT_BUCKET):
+        self.db = db
+        self.bucket_name = bucket_name
+        self._bucket: Optional[AsyncIOMotorGridFSBucket] = None
+        self.files = db[f"{bucket_name}.files"]
+        self.chunks = db[f"{bucket_name}.chunks"]
+        self.refs = db[f"{bucket_name}.refs"]
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # creato al primo uso: con l'offload disattivato e nessun contentRef non serve
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name, chunk_size_bytes=CHUNK_SIZE)
+        return self._bucket
+
+    async def _touch(self, ref: str) -> bool:
+        # un contenuto riusato torna "giovane": la garbage collection non lo tocca per `grace`
+        touched = await self.refs.update_one({"_id": ref}, {"$set": {"uploadDate": datetime.now(timezone.utc)}})
+        return bool(touched.matched_count)
+
+    async def put(self, ref: str, data: bytes) -> None:
+        """Salva il contenuto se non c'è già (dedupe per hash)."""
+        if await self._touch(ref):
+            return
+        file_id = ObjectId()
+        await self.bucket.upload_from_stream_with_id(file_id, ref, data)
+        try:
+            await self.refs.insert_one({"_id": ref, "fileId": file_id, "uploadDate": datetime.now(timezone.utc)})
+        except DuplicateKeyError:
+            # un upload concorrente ha pubblicato lo stesso contenuto: si cancella solo il proprio file
+            await self._delete_file(file_id)
+            await self._touch(ref)
+
+    async def _delete_file(self, file_id) -> None:
+        try:
+            await self.bucket.delete(file_id)
+        except NoFile:
+            pass
+
+    async def open(self, ref: str) -> Optional[ContentBlob]:
+        published = await self.refs.find_one({"_id": ref}, {"_id": 0, "fileId": 1})
+        try:
+            return GridFSContent(await self.bucket.open_download_stream(published["fileId"] if published else ref))
+        except NoFile:
+            return None
+
+    async def collect_garbage(self, assignments, grace: timedelta = timedelta(hours=1)) -> int:
+        """
+        Rimuove i contenuti non più referenziati da nessun assignment. Solo quelli più vecchi di `grace`:
+        un upload appena fatto potrebbe non avere ancora il suo assignment.
+
+        Tolto il ref, un put concorrente dello stesso contenuto carica un file nuovo: si cancella
+        solo il file del ref rimosso. Poi i file senza ref (upload interrotti prima dell'insert,
+        file precedenti ai refs non più usati) più vecchi del cutoff.
+        """
+        cutoff = datetime.now(timezone.utc) - grace
+        removed = 0
+        async for r in self.refs.find({"uploadDate": {"$lt": cutoff}}):
+            if await assignments.find_one({"contentRef": r["_id"]}, {"_id": 0, "contentRef": 1}):
+                continue
+            # il filtro su uploadDate salta i contenuti riusati (put) dopo il controllo dei riferimenti
+            res = await self.refs.delete_one({"_id": r["_id"], "uploadDate": {"$lt": cutoff}})
+            if res.deleted_count:
+                await self._delete_file(r["fileId"])
+                removed += 1
+
+        published = {r["fileId"] async for r in self.refs.find({}, {"fileId": 1})}
+        async for f in self.files.find({"uploadDate": {"$lt": cutoff}}, {"_id": 1}):
+            if f["_id"] in published:
+                continue
+            # file senza ref con _id = sha256: letto ancora direttamente se qualche assignment lo usa
+            legacy = isinstance(f["_id"], str) and not await self.refs.find_one({"_id": f["_id"]}, {"_id": 1})
+            if legacy and await assignments.find_one({"contentRef": f["_id"]}, {"_id": 0, "contentRef": 1}):
+                continue
+            await self._delete_file(f["_id"])
+            removed += 1
+        return removed
@@ -0,0 +1,40 @@
+# app/database/mongo_indexes.py
+from typing import Any, Dict, Sequence, Tuple, Union
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+IndexKeys = Union[str, Sequence[Tuple[str, Any]]]
+
+
+def _key_spec(keys: IndexKeys) -> Tuple[Tuple[str, Any], ...]:
+    if isinstance(keys, str):
+        return ((keys, 1),)
+    # le direzioni create da shell possono essere double (1.0): stesso indice di 1
+    return tuple((field, int(d) if isinstance(d, (int, float)) else d) for field, d in keys)
+
+
+class IndexSet:
+    """
+    Indici esistenti di una collection, letti con un solo listIndexes: all'avvio si creano solo
+    quelli mancanti invece di un createIndex (round-trip e lock sulla collection) per ognuno.
+    Un indice con le stesse chiavi ma opzioni diverse conta come esistente (create_index fallirebbe).
+    """
+
+    def __init__(self, col: AsyncIOMotorCollection, info: Dict[str, dict]):
+        self.col = col
+        self.names = set(info)
+        self.keys = {_key_spec(spec["key"]) for spec in info.values()}
+
+    @classmethod
+    async def load(cls, col: AsyncIOMotorCollection) -> "IndexSet":
+        return cls(col, await col.index_information())  # {} se la collection non esiste ancora
+
+    def has(self, keys: IndexKeys) -> bool:
+        return _key_spec(keys) in self.keys
+
+    async def ensure(self, keys: IndexKeys, **kwargs) -> None:
+        if self.has(keys):
+            return
+        name = await self.col.create_index(keys, **kwargs)
+        self.names.add(name)
+        self.keys.add(_key_spec(keys))
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class MongoLease:
+    """
+    Lease cooperativo su Mongo: un documento per nome con owner e scadenza.
+    Chi lo detiene lo rinnova a ogni acquire(); se l'owner muore, alla scadenza lo prende un'altra replica.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, name: str, owner: str, ttl_seconds: float):
+        self.col = db["leases"]
+        self.name = name
+        self.owner = owner
+        self.ttl = timedelta(seconds=ttl_seconds)
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.col.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expiresAt": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expiresAt": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # il documento esiste ed è di un altro owner non ancora scaduto: l'upsert collide sull'_id
+            return False
+        return doc is not None and doc.get("owner") == self.owner
+
+    async def release(self) -> None:
+        await self.col.delete_one({"_id": self.name, "owner": self.owner})
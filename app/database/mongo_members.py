@@ -0,0 +1,296 @@
+# app/database/mongo_members.py
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+from app.database.assignment_repo import AUDIENCE_FIELDS, DeletedEvent, PageKey, PageStamp
+from app.database.mongo_indexes import IndexSet
+from app.database.mongo_assignment import (
+    BULK_CHUNK_SIZE, PAGE_SORT, STAMP_GROUP, STAMP_PROJECT, ContentPointer, MongoAssignmentRepository, page_stamp,
+)
+from app.schemas.assignment import Assignment, AssignmentView
+
+MEMBERS_COLLECTION = "assignment_members"
+MEMBER_UNIQUE_INDEX = "assignmentId_studentId_unique"
+_DUPLICATE_KEY = 11000
+
+
+def member_docs(assignment_id: str, created_at: datetime, students: Iterable[str]) -> List[dict]:
+    """Un documento piccolo per (assignmentId, studentId); createdAt è copiato per la keyset pagination."""
+    return [
+        {"assignmentId": assignment_id, "studentId": str(s), "createdAt": created_at}
+        for s in dict.fromkeys(students)
+    ]
+
+
+def _chunks(items: Sequence, size: int = BULK_CHUNK_SIZE) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def insert_members(members: AsyncIOMotorCollection, docs: Sequence[dict], session=None) -> None:
+    """insert_many non ordinati a blocchi; i membri già presenti (retry, migrazione ripresa) sono ignorati."""
+    for chunk in _chunks(docs):
+        try:
+            await members.insert_many(list(chunk), ordered=False, session=session)
+        except BulkWriteError as exc:
+            if any(e.get("code") != _DUPLICATE_KEY for e in exc.details.get("writeErrors", [])):
+                raise
+
+
+class MongoMemberAssignmentRepository(MongoAssignmentRepository):
+    """
+    Variante con le iscrizioni nella collection `assignment_members` invece che embedded in `students`.
+
+    Il documento dell'assignment resta piccolo (solo `studentCount`), le letture per studente
+    partono dall'indice (studentId, createdAt, assignmentId) sui membri e recuperano gli assignment
+    con `$in` a blocchi. Agli studenti viene restituito come roster solo sé stessi; il roster
+    completo viene ricostruito solo per le letture del teacher.
+
+    Scritture: i membri vanno nella stessa transazione dell'assignment (e del suo outbox), quindi
+    chi legge l'assignment dopo il commit (es. il change stream) trova il roster completo.
+    Su standalone prima l'assignment e poi i membri: un errore tra le due lascia un assignment
+    non ancora visibile agli studenti, mai uno studente iscritto a un assignment inesistente.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, content_offload_bytes: int = 0):
+        super().__init__(db, content_offload_bytes=content_offload_bytes)
+        self.members = db[MEMBERS_COLLECTION]
+
+    # ---------- scrittura ----------
+
+    def _to_doc_from_model(self, a: Assignment, content: Optional[ContentPointer] = None) -> dict:
+        doc = super()._to_doc_from_model(a, content)
+        doc.pop("students", None)
+        doc["studentCount"] = len(set(a.students))
+        return doc
+
+    async def _insert_linked(self, assignments: Sequence[Assignment], session=None) -> None:
+        # solo assignment appena inseriti: eventuali membri con lo stesso ID sono resti di una delete
+        # interrotta su standalone, e in transazione un duplicato annullerebbe l'intera scrittura
+        await self._delete_members([a.assignmentId for a in assignments], session=session)
+        await insert_members(
+            self.members,
+            [m for a in assignments for m in member_docs(a.assignmentId, a.createdAt, a.students)],
+            session=session,
+        )
+
+    async def _delete_members(self, assignment_ids: Sequence[str], session=None) -> None:
+        for chunk in _chunks(list(assignment_ids)):
+            await self.members.delete_many({"assignmentId": {"$in": list(chunk)}}, session=session)
+
+    async def delete(self, assignment_id: str, deleted_event: Optional[DeletedEvent] = None) -> bool:
+        deleted = await super().delete(assignment_id, deleted_event)
+        await self._delete_members([str(assignment_id)])
+        return deleted
+
+    async def delete_many(
+        self,
+        teacher_id: str,
+        assignment_ids: Optional[Sequence[str]] = None,
+        deleted_event: Optional[DeletedEvent] = None,
+    ) -> List[str]:
+        deleted = await super().delete_many(teacher_id, assignment_ids, deleted_event)
+        await self._delete_members(deleted)
+        return deleted
+
+    # ---------- lettura ----------
+
+    async def _rosters(self, assignment_ids: Sequence[str]) -> Dict[str, List[str]]:
+        """Roster completi per più assignment con una query per blocco (indice assignmentId, studentId)."""
+        rosters: Dict[str, List[str]] = defaultdict(list)
+        for chunk in _chunks(list(assignment_ids)):
+            cursor = self.members.find(
+                {"assignmentId": {"$in": list(chunk)}}, {"_id": 0, "assignmentId": 1, "studentId": 1}
+            ).sort([("assignmentId", 1), ("studentId", 1)])
+            async for m in cursor:
+                rosters[m["assignmentId"]].append(m["studentId"])
+        return rosters
+
+    async def _with_rosters(self, docs: List[dict]) -> List[dict]:
+        if not docs:
+            return docs
+        rosters = await self._rosters([d["assignmentId"] for d in docs])
+        for d in docs:
+            d["students"] = rosters.get(d["assignmentId"], [])
+        return docs
+
+    async def _fetch_in_order(self, assignment_ids: Sequence[str], fields: Optional[Sequence[str]]) -> List[dict]:
+        """Recupera gli assignment con `$in` preservando l'ordine degli ID (quello dell'indice dei membri)."""
+        if not assignment_ids:
+            return []
+        query_fields, strip_id = self._with_id(fields)
+        cursor = self.col.find({"assignmentId": {"$in": list(assignment_ids)}}, self._projection(query_fields))
+        by_id = {d["assignmentId"]: d async for d in cursor}
+        docs = [by_id[a] for a in assignment_ids if a in by_id]
+        return self._strip_id(docs) if strip_id else docs
+
+    async def _member_keys(self, student_id: str, limit: Optional[int], after: Optional[PageKey]) -> List[PageKey]:
+        filt = self._page_filter({"studentId": str(student_id)}, after)
+        cursor = self.members.find(filt, {"_id": 0, "createdAt": 1, "assignmentId": 1}).sort(PAGE_SORT)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [(m["createdAt"], m["assignmentId"]) async for m in cursor]
+
+    async def _iter_member_pages(self, student_id: str, batch_size: int) -> AsyncIterator[List[str]]:
+        after: Optional[PageKey] = None
+        while True:
+            keys = await self._member_keys(student_id, batch_size, after)
+            if keys:
+                yield [k[1] for k in keys]
+            if len(keys) < batch_size:
+                return
+            after = keys[-1]
+
+    @staticmethod
+    def _with_id(fields: Optional[Sequence[str]]):
+        """Campi da leggere perché l'assignmentId (chiave di join) sia sempre presente, e se va poi rimosso."""
+        if fields is None or "assignmentId" in fields:
+            return fields, False
+        return [*fields, "assignmentId"], True
+
+    @staticmethod
+    def _strip_id(docs: List[dict]) -> List[dict]:
+        for d in docs:
+            d.pop("assignmentId", None)
+        return docs
+
+    @staticmethod
+    def _wants_roster(fields: Optional[Sequence[str]]) -> bool:
+        return fields is None or "students" in fields
+
+    def _only_self(self, docs: List[dict], student_id: str, fields: Optional[Sequence[str]] = None) -> List[dict]:
+        if self._wants_roster(fields):
+            for d in docs:
+                d["students"] = [str(student_id)]
+        return docs
+
+    async def find_for_teacher(self, teacher_id: str) -> Sequence[Assignment]:
+        docs = [d async for d in self.col.find({"teacherId": str(teacher_id)}, {"_id": 0})]
+        return [self._from_doc(d) for d in await self._with_rosters(docs)]
+
+    async def find_for_student(self, student_id: str) -> Sequence[Assignment]:
+        docs: List[dict] = []
+        async for ids in self._iter_member_pages(student_id, BULK_CHUNK_SIZE):
+            docs.extend(await self._fetch_in_order(ids, None))
+        return [self._from_doc(d) for d in self._only_self(docs, student_id)]
+
+    async def find_page_for_teacher(
+        self,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        if not self._wants_roster(fields):
+            return await super().find_page_for_teacher(teacher_id, limit, after, fields)
+        query_fields, strip_id = self._with_id(fields)
+        cursor = self.col.find(
+            self._page_filter({"teacherId": str(teacher_id)}, after), self._projection(query_fields)
+        ).sort(PAGE_SORT)
+        if limit:
+            cursor = cursor.limit(limit)
+        docs = await self._with_rosters([d async for d in cursor])
+        return [self._view_from_doc(d) for d in (self._strip_id(docs) if strip_id else docs)]
+
+    async def find_page_for_student(
+        self,
+        student_id: str,
+        limit: Optional[int] = None,
+        after: Optional[PageKey] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[AssignmentView]:
+        keys = await self._member_keys(student_id, limit, after)
+        docs = await self._fetch_in_order([k[1] for k in keys], fields)
+        return [self._view_from_doc(d) for d in self._only_self(docs, student_id, fields)]
+
+    async def _iter_teacher_with_rosters(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]]
+    ) -> AsyncIterator[dict]:
+        query_fields, strip_id = self._with_id(fields)
+        batch: List[dict] = []
+        async for d in self._iter({"teacherId": str(teacher_id)}, batch_size, query_fields):
+            batch.append(d)
+            if len(batch) >= batch_size:
+                docs = await self._with_rosters(batch)
+                for doc in self._strip_id(docs) if strip_id else docs:
+                    yield doc
+                batch = []
+        docs = await self._with_rosters(batch)
+        for doc in self._strip_id(docs) if strip_id else docs:
+            yield doc
+
+    def iter_for_teacher(
+        self, teacher_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        if not self._wants_roster(fields):
+            return super().iter_for_teacher(teacher_id, batch_size, fields)
+        return self._iter_teacher_with_rosters(teacher_id, batch_size, fields)
+
+    async def _iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]]
+    ) -> AsyncIterator[dict]:
+        async for ids in self._iter_member_pages(student_id, batch_size):
+            for d in self._only_self(await self._fetch_in_order(ids, fields), student_id, fields):
+                yield d
+
+    def iter_for_student(
+        self, student_id: str, batch_size: int, fields: Optional[Sequence[str]] = None
+    ) -> AsyncIterator[dict]:
+        return self._iter_for_student(student_id, batch_size, fields)
+
+    async def find_one(self, assignment_id: str) -> Optional[Assignment]:
+        d = await self.col.find_one({"assignmentId": str(assignment_id)}, {"_id": 0})
+        if not d:
+            return None
+        return self._from_doc((await self._with_rosters([d]))[0])
+
+    async def find_audiences(self, assignment_ids: Sequence[str]) -> List[AssignmentView]:
+        docs = await self._with_rosters(await self._find_in(assignment_ids, AUDIENCE_FIELDS))
+        return [self._view_from_doc(d) for d in docs]
+
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str) -> Optional[Assignment]:
+        d = await self.col.find_one({"assignmentId": str(assignment_id), "teacherId": str(teacher_id)}, {"_id": 0})
+        if not d:
+            return None
+        return self._from_doc((await self._with_rosters([d]))[0])
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str) -> Optional[Assignment]:
+        member = await self.members.find_one(
+            {"assignmentId": str(assignment_id), "studentId": str(student_id)}, {"_id": 0, "assignmentId": 1}
+        )
+        if not member:
+            return None
+        d = await self.col.find_one({"assignmentId": str(assignment_id)}, {"_id": 0})
+        return self._from_doc(self._only_self([d], student_id)[0]) if d else None
+
+    async def version_for_student(self, assignment_id: str, student_id: str) -> Optional[int]:
+        member = await self.members.find_one(
+            {"assignmentId": str(assignment_id), "studentId": str(student_id)}, {"_id": 0, "assignmentId": 1}
+        )
+        return await self._version({"assignmentId": str(assignment_id)}) if member else None
+
+    async def page_stamp_for_student(
+        self, student_id: str, limit: Optional[int] = None, after: Optional[PageKey] = None
+    ) -> PageStamp:
+        # chiavi dall'indice dei membri, il resto dall'indice (assignmentId, updatedAt, version)
+        keys = await self._member_keys(student_id, limit, after)
+        if not keys:
+            return page_stamp([])
+        return page_stamp(await self.col.aggregate([
+            {"$match": {"assignmentId": {"$in": [k[1] for k in keys]}}}, STAMP_PROJECT, STAMP_GROUP,
+        ]).to_list(length=1))
+
+    async def _ensure_collection_indexes(self, indexes: IndexSet) -> None:
+        await super()._ensure_collection_indexes(indexes)
+        await indexes.ensure([("assignmentId", 1), ("updatedAt", 1), ("version", 1)])
+
+    async def ensure_indexes(self):
+        await super().ensure_indexes()
+        # roster e membership per assignment; keyset pagination per studente
+        members = await IndexSet.load(self.members)
+        await members.ensure([("assignmentId", 1), ("studentId", 1)], unique=True, name=MEMBER_UNIQUE_INDEX)
+        await members.ensure([("studentId", 1), *PAGE_SORT])
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.database.mongo_indexes import IndexSet
+from app.database.outbox_repo import OutboxEntry, OutboxRepo
+from app.schemas.events import AssignmentStatusEvent
+
+OUTBOX_COLLECTION = "assignment_outbox"
+_MAX_BACKOFF_EXPONENT = 6
+
+
+def outbox_doc(event: AssignmentStatusEvent) -> dict:
+    """Documento di outbox: l'_id è il messageId, quindi lo stesso evento non viene accodato due volte."""
+    now = datetime.now(timezone.utc)
+    message_id = event.messageId or event.assignmentId
+    return {
+        "_id": message_id,
+        "event": event.model_dump(),
+        "createdAt": now,
+        "attempts": 0,
+        "nextAttemptAt": now,
+        "claimId": None,
+    }
+
+
+class MongoOutboxRepository(OutboxRepo):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.col = db[OUTBOX_COLLECTION]
+
+    async def claim_batch(self, now: datetime, limit: int, claim_seconds: float) -> List[OutboxEntry]:
+        ready = {"nextAttemptAt": {"$lte": now}}
+        docs = await self.col.find(ready, {"_id": 1}).sort("nextAttemptAt", 1).limit(limit).to_list(length=None)
+        if not docs:
+            return []
+
+        # stesso schema dello sweeper: reclamo con un token e rileggo solo quelli presi da me
+        token = uuid.uuid4().hex
+        await self.col.update_many(
+            {"_id": {"$in": [d["_id"] for d in docs]}, **ready},
+            {"$set": {"claimId": token, "nextAttemptAt": now + timedelta(seconds=claim_seconds)}},
+        )
+        claimed = self.col.find({"claimId": token}, {"event": 1}).sort("createdAt", 1)
+        return [(d["_id"], AssignmentStatusEvent.model_construct(**d["event"])) async for d in claimed]
+
+    async def ack(self, ids: Sequence[str]) -> None:
+        if ids:
+            await self.col.delete_many({"_id": {"$in": list(ids)}})
+
+    async def retry(self, ids: Sequence[str], now: datetime, base_delay_seconds: float) -> None:
+        if not ids:
+            return
+        delay_ms = base_delay_seconds * 1000
+        await self.col.update_many(
+            {"_id": {"$in": list(ids)}},
+            [
+                {"$set": {
+                    "claimId": None,
+                    "nextAttemptAt": {"$add": [
+                        now,
+                        {"$multiply": [delay_ms, {"$pow": [2, {"$min": ["$attempts", _MAX_BACKOFF_EXPONENT]}]}]},
+                    ]},
+                    "attempts": {"$add": ["$attempts", 1]},
+                }},
+            ],
+        )
+
+    async def ensure_indexes(self):
+        indexes = await IndexSet.load(self.col)
+        await indexes.ensure("nextAttemptAt")
+        await indexes.ensure("claimId")
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+from app.schemas.events import AssignmentStatusEvent
+
+# (id del record di outbox, evento da pubblicare)
+OutboxEntry = Tuple[str, AssignmentStatusEvent]
+
+class OutboxRepo(ABC):
+    @abstractmethod
+    async def claim_batch(self, now: datetime, limit: int, claim_seconds: float) -> List[OutboxEntry]:
+        """Prende in carico (al massimo `limit`) eventi pronti; restano di questa replica per `claim_seconds`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def ack(self, ids: Sequence[str]) -> None:
+        """Rimuove dall'outbox gli eventi pubblicati con successo."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def retry(self, ids: Sequence[str], now: datetime, base_delay_seconds: float) -> None:
+        """Rimette in coda gli eventi falliti con backoff esponenziale sul numero di tentativi."""
+        raise NotImplementedError
@@ -0,0 +1,48 @@
+# app/database/reconcile_stats.py
+"""
+Riconciliazione dei contatori per teacher (collection `assignment_stats`).
+
+    python -m app.database.reconcile_stats
+
+Legge MONGO_URI / MONGO_DB_NAME dall'ambiente (o da --mongo-uri / --db).
+I contatori sono mantenuti con $inc da create, delete e sweep; questo job li ricalcola da zero
+con un'aggregazione ($group + $merge). Va eseguito una volta dopo il primo deploy (gli assignment
+esistenti non sono ancora contati) e poi periodicamente, es. come CronJob notturno, per assorbire
+gli scarti lasciati da processi interrotti tra la scrittura e l'aggiornamento dei contatori.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.database.mongo_assignment import STATS_COLLECTION, MongoAssignmentRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def run(mongo_uri: str, db_name: str) -> int:
+    client = AsyncIOMotorClient(mongo_uri, uuidRepresentation="standard")
+    try:
+        return await MongoAssignmentRepository(client[db_name]).rebuild_stats()
+    finally:
+        client.close()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default=os.getenv("MONGO_DB_NAME"))
+    args = parser.parse_args(argv)
+    if not args.mongo_uri or not args.db:
+        parser.error("MONGO_URI e MONGO_DB_NAME (o --mongo-uri / --db) sono obbligatori")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s :: %(message)s")
+    teachers = asyncio.run(run(args.mongo_uri, args.db))
+    logger.info("Completato: contatori di %d teacher ricalcolati in %s", teachers, STATS_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
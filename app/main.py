@@ -1,16 +1,31 @@
 # app/main.py
 import asyncio
 from contextlib import asynccontextmanager
+from functools import partial
 import logging
+import os
+import socket
 import sys
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.core.config import settings
-from app.database.mongo_assignment import MongoAssignmentRepository
-from app.services.assignment_service import AssignmentService
-from app.services.publisher_service import AssignmentPublisher
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.core.workers import claim_background_role
+from app.database.assignment_repo import AssignmentRepo
+from app.database.cached_assignment import CachedAssignmentRepository
+from app.database.eventing_assignment import EventingAssignmentRepository
+from app.database.instrumented_assignment import InstrumentedAssignmentRepository
+from app.database.memory_assignment import MemoryAssignmentRepository, MemoryOutboxRepository
+from app.database.outbox_repo import OutboxRepo
+from app.services.auth_service import AuthService
+from app.services.event_bus import AssignmentEventBus
+from app.services.health_service import HealthMonitor
+from app.services.outbox_service import OutboxRelay
+from app.services.sweeper_service import DeadlineSweeper
+from app.routers import metrics
 from app.routers.v1 import health
 from app.routers.v1 import assignment
 
@@ -22,65 +37,283 @@ logging.basicConfig(
 
 # opzionale: più verboso solo per i nostri namespace
 logging.getLogger("report.publisher").setLevel(logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def _mongo_client_options() -> dict:
+    # pool per processo (vedi Settings): i None lasciano il default del driver
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    }
+    return {k: v for k, v in options.items() if v is not None}
+
+async def _ensure_indexes(repo: AssignmentRepo, outbox: Optional[OutboxRepo]) -> None:
+    await repo.ensure_indexes()
+    if outbox is not None:
+        await outbox.ensure_indexes()
+
+async def _retry_in_background(name: str, step: Callable[[], Awaitable[Any]], max_delay: float = 30.0) -> None:
+    """Avvio in background: ripete `step` con backoff finché non riesce (la dipendenza può arrivare dopo il pod)."""
+    delay = 1.0
+    while True:
+        try:
+            await step()
+            logger.info("Avvio in background: %s completato.", name)
+            return
+        except Exception as exc:
+            logger.warning("Avvio in background: %s fallito (%s), nuovo tentativo tra %.0fs.", name, exc, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+def _warn_in_process_events(source: str) -> None:
+    """Eventi SSE dalle sole scritture di questo processo: con più worker ogni client ne perde una parte."""
+    if settings.web_workers != 1:
+        logger.error(
+            "Change stream non disponibili con WEB_WORKERS=%s: ogni client SSE riceve solo le scritture "
+            "del worker a cui è connesso. Usare un replica set oppure WEB_WORKERS=1.", settings.web_workers,
+        )
+    elif source == "change_stream":
+        logger.warning("Change stream non disponibili: eventi SSE solo dalle scritture di questo processo.")
+
+def _warn_local_deadlines() -> None:
+    """Sweeper a timer senza change stream: vede subito solo le deadline create da questo processo."""
+    if settings.web_workers != 1:
+        logger.error(
+            "SWEEP_MODE=timer con WEB_WORKERS=%s senza change stream: le deadline create dagli altri worker "
+            "si chiudono solo alla riconciliazione (ogni %.0fs).", settings.web_workers, settings.sweep_interval_seconds,
+        )
+
+async def _switch_to_change_stream(watcher: Any, eventing: EventingAssignmentRepository, source: str) -> None:
+    """
+    Avvio in background: finché Mongo non risponde gli eventi SSE vengono dalle scritture locali;
+    se ci sono i change stream il watcher subentra appena il primo stream è aperto
+    (nel passaggio un client può ricevere la stessa notifica due volte, mai perderla).
+    """
+    from app.services.change_stream_service import supports_change_streams
+
+    await _retry_in_background("connessione a MongoDB", lambda: watcher.db.command("ping"))
+    if not await supports_change_streams(watcher.db):
+        _warn_in_process_events(source)
+        if watcher.on_deadline is not None:
+            _warn_local_deadlines()
+        return
+    await watcher.prepare()
+
+    async def hand_over() -> None:
+        await watcher.started.wait()
+        eventing.enabled = False
+
+    await asyncio.gather(watcher.run(), hand_over())
+
+async def _sweep_when_ready(publisher: Any, sweeper: DeadlineSweeper, tasks: List[asyncio.Task]) -> None:
+    # lo sweep pubblica i "completed" direttamente (non dall'outbox): parte solo con il broker connesso
+    await publisher.wait_ready()
+    tasks.append(asyncio.create_task(sweeper.run()))
+
+def create_app(
+    repo: Optional[AssignmentRepo] = None,
+    publisher: Optional[Any] = None,
+    outbox: Optional[OutboxRepo] = None,
+) -> FastAPI:
+    """
+    Senza argomenti usa MongoDB e RabbitMQ dalla configurazione.
+    `repo` / `publisher` / `outbox` permettono di iniettare backend alternativi (benchmark, dev locale):
+    con un repo iniettato non c'è lease dello sweeper, e senza outbox il relay non parte.
+
+    Con più worker uvicorn solo il processo che ottiene il ruolo "background" (vedi app.core.workers)
+    apre la connessione RabbitMQ ed esegue sweeper e relay; gli altri servono solo HTTP:
+    le route scrivono sull'outbox, e i loro eventi/deadline li raccolgono polling e reconcile.
+    Eventi SSE e sweeper a timer vedono le scritture degli altri worker solo con i change stream:
+    EVENTS_SOURCE=in_process con più worker è rifiutato in configurazione, il fallback di "auto"
+    e il timer senza change stream sono segnalati come errore all'avvio.
+
+    Con STARTUP_MODE=background il lifespan non attende nessuna dipendenza: indici, connessione
+    a RabbitMQ e scelta della sorgente degli eventi proseguono in background e la readiness
+    dipende solo da Mongo. motor e aio_pika si importano solo se servono a questo processo.
+    """
+    injected_repo, injected_publisher, injected_outbox = repo, publisher, outbox
 
-def create_app() -> FastAPI:
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        client = AsyncIOMotorClient(settings.mongo_uri, uuidRepresentation="standard")
-        db = client[settings.mongo_db_name]
-        repo = MongoAssignmentRepository(db)
-        await repo.ensure_indexes()
+        client = None
+        db = None
+        lease = None
+        background_start = settings.startup_mode == "background"
+        startup_tasks: List[asyncio.Task] = []  # passi rimandati dall'avvio in background
+        repo, outbox = injected_repo, injected_outbox
+        if repo is None and settings.storage_backend == "memory":
+            logger.warning("STORAGE_BACKEND=memory: i dati non sono persistiti (solo dev/CI/benchmark).")
+            outbox = MemoryOutboxRepository()
+            repo = MemoryAssignmentRepository(outbox)
+        elif repo is None:
+            # import differiti: motor e pymongo servono solo con il backend Mongo
+            from motor.motor_asyncio import AsyncIOMotorClient
+            from app.database.mongo_assignment import MongoAssignmentRepository
+            from app.database.mongo_lease import MongoLease
+            from app.database.mongo_members import MongoMemberAssignmentRepository
+            from app.database.mongo_outbox import MongoOutboxRepository
+
+            client = AsyncIOMotorClient(settings.mongo_uri, uuidRepresentation="standard", **_mongo_client_options())
+            db = client[settings.mongo_db_name]
+            if settings.students_storage == "members":
+                repo = MongoMemberAssignmentRepository(db, content_offload_bytes=settings.content_offload_bytes)
+            else:
+                repo = MongoAssignmentRepository(db, content_offload_bytes=settings.content_offload_bytes)
+            outbox = MongoOutboxRepository(db)
+            # --- Deadline sweeper: una sola replica alla volta grazie al lease su Mongo ---
+            lease = MongoLease(
+                db,
+                name="deadline-sweeper",
+                owner=f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}",
+                ttl_seconds=settings.sweep_lease_ttl_seconds,
+            )
+        if background_start:
+            # le query funzionano anche senza indici: il pod serve subito, gli indici mancanti arrivano dopo
+            startup_tasks.append(asyncio.create_task(
+                _retry_in_background("creazione degli indici", partial(_ensure_indexes, repo, outbox))
+            ))
+        else:
+            await _ensure_indexes(repo, outbox)
+        if settings.metrics_enabled:
+            # sotto la cache: misura solo le chiamate che arrivano a MongoDB
+            repo = InstrumentedAssignmentRepository(repo)
+        if settings.cache_enabled:
+            repo = CachedAssignmentRepository(
+                repo,
+                max_entries=settings.cache_max_entries,
+                ttl_seconds=settings.cache_ttl_seconds,
+            )
+            REGISTRY.gauge_callback("assignment_cache", "Statistiche della cache delle letture.", "stat", repo.stats)
+        # --- Eventi SSE: change stream se disponibili, altrimenti dalle scritture di questo processo ---
+        bus = None
+        watcher = None
+        if settings.events_enabled:
+            bus = AssignmentEventBus(queue_size=settings.events_queue_size, replay_size=settings.events_replay_size)
+            source = settings.events_source
+            if source != "in_process" and db is not None:
+                from app.services.change_stream_service import ChangeStreamWatcher, supports_change_streams
+                if background_start:
+                    repo = EventingAssignmentRepository(repo, bus)
+                    watcher = ChangeStreamWatcher(db, bus, repo)
+                    startup_tasks.append(asyncio.create_task(
+                        _switch_to_change_stream(watcher, repo, source)
+                    ))
+                elif await supports_change_streams(db):
+                    watcher = ChangeStreamWatcher(db, bus, repo)
+                    await watcher.prepare()
+            if watcher is None:
+                _warn_in_process_events(source)
+                repo = EventingAssignmentRepository(repo, bus)
+            REGISTRY.gauge_callback("assignment_events", "Client SSE ed eventi del bus.", "stat", bus.stats)
+        app.state.event_bus = bus
+        REGISTRY.gauge_callback("jwt_cache", "Statistiche della cache dei token verificati.", "stat", AuthService.verifier.stats)
         app.state.assignment_repo = repo   # repo disponibile alle routes
 
-        # --- RabbitMQ Publisher ---
-        publisher = AssignmentPublisher(
-            rabbitmq_url=settings.rabbitmq_url,
-            heartbeat= 30,
-            exchange="elearning.reports",
-            routing_key="assignments.reports",
-        )
+        role = claim_background_role(settings.background_tasks, settings.background_lock_file)
+        if role is None and injected_repo is None and settings.storage_backend == "memory":
+            logger.warning("STORAGE_BACKEND=memory con più worker: ogni processo ha i propri dati e solo uno li pubblica.")
+
+        # --- RabbitMQ Publisher: solo nel worker che esegue i task di background ---
+        publisher = injected_publisher
+        if publisher is None and role is not None:
+            from app.services.publisher_service import AssignmentPublisher  # aio_pika solo in questo worker
 
-        await publisher.connect(max_retries=10, delay=5)
+            publisher = AssignmentPublisher(
+                rabbitmq_url=settings.rabbitmq_url,
+                heartbeat= 30,
+                exchange="elearning.reports",
+                routing_key="assignments.reports",
+                channel_pool_size=settings.rabbitmq_channel_pool_size,
+                publish_timeout=settings.rabbitmq_publish_timeout,
+                fail_fast=settings.rabbitmq_fail_fast,
+            )
+            if background_start:
+                publisher.connect_in_background()
+            else:
+                await publisher.connect(max_retries=10, delay=5)
         app.state.assignment_publisher = publisher
 
-        stop_event = asyncio.Event()
-
-        async def deadline_loop():
-            while not stop_event.is_set():
-                try:
-                    assignment_ids = await AssignmentService.sweep_deadlines(repo)
-                    if assignment_ids:
-                        tasks = [
-                            asyncio.create_task(
-                                publisher.publish_assignment_status(
-                                    assignmentId = assignment_id,
-                                    teacherId = None,
-                                    status ="completed")
-                            )
-                            for assignment_id in assignment_ids
-                        ]
-                        # aspetta tutte, senza far esplodere il loop se una fallisce
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-                        for r in results:
-                            if isinstance(r, Exception):
-                                logging.exception("Publish fallito", exc_info=r)
-                except Exception:
-                    logging.exception("Errore sweep deadlines")
-                    # attesa 30s o uscita se stop_event settato
-                try:
-                    await asyncio.wait_for(stop_event.wait(), timeout=30)
-                except asyncio.TimeoutError:
-                    pass
-
-        bg_task = asyncio.create_task(deadline_loop())
+        tasks = []
+        sweeper = None
+        relay = None
+        if role is not None:
+            sweeper = DeadlineSweeper(
+                repo,
+                publisher,
+                interval_seconds=settings.sweep_interval_seconds,
+                batch_size=settings.sweep_batch_size,
+                publish_concurrency=settings.sweep_publish_concurrency,
+                lease=lease,
+                mode=settings.sweep_mode,
+                timer_preload=settings.sweep_timer_preload,
+            )
+            app.state.deadline_sweeper = sweeper
+            if settings.sweep_mode == "timer":
+                # le deadline create dagli altri worker arrivano dal change stream; senza, solo dalla riconciliazione
+                if watcher is not None:
+                    watcher.on_deadline = sweeper.schedule
+                else:
+                    _warn_local_deadlines()
+            if background_start and hasattr(publisher, "wait_ready"):
+                startup_tasks.append(asyncio.create_task(_sweep_when_ready(publisher, sweeper, tasks)))
+            else:
+                tasks.append(asyncio.create_task(sweeper.run()))
+
+            # --- Outbox relay: pubblica gli eventi scritti insieme agli assignment ---
+            if outbox is not None:
+                relay = OutboxRelay(
+                    outbox,
+                    publisher,
+                    batch_size=settings.outbox_batch_size,
+                    poll_seconds=settings.outbox_poll_seconds,
+                    claim_seconds=settings.outbox_claim_seconds,
+                    retry_base_seconds=settings.outbox_retry_base_seconds,
+                )
+                app.state.outbox_relay = relay
+                tasks.append(asyncio.create_task(relay.run()))
+
+        if watcher is not None and not background_start:
+            tasks.append(asyncio.create_task(watcher.run()))
+
+        # --- Health monitor: le probe leggono lo snapshot aggiornato in background ---
+        monitor = HealthMonitor(
+            repo,
+            publisher,
+            interval_seconds=settings.health_interval_seconds,
+            timeout_seconds=settings.health_timeout_seconds,
+            max_sweep_lag_seconds=settings.health_max_sweep_lag_seconds,
+            require_publisher=not background_start,
+        )
+        app.state.health_monitor = monitor
+        tasks.append(asyncio.create_task(monitor.run()))
 
         try:
             yield
         finally:
-            stop_event.set()
-            publisher.close()
-            await bg_task
-            client.close()
+            # passi di avvio ancora in corso (dipendenza mai arrivata, watcher in background)
+            for task in startup_tasks:
+                task.cancel()
+            await asyncio.gather(*startup_tasks, return_exceptions=True)
+            if sweeper is not None:
+                sweeper.stop()
+            if relay is not None:
+                relay.stop()
+            if watcher is not None:
+                watcher.stop()
+            monitor.stop()
+            await asyncio.gather(*tasks)
+            if injected_publisher is None and publisher is not None:
+                await publisher.close()
+            if role is not None:
+                role.release()
+            if client is not None:
+                client.close()
 
     app = FastAPI(
         title="Assignment Microservice",
@@ -95,6 +328,9 @@ def create_app() -> FastAPI:
         allow_methods=["*"], allow_headers=["*"],
     )
 
+    if settings.metrics_enabled:
+        app.add_middleware(MetricsMiddleware)
+        app.include_router(metrics.router, tags=["metrics"])
     app.include_router(health.router,     prefix="/api/v1", tags=["health"])
     app.include_router(assignment.router, prefix="/api/v1", tags=["assignments"])
     return app
@@ -1,22 +1,46 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import JSONResponse
+import logging
+from datetime import timedelta
+from typing import Annotated, Any, AsyncIterator, List, Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, status, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic_core import to_json
 
-from app.schemas.assignment import AssignmentCreate, Assignment
+from app.core.config import settings
+from app.core.ids import is_valid_assignment_id
+
+from app.schemas.assignment import (
+    AssignmentCreate, Assignment, AssignmentStats, AssignmentView, BatchResult, BulkDeleteRequest,
+    BulkOperationResult, DeadlineShiftRequest, dump_views_json,
+)
 from app.schemas.context import UserContext
 from app.database.assignment_repo import AssignmentRepo
-from app.core.deps import get_repository, get_publisher
+from app.core.deps import get_event_bus, get_repository, get_outbox_relay, get_sweeper
+from app.core.responses import FastJSONResponse, parse_byte_range
 
 from app.services.auth_service import AuthService
-from app.services.assignment_service import AssignmentService
-from app.services.publisher_service import AssignmentPublisher
+from app.services.assignment_service import (
+    AssignmentService, MAX_PAGE_SIZE, MAX_UPCOMING_DEADLINES, assignment_etag, etag_matches, parse_fields,
+)
+from app.services.event_bus import AssignmentEventBus, sse_stream
+from app.services.outbox_service import OutboxRelay
+from app.services.sweeper_service import DeadlineSweeper
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 RepoDep = Annotated[AssignmentRepo, Depends(get_repository)]
 UserDep = Annotated[UserContext, Depends(AuthService.get_current_user)]
-PublisherDep = Annotated[AssignmentPublisher, Depends(get_publisher)]
+RelayDep = Annotated[Optional[OutboxRelay], Depends(get_outbox_relay)]
+SweeperDep = Annotated[Optional[DeadlineSweeper], Depends(get_sweeper)]
+EventBusDep = Annotated[Optional[AssignmentEventBus], Depends(get_event_bus)]
+IfNoneMatch = Annotated[Optional[str], Header(alias="If-None-Match")]
+
+# il client può riusare la copia locale ma deve sempre rivalidarla (If-None-Match)
+_REVALIDATE = "private, no-cache"
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": _REVALIDATE})
 
 
 @router.post("/assignments", status_code=status.HTTP_201_CREATED)
@@ -24,20 +48,16 @@ async def create_assignment_endpoint(
     assignment: AssignmentCreate,
     user: UserDep,
     repo: RepoDep,
-    publisher: PublisherDep
+    relay: RelayDep,
+    sweeper: SweeperDep,
 ):
     try:
-        # La service ritorna: (assignment_id, status, created_at, completed_at)
+        # l'evento "open" è già nell'outbox: la latenza dipende solo da Mongo
         assignment_id = await AssignmentService.create_assignment(assignment, user, repo)
-
-        try:
-            await publisher.publish_assignment_status(
-                assignmentId=assignment_id,
-                teacherId=user.user_id,
-                status="open"
-            )
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Invio evento RabbitMQ fallito: {e}")
+        if relay is not None:
+            relay.notify()
+        if sweeper is not None:
+            sweeper.schedule(assignment.deadline)
 
         location = f"/api/v1/assignments/{assignment_id}"
         return JSONResponse(
@@ -49,37 +69,234 @@ async def create_assignment_endpoint(
         raise HTTPException(status_code=403, detail=str(e))
     
 
-@router.get("/assignments", response_model=list[Assignment])
+@router.post("/assignments:batch", response_model=BatchResult)
+async def create_assignments_batch_endpoint(
+    # elementi qualsiasi: uno non valido (anche non oggetto) è un errore di quell'indice, non un 422 del batch
+    items: Annotated[List[Any], Body(max_length=settings.batch_max_items)],
+    user: UserDep,
+    repo: RepoDep,
+    relay: RelayDep,
+    sweeper: SweeperDep,
+):
+    """Creazione in blocco: un solo insert_many, esito per elemento (201 se tutti creati, altrimenti 207)."""
+    try:
+        results, created = await AssignmentService.create_assignments(items, user, repo)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    if created and relay is not None:
+        relay.notify()
+    if sweeper is not None:
+        for assignment in created:
+            sweeper.schedule(assignment.deadline)
+
+    body = BatchResult(created=len(created), failed=len(results) - len(created), results=results)
+    return FastJSONResponse(
+        body,
+        status_code=status.HTTP_201_CREATED if body.failed == 0 else status.HTTP_207_MULTI_STATUS,
+    )
+
+@router.post("/assignments:batchDelete", response_model=BulkOperationResult)
+async def delete_assignments_batch_endpoint(
+    request: BulkDeleteRequest,
+    user: UserDep,
+    repo: RepoDep,
+    relay: RelayDep,
+):
+    if request.ids is not None and len(request.ids) > settings.batch_max_items:
+        raise HTTPException(status_code=422, detail=f"Al massimo {settings.batch_max_items} ID per richiesta")
+    try:
+        deleted = await AssignmentService.delete_assignments(user, repo, request.ids)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if deleted and relay is not None:
+        relay.notify()
+    return FastJSONResponse(BulkOperationResult(count=len(deleted), ids=deleted))
+
+@router.post("/assignments:shiftDeadlines", response_model=BulkOperationResult)
+async def shift_deadlines_endpoint(
+    request: DeadlineShiftRequest,
+    user: UserDep,
+    repo: RepoDep,
+    relay: RelayDep,
+    sweeper: SweeperDep,
+):
+    if request.ids is not None and len(request.ids) > settings.batch_max_items:
+        raise HTTPException(status_code=422, detail=f"Al massimo {settings.batch_max_items} ID per richiesta")
+    try:
+        shifted = await AssignmentService.shift_deadlines(
+            user, repo, timedelta(seconds=request.shiftSeconds), request.ids
+        )
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if shifted and relay is not None:
+        relay.notify()
+    if sweeper is not None:
+        for _, deadline in shifted:
+            sweeper.schedule(deadline)
+    return FastJSONResponse(BulkOperationResult(count=len(shifted), ids=[a for a, _ in shifted]))
+
+@router.get("/assignments", response_model=list[AssignmentView], response_model_exclude_unset=True)
 async def list_assignments_endpoint(
     user: UserDep,
     repo: RepoDep,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: Optional[str] = None,
+    fields: Annotated[Optional[str], Query(description="Campi da restituire, separati da virgola")] = None,
+    if_none_match: IfNoneMatch = None,
 ):
-    return await AssignmentService.list_assignments(user, repo)
+    try:
+        if if_none_match:
+            # impronta della pagina dall'indice: nessun documento letto né serializzato
+            etag = await AssignmentService.current_page_etag(user, repo, limit=limit, cursor=cursor)
+            if etag_matches(if_none_match, etag):
+                return _not_modified(etag)
+        items, next_cursor, etag = await AssignmentService.list_assignments_page_tagged(
+            user, repo, limit=limit, cursor=cursor, fields=parse_fields(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"ETag": etag, "Cache-Control": _REVALIDATE}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(dump_views_json(items), headers=headers)
+
+async def _ndjson(docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for d in docs:
+        yield to_json(d) + b"\n"
+
+@router.get("/assignments/export", response_class=StreamingResponse)
+async def export_assignments_endpoint(
+    user: UserDep,
+    repo: RepoDep,
+    fields: Annotated[Optional[str], Query(description="Campi da restituire, separati da virgola")] = None,
+    batch_size: Annotated[Optional[int], Query(ge=1, le=10_000)] = None,
+):
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    docs = AssignmentService.export_assignments(
+        user, repo, batch_size=batch_size or settings.export_batch_size, fields=projection
+    )
+    return StreamingResponse(_ndjson(docs), media_type="application/x-ndjson")
+
+@router.get("/assignments/stats", response_model=AssignmentStats)
+async def assignment_stats_endpoint(
+    user: UserDep,
+    repo: RepoDep,
+    upcoming: Annotated[int, Query(ge=0, le=MAX_UPCOMING_DEADLINES, description="Prossime deadline da includere")] = 5,
+):
+    try:
+        stats = await AssignmentService.teacher_stats(user, repo, upcoming=upcoming)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return FastJSONResponse(stats, headers={"Cache-Control": _REVALIDATE})
+
+@router.get("/assignments/events", response_class=StreamingResponse)
+async def assignment_events_endpoint(
+    user: UserDep,
+    bus: EventBusDep,
+    last_event_id: Annotated[Optional[str], Header(alias="Last-Event-ID")] = None,
+    since: Annotated[Optional[str], Query(description="Ultimo id ricevuto (alternativa all'header Last-Event-ID)")] = None,
+):
+    # create/delete/cambi di stato e deadline degli assignment dell'utente (teacher o studente)
+    if bus is None:
+        raise HTTPException(status_code=404, detail="Eventi non abilitati")
+    stream = sse_stream(
+        bus, str(user.user_id), last_event_id or since, heartbeat_seconds=settings.events_heartbeat_seconds
+    )
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/assignments/{assignment_id}", response_model=Assignment | None)
 async def get_assignment_endpoint(
     assignment_id: str,
     user: UserDep,
     repo: RepoDep,
+    if_none_match: IfNoneMatch = None,
 ):
+    if not is_valid_assignment_id(assignment_id, settings.accept_legacy_assignment_ids):
+        raise HTTPException(status_code=404, detail="Assignment not found")
     try:
+        if if_none_match:
+            # solo la version, con lo stesso filtro di autorizzazione: niente content né roster
+            etag = await AssignmentService.current_assignment_etag(assignment_id, user, repo)
+            if etag is not None and etag_matches(if_none_match, etag):
+                return _not_modified(etag)
         result = await AssignmentService.get_assignment(assignment_id, user, repo)
         if result is None:
             raise HTTPException(status_code=404, detail="Assignment not found")
-        return result
+        etag = assignment_etag(assignment_id, user, result.version)
+        return FastJSONResponse(result, headers={"ETag": etag, "Cache-Control": _REVALIDATE})
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+@router.get("/assignments/{assignment_id}/content", response_class=StreamingResponse)
+async def get_assignment_content_endpoint(
+    assignment_id: str,
+    user: UserDep,
+    repo: RepoDep,
+    if_none_match: IfNoneMatch = None,
+    range_header: Annotated[Optional[str], Header(alias="Range")] = None,
+    if_range: Annotated[Optional[str], Header(alias="If-Range")] = None,
+):
+    """Contenuto dell'assignment come text/plain, letto a chunk; supporta Range (206) e If-None-Match."""
+    if not is_valid_assignment_id(assignment_id, settings.accept_legacy_assignment_ids):
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    try:
+        opened = await AssignmentService.open_content(assignment_id, user, repo)
     except PermissionError as e:
         raise HTTPException(status_code=403, detail=str(e))
+    except LookupError as e:
+        # contentRef senza file in GridFS: dato incoerente (o upload/GC concorrente), non un 404 del client
+        logger.error("%s", e)
+        raise HTTPException(status_code=503, detail="Assignment content temporarily unavailable")
+    if opened is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    blob, etag = opened
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    headers = {"ETag": etag, "Cache-Control": _REVALIDATE, "Accept-Ranges": "bytes"}
+    try:
+        # If-Range con un ETag diverso: il contenuto è cambiato, si invia tutto
+        byte_range = parse_byte_range(range_header, blob.length) if not if_range or if_range == etag else None
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{blob.length}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    if byte_range is None:
+        start, end, code = 0, blob.length - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob.length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        blob.iter_range(start, end), status_code=code, media_type="text/plain; charset=utf-8", headers=headers
+    )
 
 @router.delete("/assignments/{assignment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_assignment_endpoint(
     assignment_id: str,
     user: UserDep,
     repo: RepoDep,
+    relay: RelayDep,
 ):
+    if not is_valid_assignment_id(assignment_id, settings.accept_legacy_assignment_ids):
+        raise HTTPException(status_code=404, detail="Assignment not found")
     try:
         deleted = await AssignmentService.delete_assignment(assignment_id, user, repo)
         if not deleted:
             raise HTTPException(status_code=404, detail="Assignment not found")
+        if relay is not None:
+            relay.notify()
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except PermissionError as e:
         raise HTTPException(status_code=403, detail=str(e))
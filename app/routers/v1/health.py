@@ -1,7 +1,27 @@
-from fastapi import APIRouter
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+
+from app.core.deps import get_health_monitor
+from app.services.health_service import HealthMonitor
 
 router = APIRouter()
 
+MonitorDep = Annotated[Optional[HealthMonitor], Depends(get_health_monitor)]
+
 @router.get("/assignments/health")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@router.get("/assignments/health/live")
+async def liveness():
+    # il processo risponde: nessun controllo delle dipendenze (un loro guasto non si risolve riavviando)
+    return {"status": "ok"}
+
+@router.get("/assignments/health/ready")
+async def readiness(monitor: MonitorDep):
+    # legge solo lo snapshot aggiornato in background dall'HealthMonitor
+    snapshot = monitor.snapshot() if monitor is not None else {"status": "starting", "ready": False, "checks": {}}
+    code = status.HTTP_200_OK if snapshot["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(snapshot, status_code=code)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
+from typing import List, Optional, Sequence
 from datetime import datetime
 
 class AssignmentCreate(BaseModel):
@@ -10,8 +10,86 @@ class AssignmentCreate(BaseModel):
     content: str
 
 class Assignment(AssignmentCreate):
+    # None se il contenuto è in GridFS (contentRef): si legge da GET /assignments/{id}/content
+    content: Optional[str] = None
     assignmentId: str
     teacherId: str
     createdAt: datetime
     status: str = "open"
     completedAt: Optional[datetime] = None
+    # incrementati a ogni modifica (sweep, spostamento deadline): base degli ETag
+    version: int = 1
+    updatedAt: Optional[datetime] = None
+    contentRef: Optional[str] = None      # sha256 del contenuto salvato fuori dal documento
+    contentLength: Optional[int] = None   # byte UTF-8 del contenuto salvato fuori dal documento
+
+class AssignmentView(BaseModel):
+    """Vista (eventualmente proiettata) di un Assignment usata dalle liste."""
+    assignmentId: Optional[str] = None
+    teacherId: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    deadline: Optional[datetime] = None
+    students: Optional[List[str]] = None
+    content: Optional[str] = None
+    createdAt: Optional[datetime] = None
+    status: Optional[str] = None
+    completedAt: Optional[datetime] = None
+    version: Optional[int] = None
+    updatedAt: Optional[datetime] = None
+    contentRef: Optional[str] = None
+    contentLength: Optional[int] = None
+
+class BatchItemResult(BaseModel):
+    """Esito di un elemento di una operazione batch: id creato oppure errore."""
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+
+class BulkSelection(BaseModel):
+    """Selezione degli assignment (del teacher) su cui agire: lista di ID oppure all=true."""
+    ids: Optional[List[str]] = None
+    all: bool = False
+
+    @model_validator(mode="after")
+    def _ids_or_all(self):
+        if (self.ids is None) == (not self.all):
+            raise ValueError("Specificare 'ids' oppure 'all': true (non entrambi)")
+        return self
+
+class BulkDeleteRequest(BulkSelection):
+    pass
+
+class DeadlineShiftRequest(BulkSelection):
+    shiftSeconds: int = Field(description="Spostamento delle deadline in secondi (positivo = posticipa)")
+
+class BulkOperationResult(BaseModel):
+    count: int
+    ids: List[str]
+
+class UpcomingDeadline(BaseModel):
+    assignmentId: str
+    deadline: datetime
+
+class AssignmentStats(BaseModel):
+    """Riepilogo per la dashboard di un teacher: contatori mantenuti in scrittura, non calcolati a ogni lettura."""
+    teacherId: str
+    total: int = 0
+    open: int = 0         # include gli scaduti non ancora chiusi dallo sweeper
+    completed: int = 0
+    overdue: int = 0      # aperti con deadline già passata
+    upcomingDeadlines: List[UpcomingDeadline] = []
+
+# campi sempre presenti in una vista: servono a costruire il cursore di paginazione
+VIEW_KEY_FIELDS = ("assignmentId", "createdAt")
+
+_view_list_adapter = TypeAdapter(List[AssignmentView])
+
+def dump_views_json(items: Sequence[AssignmentView]) -> bytes:
+    """Serializza una lista di viste direttamente in JSON (bytes), senza rivalidarle."""
+    return _view_list_adapter.dump_json(list(items), exclude_unset=True)
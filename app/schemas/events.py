@@ -0,0 +1,25 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+
+STATUS_CHANGED = "assignment.status.changed"
+DEADLINE_CHANGED = "assignment.deadline.changed"
+CREATED = "assignment.created"
+DELETED = "assignment.deleted"
+
+class AssignmentStatusEvent(BaseModel):
+    """Evento di cambio stato di un assignment pubblicato su RabbitMQ."""
+    assignmentId: str
+    status: str
+    teacherId: Optional[str] = None
+    messageId: Optional[str] = None  # default: assignmentId
+    eventType: str = STATUS_CHANGED
+    deadline: Optional[datetime] = None  # solo per DEADLINE_CHANGED
+
+
+class AssignmentChange(BaseModel):
+    """Notifica inviata ai client SSE: create, delete, cambio di stato o di deadline."""
+    type: str
+    assignmentId: str
+    status: Optional[str] = None
+    deadline: Optional[datetime] = None
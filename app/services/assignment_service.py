@@ -1,13 +1,121 @@
-from datetime import datetime, timezone
-import random
-from typing import List, Sequence, Optional, Tuple
-from app.schemas.assignment import AssignmentCreate, Assignment
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+from typing import Any, AsyncIterator, List, Sequence, Optional, Tuple
+from pydantic import ValidationError
+from app.core.ids import new_assignment_id
+from app.schemas.assignment import (
+    AssignmentCreate, Assignment, AssignmentStats, AssignmentView, BatchItemResult, VIEW_KEY_FIELDS,
+)
 from app.schemas.context import UserContext
-from app.database.assignment_repo import AssignmentRepo
+from app.schemas.events import AssignmentStatusEvent, DEADLINE_CHANGED
+from app.database.assignment_repo import AssignmentRepo, PageKey, PageStamp
+from app.database.content_repo import ContentBlob, InlineContent, content_ref
+
+MAX_PAGE_SIZE = 500
+MAX_UPCOMING_DEADLINES = 50
+_STAMP_FIELDS = ("assignmentId", "version", "updatedAt")  # campi delle viste usati per l'ETag delle liste
 
 def create_assignment_id() -> str:
-    # stesso formato che avevi nel repo
-    return f"as-{random.randint(0, 99999):05d}"
+    # `as-` + ULID: ordinato nel tempo e senza collisioni (i vecchi `as-XXXXX` restano leggibili)
+    return new_assignment_id()
+
+def encode_cursor(created_at: datetime, assignment_id: str) -> str:
+    """Cursore opaco (base64url) che punta all'ultimo elemento di una pagina."""
+    raw = json.dumps([created_at.isoformat(), assignment_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> PageKey:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, assignment_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(assignment_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise ValueError("Cursore di paginazione non valido") from exc
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Converte `fields=a,b,c` in una proiezione valida (None = tutti i campi)."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in Assignment.model_fields]
+    if unknown:
+        raise ValueError(f"Campi non validi: {', '.join(unknown)}")
+    return list(dict.fromkeys([*VIEW_KEY_FIELDS, *requested]))
+
+def _etag(*parts: Any) -> str:
+    # ETag forte: cambia con la versione e con chi legge (gli studenti vedono un roster diverso dal teacher)
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def _as_utc(ts: datetime) -> datetime:
+    # Mongo restituisce datetime naive (UTC) e con precisione al millisecondo
+    ts = ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+    return ts.replace(microsecond=ts.microsecond // 1000 * 1000)
+
+def assignment_etag(assignment_id: str, user: UserContext, version: Optional[int]) -> str:
+    return _etag("assignment", assignment_id, user.user_id, user.role, version or 1)
+
+def page_etag(user: UserContext, stamp: PageStamp) -> str:
+    count, versions, updated_at, ids = stamp
+    latest = _as_utc(updated_at).isoformat() if updated_at else None
+    # ID ordinati: l'ordine di $push nel gruppo non conta, conta quali documenti sono nella finestra
+    return _etag("page", user.user_id, user.role, count, versions, latest, *sorted(ids))
+
+def content_etag(ref: str) -> str:
+    # il contenuto è indirizzato per hash: stesso ETag per chiunque lo legga
+    return f'"{ref}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Confronto di If-None-Match (lista di ETag o `*`) con l'ETag corrente."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def status_event(assignment_id: str, status: str, teacher_id: Optional[str] = None) -> AssignmentStatusEvent:
+    # messageId stabile per (assignment, stato): i retry dell'outbox sono idempotenti lato consumer
+    return AssignmentStatusEvent(
+        assignmentId=assignment_id,
+        status=status,
+        teacherId=teacher_id,
+        messageId=f"{assignment_id}:{status}",
+    )
+
+def deadline_event(assignment_id: str, deadline: datetime, teacher_id: Optional[str] = None) -> AssignmentStatusEvent:
+    return AssignmentStatusEvent(
+        assignmentId=assignment_id,
+        status="open",
+        teacherId=teacher_id,
+        eventType=DEADLINE_CHANGED,
+        deadline=deadline,
+        # idempotente per deadline risultante: un retry non genera un secondo evento
+        messageId=f"{assignment_id}:deadline:{deadline.isoformat()}",
+    )
+
+def _new_assignment(data: AssignmentCreate, user: UserContext) -> Assignment:
+    now = datetime.now(timezone.utc)
+    return Assignment(
+        assignmentId=create_assignment_id(),
+        teacherId=str(user.user_id),
+        createdAt=now,
+        status="open",
+        completedAt=None,
+        version=1,
+        updatedAt=now,
+        **data.model_dump(),
+    )
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}" for err in exc.errors()
+    )
+
+async def _no_documents() -> AsyncIterator[dict]:
+    return
+    yield
 
 def _is_teacher(role):
         return role == "teacher" or (isinstance(role, (list, tuple, set)) and "teacher" in role)
@@ -26,23 +134,52 @@ class AssignmentService:
         if not _is_teacher(user.role):
             raise PermissionError("Only teachers can create assignments")
 
-        new_id = create_assignment_id()
-        assignment = Assignment(
-            assignmentId=new_id,
-            teacherId=str(user.user_id),
-            createdAt=datetime.now(timezone.utc),
-            status="open",
-            completedAt=None,
-            **data.model_dump(),
-        )
+        assignment = _new_assignment(data, user)
 
-        inserted_id = await repo.create(assignment)
+        # l'evento "open" va nell'outbox insieme all'assignment: lo pubblica il relay
+        opened = status_event(assignment.assignmentId, "open", teacher_id=str(user.user_id))
+        inserted_id = await repo.create(assignment, events=[opened])
         if not inserted_id:
             raise RuntimeError("Creazione assignment fallita")
 
-        # ritorna esattamente ciò che ti serve per RabbitMQ
         return inserted_id
 
+    @staticmethod
+    async def create_assignments(
+        payloads: Sequence[Any],
+        user: UserContext,
+        repo: AssignmentRepo,
+    ) -> Tuple[List[BatchItemResult], List[Assignment]]:
+        """
+        Creazione in blocco: valida ogni elemento singolarmente, scrive i validi con una sola
+        create_many. Ritorna (esito per elemento: id creato oppure errore, assignment creati).
+        """
+        if not _is_teacher(user.role):
+            raise PermissionError("Only teachers can create assignments")
+
+        results: List[BatchItemResult] = []
+        to_insert: List[Tuple[int, Assignment]] = []
+        for index, payload in enumerate(payloads):
+            try:
+                data = AssignmentCreate.model_validate(payload)
+            except ValidationError as exc:
+                results.append(BatchItemResult(index=index, error=_validation_message(exc)))
+                continue
+            to_insert.append((index, _new_assignment(data, user)))
+
+        assignments = [a for _, a in to_insert]
+        events = [status_event(a.assignmentId, "open", teacher_id=a.teacherId) for a in assignments]
+        errors = await repo.create_many(assignments, events=events)
+        created: List[Assignment] = []
+        for (index, assignment), error in zip(to_insert, errors):
+            if error is None:
+                created.append(assignment)
+                results.append(BatchItemResult(index=index, id=assignment.assignmentId))
+            else:
+                results.append(BatchItemResult(index=index, error=error))
+
+        results.sort(key=lambda r: r.index)
+        return results, created
 
     @staticmethod
     async def list_assignments(user: UserContext, repo: AssignmentRepo) -> Sequence[Assignment]:
@@ -52,33 +189,209 @@ class AssignmentService:
             return await repo.find_for_student(user.user_id)
         return []
     
+    @staticmethod
+    async def list_assignments_page(
+        user: UserContext,
+        repo: AssignmentRepo,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[AssignmentView], Optional[str]]:
+        """
+        Keyset pagination su (createdAt, assignmentId).
+        Ritorna (pagina, cursore della pagina successiva o None se è l'ultima).
+        """
+        items, next_cursor, _ = await AssignmentService.list_assignments_page_tagged(
+            user, repo, limit=limit, cursor=cursor, fields=fields
+        )
+        return items, next_cursor
+
+    @staticmethod
+    async def list_assignments_page_tagged(
+        user: UserContext,
+        repo: AssignmentRepo,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[AssignmentView], Optional[str], str]:
+        """
+        Come list_assignments_page, più l'ETag calcolato sugli stessi documenti restituiti
+        (elementi della finestra, somma delle version, updatedAt più recente, ID): mai più nuovo del contenuto.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        fetch = limit + 1 if limit else None  # un elemento in più per sapere se c'è un'altra pagina
+        # version e updatedAt servono all'ETag: se la proiezione non li chiede si leggono e poi si tolgono
+        strip = [f for f in _STAMP_FIELDS if fields is not None and f not in fields]
+        query_fields = [*fields, *strip] if strip else fields
+
+        if _is_teacher(user.role):
+            items = await repo.find_page_for_teacher(user.user_id, limit=fetch, after=after, fields=query_fields)
+        elif _is_student(user.role):
+            items = await repo.find_page_for_student(user.user_id, limit=fetch, after=after, fields=query_fields)
+        else:
+            return [], None, page_etag(user, (0, 0, None, []))
+
+        stamps = [_as_utc(v.updatedAt) for v in items if v.updatedAt is not None]
+        versions = sum(v.version or 1 for v in items)  # documenti senza version: version implicita 1
+        ids = [v.assignmentId for v in items]
+        etag = page_etag(user, (len(items), versions, max(stamps) if stamps else None, ids))
+        if strip:
+            items = [AssignmentView.model_construct(**v.model_dump(exclude_unset=True, exclude=set(strip))) for v in items]
+
+        if limit and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            return items, encode_cursor(last.createdAt, last.assignmentId), etag
+        return items, None, etag
+
+    @staticmethod
+    async def current_page_etag(
+        user: UserContext,
+        repo: AssignmentRepo,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> str:
+        """ETag attuale della pagina dall'impronta sull'indice, senza leggere né serializzare i documenti."""
+        after = decode_cursor(cursor) if cursor else None
+        fetch = limit + 1 if limit else None
+        if _is_teacher(user.role):
+            stamp = await repo.page_stamp_for_teacher(user.user_id, limit=fetch, after=after)
+        elif _is_student(user.role):
+            stamp = await repo.page_stamp_for_student(user.user_id, limit=fetch, after=after)
+        else:
+            stamp = (0, 0, None, [])
+        return page_etag(user, stamp)
+
+    @staticmethod
+    def export_assignments(
+        user: UserContext,
+        repo: AssignmentRepo,
+        batch_size: int,
+        fields: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[dict]:
+        """Stream dei documenti dell'utente, senza materializzare la lista in memoria."""
+        if _is_teacher(user.role):
+            return repo.iter_for_teacher(user.user_id, batch_size=batch_size, fields=fields)
+        if _is_student(user.role):
+            return repo.iter_for_student(user.user_id, batch_size=batch_size, fields=fields)
+        return _no_documents()
+
     @staticmethod
     async def get_assignment(assignment_id: str, user: UserContext, repo: AssignmentRepo) -> Optional[Assignment]:
-        doc = await repo.find_one(assignment_id)
-        if not doc:
+        """
+        Lookup con autorizzazione nella query: {assignmentId, teacherId} per i teacher,
+        {assignmentId, students: uid} per gli studenti (senza trasferire il roster).
+        Se non c'è match, un probe sull'indice distingue "non esiste" (None) da "non autorizzato".
+        """
+        if _is_teacher(user.role):
+            doc = await repo.find_one_for_teacher(assignment_id, user.user_id)
+            denied = "Accesso negato all'assignment"
+            if doc and _is_student(user.role) and user.user_id not in doc.students:
+                raise PermissionError("Non sei tra gli studenti assegnati")
+        elif _is_student(user.role):
+            doc = await repo.find_one_for_student(assignment_id, user.user_id)
+            denied = "Non sei tra gli studenti assegnati"
+        else:
+            return await repo.find_one(assignment_id)
+
+        if doc is None:
+            if await repo.exists(assignment_id):
+                raise PermissionError(denied)
             return None
-        if _is_teacher(user.role) and doc.teacherId != user.user_id:
-            raise PermissionError("Accesso negato all'assignment")
-        if _is_student(user.role) and user.user_id not in getattr(doc, "students", []):
-            raise PermissionError("Non sei tra gli studenti assegnati")
         return doc
 
+    @staticmethod
+    async def current_assignment_etag(assignment_id: str, user: UserContext, repo: AssignmentRepo) -> Optional[str]:
+        """
+        ETag attuale dell'assignment leggendo solo `version` con lo stesso filtro di autorizzazione
+        di get_assignment; None se non visibile (la richiesta prosegue e risponde 403/404).
+        """
+        if _is_teacher(user.role):
+            version = await repo.version_for_teacher(assignment_id, user.user_id)
+        elif _is_student(user.role):
+            version = await repo.version_for_student(assignment_id, user.user_id)
+        else:
+            return None
+        return assignment_etag(assignment_id, user, version) if version is not None else None
+
+    @staticmethod
+    async def open_content(
+        assignment_id: str, user: UserContext, repo: AssignmentRepo
+    ) -> Optional[Tuple[ContentBlob, str]]:
+        """
+        (contenuto, ETag) dell'assignment con le stesse regole di accesso di get_assignment.
+        Il contenuto spostato in GridFS si legge a chunk (Range); quello inline si serve dal documento.
+        """
+        doc = await AssignmentService.get_assignment(assignment_id, user, repo)
+        if doc is None:
+            return None
+        if doc.contentRef:
+            blob = await repo.open_content(doc.contentRef)
+            if blob is None:
+                raise LookupError(f"Contenuto {doc.contentRef} mancante per l'assignment {assignment_id}")
+            return blob, content_etag(doc.contentRef)
+        data = (doc.content or "").encode("utf-8")
+        return InlineContent(data), content_etag(content_ref(data))
+
+    @staticmethod
+    async def teacher_stats(user: UserContext, repo: AssignmentRepo, upcoming: int = 5) -> AssignmentStats:
+        """Statistiche del teacher: contatori letti con un lookup, indipendente dal numero di assignment."""
+        if not _is_teacher(user.role):
+            raise PermissionError("Only teachers can read assignment statistics")
+        return await repo.stats_for_teacher(user.user_id, datetime.now(timezone.utc), upcoming)
+
     @staticmethod
     async def delete_assignment(assignment_id: str, user: UserContext, repo: AssignmentRepo) -> bool:
         if not _is_teacher(user.role):
             raise PermissionError("Only teachers can delete assignments")
-        return await repo.delete(assignment_id)
+        # evento "deleted" accodato dal repository insieme alla cancellazione, come in delete_assignments
+        teacher_id = str(user.user_id)
+        return await repo.delete(assignment_id, lambda a: status_event(a, "deleted", teacher_id=teacher_id))
     
     @staticmethod
-    async def sweep_deadlines(repo: AssignmentRepo) -> List[str]:
+    async def delete_assignments(
+        user: UserContext,
+        repo: AssignmentRepo,
+        assignment_ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Cancellazione in blocco (ID indicati o tutti) degli assignment del teacher.
+        Gli eventi 'deleted' li accoda il repository nella stessa scrittura di ogni blocco.
+        """
+        if not _is_teacher(user.role):
+            raise PermissionError("Only teachers can delete assignments")
+        teacher_id = str(user.user_id)
+        return await repo.delete_many(
+            teacher_id, assignment_ids, lambda a: status_event(a, "deleted", teacher_id=teacher_id)
+        )
+
+    @staticmethod
+    async def shift_deadlines(
+        user: UserContext,
+        repo: AssignmentRepo,
+        delta: timedelta,
+        assignment_ids: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[str, datetime]]:
+        """Sposta le deadline degli assignment aperti del teacher (eventi 'deadline changed' accodati dal repository)."""
+        if not _is_teacher(user.role):
+            raise PermissionError("Only teachers can change deadlines")
+        if not delta:
+            raise ValueError("Lo spostamento della deadline non può essere nullo")
+        teacher_id = str(user.user_id)
+        return await repo.shift_deadlines(
+            teacher_id, delta, assignment_ids, lambda a, deadline: deadline_event(a, deadline, teacher_id=teacher_id)
+        )
+
+    @staticmethod
+    async def sweep_deadlines(repo: AssignmentRepo, batch_size: Optional[int] = None) -> List[str]:
         """
-        Esegue UNA passata: segna 'completed' gli assignment con deadline < now.
-        Ritorna il numero di documenti aggiornati.
+        Esegue UNA passata: segna 'completed' (al massimo batch_size) assignment con deadline < now.
+        Ritorna gli ID dei documenti transizionati.
         """
         ts = datetime.now(timezone.utc)
         # normalizzazione: tronca ai millisecondi
         ts = ts.replace(microsecond=(ts.microsecond // 1000) * 1000)
 
-        return await repo.update_assignment_state(ts)
+        return await repo.update_assignment_state(ts, limit=batch_size)
 
         
@@ -6,6 +6,7 @@ import jwt
 
 from app.core.config import settings
 from app.schemas.context import UserContext
+from app.services.token_service import InvalidTokenPayload, TokenVerifier
 
 # Estrae "Authorization: Bearer <token>"
 security = HTTPBearer()  # puoi fare HTTPBearer(auto_error=True) per 403 su header mancante
@@ -15,29 +16,25 @@ class AuthService:
     JWT_ALGORITHM = settings.jwt_algorithm          # es: "RS256" o "HS256"
     PUBLIC_KEY = settings.jwt_public_key            # PEM per RS*, chiave segreta per HS*
 
+    # chiave parsata una volta sola all'avvio + cache dei token già verificati
+    verifier = TokenVerifier(
+        algorithm=JWT_ALGORITHM,
+        key=PUBLIC_KEY or None,
+        jwks_file=settings.jwt_jwks_file,
+        cache_max_entries=settings.jwt_cache_max_entries,
+        cache_max_ttl_seconds=settings.jwt_cache_max_ttl_seconds,
+        jwks_min_reload_seconds=settings.jwt_jwks_min_reload_seconds,
+    )
+
     @staticmethod
     async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security),
     ) -> UserContext:
         token = credentials.credentials
         try:
-            payload = jwt.decode(
-                token,
-                AuthService.PUBLIC_KEY,
-                algorithms=[AuthService.JWT_ALGORITHM],
-                # facoltativi se li usi:
-                # audience=settings.jwt_audience,
-                # issuer=settings.jwt_issuer,
-            )
-
-            user_id = payload.get("sub")
-            role = payload.get("role")  # può essere str o list[str] in base a come emetti il token
-
-            if not user_id or role is None:
-                raise HTTPException(status_code=401, detail="Invalid token payload")
-
-            return UserContext(user_id=user_id, role=role)
-
+            return AuthService.verifier.verify(token)
+        except InvalidTokenPayload:
+            raise HTTPException(status_code=401, detail="Invalid token payload")
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token expired")
         except jwt.InvalidTokenError:
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.database.assignment_repo import AssignmentRepo
+from app.schemas.events import CREATED, DEADLINE_CHANGED, DELETED, STATUS_CHANGED, AssignmentChange
+from app.services.event_bus import AssignmentEventBus
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENTS_COLLECTION = "assignments"
+_HISTORY_LOST = 286  # resume token uscito dall'oplog
+
+# solo i cambiamenti che interessano ai client: insert, delete e update di status/deadline
+_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$in": ["insert", "delete"]}},
+        {"updateDescription.updatedFields.status": {"$exists": True}},
+        {"updateDescription.updatedFields.deadline": {"$exists": True}},
+    ]}},
+]
+
+
+async def supports_change_streams(db: AsyncIOMotorDatabase) -> bool:
+    """I change stream richiedono un replica set (o mongos): su un mongod standalone non ci sono."""
+    try:
+        hello = await db.command("hello")
+    except PyMongoError:
+        return False
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+
+def change_from_stream(change: Dict[str, Any]) -> Optional[Tuple[AssignmentChange, Optional[dict]]]:
+    """(notifica, documento da cui ricavare il pubblico) per un evento del change stream, o None."""
+    op = change.get("operationType")
+    if op == "delete":
+        doc = change.get("fullDocumentBeforeChange")  # pre-image: presente solo se abilitata (MongoDB 6+)
+        if not doc or not doc.get("assignmentId"):
+            return None
+        return AssignmentChange(type=DELETED, assignmentId=doc["assignmentId"], status="deleted"), doc
+
+    doc = change.get("fullDocument")
+    if not doc or not doc.get("assignmentId"):
+        return None  # update di un documento già cancellato
+    if op == "insert":
+        kind = CREATED
+    else:
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        kind = STATUS_CHANGED if "status" in updated else DEADLINE_CHANGED
+    notice = AssignmentChange(
+        type=kind,
+        assignmentId=doc["assignmentId"],
+        status=doc.get("status"),
+        deadline=doc.get("deadline") if kind == DEADLINE_CHANGED else None,
+    )
+    return notice, doc
+
+
+class ChangeStreamWatcher:
+    """
+    Un solo change stream per processo sulla collection degli assignment, con fan-out nel bus:
+    vede le scritture di tutti i worker e di tutte le repliche. L'id degli eventi SSE è il resume
+    token di MongoDB, quindi uguale in ogni processo: un client può riconnettersi a un altro pod.
+
+    `on_deadline` (se impostato) riceve le deadline degli assignment aperti creati o spostati da
+    qualunque processo: con più worker è così che lo sweeper in modalità timer le vede subito.
+
+    Con il layout `members` i documenti non contengono il roster: per insert e update si rilegge
+    dal repo; per le delete (pre-image senza studenti) la notifica arriva solo al teacher.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        bus: AssignmentEventBus,
+        repo: AssignmentRepo,
+        retry_seconds: float = 1.0,
+        max_await_ms: int = 1000,
+    ) -> None:
+        self.db = db
+        self.col = db[ASSIGNMENTS_COLLECTION]
+        self.bus = bus
+        self.repo = repo
+        self.retry_seconds = retry_seconds
+        self.max_await_ms = max_await_ms
+        self._pre_images = False
+        self._resume_token: Optional[dict] = None
+        self._stop = asyncio.Event()
+        self.started = asyncio.Event()  # primo change stream aperto: da qui nessuna scrittura sfugge
+        self.on_deadline: Optional[Callable[[datetime], None]] = None
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def prepare(self) -> None:
+        """Abilita le pre-image (serve per sapere a chi notificare le delete); senza, le delete non si notificano."""
+        try:
+            await self.db.command(
+                "collMod", ASSIGNMENTS_COLLECTION, changeStreamPreAndPostImages={"enabled": True}
+            )
+            self._pre_images = True
+        except OperationFailure as exc:
+            logger.warning("Pre-image dei change stream non disponibili (%s): delete non notificate via SSE.", exc)
+
+    async def _audience(self, doc: dict) -> list:
+        students = doc.get("students")
+        if students is None and "studentCount" in doc:
+            full = await self.repo.find_one(doc["assignmentId"])
+            students = full.students if full is not None else []
+        return [doc.get("teacherId"), *(students or [])]
+
+    async def handle(self, change: Dict[str, Any]) -> None:
+        parsed = change_from_stream(change)
+        if parsed is None:
+            return
+        notice, doc = parsed
+        if change.get("operationType") == "delete":
+            audience = [doc.get("teacherId"), *doc.get("students", [])]
+        else:
+            audience = await self._audience(doc)
+        self.bus.publish(notice, audience, event_id=change["_id"]["_data"])
+        if (
+            self.on_deadline is not None
+            and notice.type in (CREATED, DEADLINE_CHANGED)
+            and doc.get("status") != "completed"
+            and doc.get("deadline") is not None
+        ):
+            self.on_deadline(doc["deadline"])
+
+    async def _watch(self) -> None:
+        options: Dict[str, Any] = {"full_document": "updateLookup", "max_await_time_ms": self.max_await_ms}
+        if self._pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        if self._resume_token is not None:
+            options["resume_after"] = self._resume_token
+        async with self.col.watch(_PIPELINE, **options) as stream:
+            self.started.set()
+            while not self._stop.is_set():
+                change = await stream.try_next()  # None dopo max_await_ms senza eventi: si ricontrolla lo stop
+                if change is not None:
+                    await self.handle(change)
+                self._resume_token = stream.resume_token
+
+    async def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self._watch()
+            except OperationFailure as exc:
+                if exc.code != _HISTORY_LOST:
+                    logger.exception("Change stream degli assignment interrotto, riprendo")
+                else:
+                    # i client con id più vecchi ricevono comunque un reset (id non nello storico)
+                    logger.warning("Resume token non più nell'oplog: il change stream riparte da ora.")
+                    self._resume_token = None
+                await self._backoff()
+            except Exception:
+                # si riprende dall'ultimo resume token: nessun evento perso se è ancora nell'oplog
+                logger.exception("Change stream degli assignment interrotto, riprendo")
+                await self._backoff()
+
+    async def _backoff(self) -> None:
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=self.retry_seconds)
+        except asyncio.TimeoutError:
+            pass
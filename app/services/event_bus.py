@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.schemas.events import AssignmentChange
+
+# (id dell'evento, notifica)
+BusEvent = Tuple[str, AssignmentChange]
+
+
+class Subscription:
+    """Client SSE collegato: coda limitata; se si riempie il client è "lagged" e riceverà un reset."""
+
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[BusEvent]" = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+
+class AssignmentEventBus:
+    """
+    Fan-out in-process delle notifiche verso i client SSE, indicizzato per utente:
+    ogni evento arriva solo ai subscriber nel suo pubblico (teacher + studenti).
+
+    Gli ultimi `replay_size` eventi restano in memoria: un client che si riconnette con
+    Last-Event-ID riceve solo quelli persi. Se l'id non è più (o non è mai stato) nello storico
+    riceve un "reset" e ricarica le liste una volta sola.
+    """
+
+    def __init__(self, queue_size: int = 256, replay_size: int = 1024):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._history: Deque[Tuple[str, FrozenSet[str], AssignmentChange]] = deque(maxlen=replay_size)
+        self._epoch = uuid.uuid4().hex[:8]  # id locali di processo: non confondibili dopo un riavvio
+        self._seq = 0
+        self._published = 0
+        self._dropped = 0
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "history": len(self._history),
+            "published": self._published,
+            "dropped": self._dropped,
+        }
+
+    def last_event_id(self) -> Optional[str]:
+        return self._history[-1][0] if self._history else None
+
+    def subscribe(self, user_id: str) -> Subscription:
+        sub = Subscription(str(user_id), self.queue_size)
+        self._subscribers.setdefault(sub.user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.user_id]
+
+    def publish(self, change: AssignmentChange, audience: Iterable[str], event_id: Optional[str] = None) -> str:
+        """Consegna `change` ai subscriber in `audience`; `event_id` è il resume token della sorgente, se c'è."""
+        if event_id is None:
+            self._seq += 1
+            event_id = f"{self._epoch}-{self._seq}"
+        audience = frozenset(str(u) for u in audience if u is not None)
+        self._history.append((event_id, audience, change))
+        self._published += 1
+
+        # si scorre il lato più piccolo: roster enormi con pochi client connessi, o viceversa
+        if len(audience) <= len(self._subscribers):
+            targets = [s for u in audience for s in self._subscribers.get(u, ())]
+        else:
+            targets = [s for u, subs in self._subscribers.items() if u in audience for s in subs]
+        for sub in targets:
+            self._deliver(sub, (event_id, change))
+        return event_id
+
+    def _deliver(self, sub: Subscription, item: BusEvent) -> None:
+        if sub.lagged:
+            return
+        try:
+            sub.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # client troppo lento: non si blocca il fan-out, il client ricaricherà
+            sub.lagged = True
+            self._dropped += 1
+
+    def replay(self, user_id: str, last_event_id: str) -> Optional[List[BusEvent]]:
+        """Eventi per `user_id` successivi a `last_event_id`; None se l'id non è nello storico."""
+        user_id = str(user_id)
+        missed: Optional[List[BusEvent]] = None
+        for event_id, audience, change in self._history:
+            if missed is not None:
+                if user_id in audience:
+                    missed.append((event_id, change))
+            elif event_id == last_event_id:
+                missed = []
+        return missed
+
+
+def _sse(event: str, data: bytes, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + data + b"\n\n"
+
+
+async def sse_stream(
+    bus: AssignmentEventBus,
+    user_id: str,
+    last_event_id: Optional[str] = None,
+    heartbeat_seconds: float = 15.0,
+) -> AsyncIterator[bytes]:
+    """
+    Stream text/event-stream per un utente: eventi persi dopo `last_event_id` (se rigiocabili),
+    poi eventi in tempo reale, con un commento di keep-alive ogni `heartbeat_seconds`.
+    """
+    # iscrizione prima del replay: nessun evento perso tra i due (gli eventuali doppioni si saltano)
+    sub = bus.subscribe(user_id)
+    try:
+        yield b"retry: 3000\n\n"
+        replayed: Set[str] = set()
+        if last_event_id:
+            missed = bus.replay(user_id, last_event_id)
+            if missed is None:
+                yield _sse("reset", b"{}", bus.last_event_id())
+            else:
+                for event_id, change in missed:
+                    replayed.add(event_id)
+                    yield _sse(change.type, change.model_dump_json(exclude_none=True).encode(), event_id)
+
+        while True:
+            if sub.lagged:
+                # coda piena: si riparte dall'ultimo evento, il client ricarica una volta
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.lagged = False
+                replayed.clear()
+                yield _sse("reset", b"{}", bus.last_event_id())
+            try:
+                event_id, change = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event_id in replayed:
+                replayed.discard(event_id)
+                continue
+            yield _sse(change.type, change.model_dump_json(exclude_none=True).encode(), event_id)
+    finally:
+        bus.unsubscribe(sub)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.database.assignment_repo import AssignmentRepo
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(ts: datetime) -> datetime:
+    # Mongo restituisce datetime naive (UTC)
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+class HealthMonitor:
+    """
+    Controlla le dipendenze in background e conserva l'ultimo esito: le probe di Kubernetes
+    leggono solo lo snapshot (nessun round-trip verso Mongo/RabbitMQ per ogni probe).
+
+    - mongo:    ping tramite il repository, con timeout e RTT in millisecondi;
+    - rabbitmq: stato di connessione/canali del publisher (is_ready); nei worker senza
+                publisher (solo HTTP, vedi app.core.workers) il check è saltato;
+    - sweeper:  età dell'assignment scaduto più vecchio non ancora chiuso (solo informativo:
+                un lag alto segnala "degraded" ma non toglie il pod dal bilanciamento).
+
+    Il pod è ready se mongo e rabbitmq sono ok e lo snapshot non è più vecchio di `stale_after`.
+    Con `require_publisher=False` (avvio in background) RabbitMQ non serve per la readiness:
+    gli eventi restano nell'outbox e un broker non raggiungibile rende il pod solo "degraded".
+    """
+
+    def __init__(
+        self,
+        repo: AssignmentRepo,
+        publisher: Optional[Any],
+        interval_seconds: float = 5.0,
+        timeout_seconds: float = 2.0,
+        max_sweep_lag_seconds: float = 300.0,
+        require_publisher: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.repo = repo
+        self.publisher = publisher
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_sweep_lag_seconds = max_sweep_lag_seconds
+        self.require_publisher = require_publisher
+        self.stale_after = max(3 * interval_seconds, timeout_seconds * 2)
+        self._clock = clock
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._checked_at: Optional[float] = None
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def _timed(self, fn) -> Tuple[Any, Dict[str, Any]]:
+        """Esegue il check con timeout; ritorna (risultato, esito con RTT in ms)."""
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.timeout_seconds)
+            check: Dict[str, Any] = {"ok": True}
+        except asyncio.TimeoutError:
+            result, check = None, {"ok": False, "error": f"timeout dopo {self.timeout_seconds}s"}
+        except Exception as exc:
+            result, check = None, {"ok": False, "error": str(exc) or type(exc).__name__}
+        check["latencyMs"] = round((time.perf_counter() - start) * 1000, 2)
+        return result, check
+
+    async def _check_sweeper(self, now: datetime) -> Dict[str, Any]:
+        oldest, check = await self._timed(lambda: self.repo.oldest_overdue(now))
+        if check["ok"]:
+            lag = (now - _as_utc(oldest)).total_seconds() if oldest is not None else 0.0
+            check["lagSeconds"] = round(lag, 3)
+            check["ok"] = lag <= self.max_sweep_lag_seconds
+        return check
+
+    async def check_once(self) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        (_, mongo), sweeper = await asyncio.gather(self._timed(self.repo.ping), self._check_sweeper(now))
+        if self.publisher is None:
+            rabbitmq: Dict[str, Any] = {"ok": True, "skipped": "nessun publisher in questo worker"}
+        else:
+            rabbitmq = {"ok": bool(getattr(self.publisher, "is_ready", False))}
+
+        ready = mongo["ok"] and (rabbitmq["ok"] or not self.require_publisher)
+        healthy = ready and rabbitmq["ok"] and sweeper["ok"]
+        self._snapshot = {
+            "status": "ok" if healthy else ("degraded" if ready else "fail"),
+            "ready": ready,
+            "checkedAt": now.isoformat(),
+            "checks": {"mongo": mongo, "rabbitmq": rabbitmq, "sweeper": sweeper},
+        }
+        self._checked_at = self._clock()
+        return self._snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Ultimo esito; se è troppo vecchio (monitor bloccato) il pod non è considerato ready."""
+        if self._snapshot is None or self._checked_at is None:
+            return {"status": "starting", "ready": False, "checks": {}}
+        age = self._clock() - self._checked_at
+        if age > self.stale_after:
+            return {**self._snapshot, "status": "stale", "ready": False, "ageSeconds": round(age, 3)}
+        return self._snapshot
+
+    async def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self.check_once()
+            except Exception:
+                logger.exception("Health check fallito")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
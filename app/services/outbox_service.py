@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from app.database.outbox_repo import OutboxRepo
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Svuota l'outbox verso RabbitMQ: prende in carico gli eventi a batch, li pubblica con
+    publish_many e li rimuove solo dopo la conferma del broker. Gli eventi falliti vengono
+    ritentati con backoff; i messageId sono stabili, quindi i consumer possono deduplicare.
+    """
+
+    def __init__(
+        self,
+        outbox: OutboxRepo,
+        publisher: Any,
+        batch_size: int = 100,
+        poll_seconds: float = 1.0,
+        claim_seconds: float = 30,
+        retry_base_seconds: float = 2,
+    ) -> None:
+        self.outbox = outbox
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.claim_seconds = claim_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self._stop = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        """Sveglia il relay (es. subito dopo aver scritto un evento) senza attendere il polling."""
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        """Pubblica un batch. Ritorna il numero di eventi presi in carico."""
+        now = datetime.now(timezone.utc)
+        batch = await self.outbox.claim_batch(now, self.batch_size, self.claim_seconds)
+        if not batch:
+            return 0
+
+        results = await self.publisher.publish_many([event for _, event in batch], window=self.batch_size)
+        sent = [entry_id for (entry_id, _), r in zip(batch, results) if r is None]
+        failed = [entry_id for (entry_id, _), r in zip(batch, results) if r is not None]
+
+        await self.outbox.ack(sent)
+        if failed:
+            logger.warning("Outbox: %s eventi non pubblicati, verranno ritentati.", len(failed))
+            await self.outbox.retry(failed, datetime.now(timezone.utc), self.retry_base_seconds)
+        return len(batch)
+
+    async def run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                claimed = await self.relay_once()
+            except Exception:
+                logger.exception("Errore nel relay dell'outbox")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # c'è ancora arretrato: niente attesa
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
@@ -1,16 +1,33 @@
 import asyncio
+import itertools
 import json
 import logging
+import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional, Sequence
 
 import aio_pika
 from aio_pika import Message, DeliveryMode, ExchangeType
 from aio_pika.abc import AbstractRobustConnection, AbstractRobustChannel, AbstractExchange, AbstractQueue
 
+from app.core.metrics import PUBLISH_SECONDS
+from app.schemas.events import AssignmentStatusEvent
+
 logger = logging.getLogger(__name__)
 
+
+class PublisherUnavailableError(RuntimeError):
+    """RabbitMQ non è raggiungibile: la riconnessione procede in background."""
+
+
 class AssignmentPublisher:
+    """
+    Publisher RabbitMQ con un piccolo pool di canali in confirm mode (publish round-robin).
+
+    Se la connessione cade, la richiesta NON si blocca sul retry: parte un unico supervisore
+    di riconnessione in background (protetto da _lock) e il publish fallisce subito
+    (fail_fast) oppure attende al massimo publish_timeout secondi.
+    """
 
     def __init__(
         self,
@@ -19,75 +36,203 @@ class AssignmentPublisher:
         exchange: str = "elearning.reports",
         routing_key: str = "assignments.reports",
         queue_name: str = "assignments.reports",
+        channel_pool_size: int = 4,
+        publish_timeout: float = 5.0,
+        fail_fast: bool = True,
+        reconnect_delay: float = 1.0,
+        reconnect_max_delay: float = 30.0,
     ) -> None:
         self.rabbitmq_url = rabbitmq_url
         self.heartbeat = heartbeat
         self.exchange_name = exchange
         self.routing_key = routing_key
         self.queue_name = queue_name  # se None, verrà creata una coda esclusiva e temporanea
+        self.channel_pool_size = max(1, channel_pool_size)
+        self.publish_timeout = publish_timeout
+        self.fail_fast = fail_fast
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
 
         self._conn: Optional[AbstractRobustConnection] = None
-        self._channel: Optional[AbstractRobustChannel] = None
-        self._exchange: Optional[AbstractExchange] = None
+        self._channels: List[AbstractRobustChannel] = []
+        self._exchanges: List[AbstractExchange] = []
         self._temp_queue: Optional[AbstractQueue] = None
+        self._next_slot = itertools.count()
+        self._ready = asyncio.Event()
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
         self._lock = asyncio.Lock()
 
+    @property
+    def is_ready(self) -> bool:
+        return (
+            self._conn is not None
+            and not self._conn.is_closed
+            and any(not ch.is_closed for ch in self._channels)
+        )
+
+    async def _open(self) -> None:
+        """Un tentativo: (ri)apre la connessione se serve e i canali del pool non attivi."""
+        if self._conn is None or self._conn.is_closed:
+            self._conn = await aio_pika.connect_robust(self.rabbitmq_url, heartbeat=self.heartbeat)
+            self._channels, self._exchanges = [], []
+
+        channels, exchanges = [], []
+        for slot in range(self.channel_pool_size):
+            if slot < len(self._channels) and not self._channels[slot].is_closed:
+                channels.append(self._channels[slot])
+                exchanges.append(self._exchanges[slot])
+                continue
+            channel = await self._conn.channel(publisher_confirms=True)
+            await channel.set_qos(prefetch_count=10)
+            channels.append(channel)
+            exchanges.append(
+                await channel.declare_exchange(self.exchange_name, ExchangeType.DIRECT, durable=True)
+            )
+        self._channels, self._exchanges = channels, exchanges
+        self._ready.set()
+
     async def connect(self, max_retries: int = 5, delay: int = 3) -> None:
         """Apre connessione e dichiara exchange/queue con retry/backoff."""
-        attempt = 0
-        while True:
-            try:
-                logger.debug("Tentativo connessione RabbitMQ #%s", attempt + 1)
-                self._conn = await aio_pika.connect_robust(self.rabbitmq_url, heartbeat=self.heartbeat)
-                self._channel = await self._conn.channel(publisher_confirms=True)
-                await self._channel.set_qos(prefetch_count=10)
+        async with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    logger.debug("Tentativo connessione RabbitMQ #%s", attempt + 1)
+                    await self._open()
+                    logger.info("Connessione a RabbitMQ stabilita (%s canali).", len(self._channels))
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    attempt += 1
+                    logger.warning("Connessione fallita: %s", exc)
+                    if attempt >= max_retries:
+                        logger.error("Impossibile connettersi a RabbitMQ dopo %s tentativi.", max_retries)
+                        raise
+                    await asyncio.sleep(delay)
+
+    def connect_in_background(self) -> None:
+        """
+        Come connect, ma senza attendere: il supervisore di riconnessione riprova con backoff
+        finché il broker non risponde. Intanto i publish falliscono (o attendono) come a connessione caduta.
+        """
+        self._start_reconnect()
 
-                self._exchange = await self._channel.declare_exchange(
-                    self.exchange_name, ExchangeType.DIRECT, durable=True
-                )
+    async def wait_ready(self) -> None:
+        await self._ready.wait()
 
-                logger.info("Connessione a RabbitMQ stabilita.")
-                return
-            except asyncio.CancelledError:
-                raise
-            except Exception as exc:
-                attempt += 1
-                logger.warning("Connessione fallita: %s", exc)
-                if attempt >= max_retries:
-                    logger.error("Impossibile connettersi a RabbitMQ dopo %s tentativi.", max_retries)
+    def _start_reconnect(self) -> None:
+        self._ready.clear()
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        """Supervisore unico: riprova con backoff finché il pool non è di nuovo pronto."""
+        async with self._lock:
+            delay = self.reconnect_delay
+            while not self._closing:
+                try:
+                    await self._open()
+                    logger.info("Riconnessione a RabbitMQ completata.")
+                    return
+                except asyncio.CancelledError:
                     raise
-                await asyncio.sleep(delay)
+                except Exception as exc:
+                    logger.warning("Riconnessione a RabbitMQ fallita: %s (nuovo tentativo tra %.1fs)", exc, delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.reconnect_max_delay)
 
     async def close(self) -> None:
-        """Chiude in modo pulito canale e connessione."""
+        """Chiude in modo pulito canali e connessione."""
+        self._closing = True
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
         async with self._lock:
             try:
-                if self._channel and not self._channel.is_closed:
-                    logger.debug("Chiusura canale RabbitMQ.")
-                    await self._channel.close()
+                for channel in self._channels:
+                    if not channel.is_closed:
+                        logger.debug("Chiusura canale RabbitMQ.")
+                        await channel.close()
             finally:
                 if self._conn and not self._conn.is_closed:
                     logger.debug("Chiusura connessione RabbitMQ.")
                     await self._conn.close()
             self._conn = None
-            self._channel = None
-            self._exchange = None
+            self._channels = []
+            self._exchanges = []
             self._temp_queue = None
+            self._ready.clear()
+
+    def _pick_exchange(self) -> Optional[AbstractExchange]:
+        """Round-robin sui canali attivi; se qualcuno è chiuso avvia la riparazione in background."""
+        if self._conn is None or self._conn.is_closed or not self._channels:
+            return None
+        size = len(self._channels)
+        for _ in range(size):
+            slot = next(self._next_slot) % size
+            if not self._channels[slot].is_closed:
+                if size < self.channel_pool_size or any(ch.is_closed for ch in self._channels):
+                    self._start_reconnect()
+                    self._ready.set()  # almeno un canale è utilizzabile
+                return self._exchanges[slot]
+        return None
+
+    async def _ensure_ready(self) -> AbstractExchange:
+        exchange = self._pick_exchange()
+        if exchange is not None:
+            return exchange
+
+        logger.debug("RabbitMQ non pronto: avvio la riconnessione in background.")
+        self._start_reconnect()
+        if self.fail_fast:
+            raise PublisherUnavailableError("RabbitMQ non disponibile")
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=self.publish_timeout)
+        except asyncio.TimeoutError:
+            raise PublisherUnavailableError(
+                f"RabbitMQ non disponibile dopo {self.publish_timeout}s"
+            ) from None
+        exchange = self._pick_exchange()
+        if exchange is None:
+            raise PublisherUnavailableError("RabbitMQ non disponibile")
+        return exchange
+
+    def _build_message(self, event: AssignmentStatusEvent) -> Message:
+        payload = {
+            "assignmentId": event.assignmentId,
+            "status": event.status,
+            "teacherId": event.teacherId
+        }
+        if event.deadline is not None:
+            payload["deadline"] = event.deadline.isoformat()
 
-    async def _ensure_ready(self) -> None:
-        if not self._conn or self._conn.is_closed:
-            logger.debug("Connessione non attiva: provo a riconnettermi.")
-            await self.connect()
-        if not self._channel or self._channel.is_closed:
-            logger.debug("Canale non attivo: riapro il canale.")
-            assert self._conn is not None
-            self._channel = await self._conn.channel(publisher_confirms=True)
-        if not self._exchange:
-            logger.debug("Exchange non presente in cache: lo dichiaro/recupero.")
-            assert self._channel is not None
-            self._exchange = await self._channel.declare_exchange(
-                self.exchange_name, ExchangeType.DIRECT, durable=True
+        body = json.dumps(payload).encode("utf-8")
+        return Message(
+            body=body,
+            content_type="application/json",
+            delivery_mode=DeliveryMode.NOT_PERSISTENT,
+            message_id=event.messageId or event.assignmentId,
+            headers={"eventType": event.eventType},
+        )
+
+    async def _publish(self, exchange: AbstractExchange, msg: Message) -> None:
+        """Publish con timeout fino alla conferma del broker; la latenza finisce nelle metriche."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            await asyncio.wait_for(
+                exchange.publish(msg, routing_key=self.routing_key, mandatory=True),
+                timeout=self.publish_timeout,
             )
+            outcome = "ok"
+        finally:
+            PUBLISH_SECONDS.observe(time.perf_counter() - start, outcome)
 
     async def publish_assignment_status(
         self,
@@ -99,33 +244,21 @@ class AssignmentPublisher:
         Pubblica un messaggio di cambiamento stato assignment con payload JSON:
         { assignmentId, status, createdAt, completedAt }
         """
-        await self._ensure_ready()
-        assert self._exchange is not None
+        exchange = await self._ensure_ready()
 
-        payload = {
-            "assignmentId": assignmentId,
-            "status": status,
-            "teacherId": teacherId
-        }
-
-        body = json.dumps(payload).encode("utf-8")
-        msg = Message(
-            body=body,
-            content_type="application/json",
-            delivery_mode=DeliveryMode.NOT_PERSISTENT,
-            message_id=assignmentId,
-            headers={"eventType": "assignment.status.changed"},
-        )
+        event = AssignmentStatusEvent(assignmentId=assignmentId, status=status, teacherId=teacherId)
+        msg = self._build_message(event)
 
         logger.debug(
-            "Publishing su exchange=%s, routing_key=%s, payload=%s",
+            "Publishing su exchange=%s, routing_key=%s, assignmentId=%s, status=%s",
             self.exchange_name,
             self.routing_key,
-            payload,
+            assignmentId,
+            status,
         )
 
         try:
-            await self._exchange.publish(msg, routing_key=self.routing_key, mandatory=True)
+            await self._publish(exchange, msg)
             logger.debug(
                 "Messaggio pubblicato con successo (assignmentId=%s, status=%s).",
                 assignmentId, status
@@ -133,3 +266,61 @@ class AssignmentPublisher:
         except Exception as exc:
             logger.exception("Errore durante la pubblicazione del messaggio: %s", exc)
             raise
+
+    async def publish_many(
+        self,
+        events: Sequence[AssignmentStatusEvent],
+        window: int = 256,
+    ) -> List[Optional[BaseException]]:
+        """
+        Pubblica più eventi in pipeline: fino a `window` messaggi in volo, distribuiti round-robin
+        sui canali del pool; i publisher confirm vengono attesi insieme invece che uno alla volta.
+        Ritorna, nello stesso ordine di `events`, None per i messaggi confermati
+        oppure l'eccezione del singolo messaggio fallito.
+        """
+        results: List[Optional[BaseException]] = [None] * len(events)
+        if not events:
+            return results
+
+        try:
+            await self._ensure_ready()
+        except Exception as exc:
+            logger.error("Publisher non disponibile per il batch: %s", exc)
+            return [exc] * len(events)
+
+        in_flight: dict = {}
+
+        def collect(done) -> None:
+            for task in done:
+                index = in_flight.pop(task)
+                if task.cancelled():
+                    results[index] = asyncio.CancelledError()
+                elif task.exception() is not None:
+                    results[index] = task.exception()
+
+        try:
+            for index, event in enumerate(events):
+                if len(in_flight) >= window:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    collect(done)
+                exchange = self._pick_exchange()
+                if exchange is None:
+                    # connessione persa a metà batch: i restanti falliscono subito e verranno ritentati
+                    self._start_reconnect()
+                    results[index] = PublisherUnavailableError("RabbitMQ non disponibile")
+                    continue
+                task = asyncio.create_task(self._publish(exchange, self._build_message(event)))
+                in_flight[task] = index
+            if in_flight:
+                done, _ = await asyncio.wait(in_flight)
+                collect(done)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        failures = sum(1 for r in results if r is not None)
+        if failures:
+            logger.error("Batch publish: %s/%s messaggi non confermati.", failures, len(events))
+        else:
+            logger.debug("Batch publish: %s messaggi confermati.", len(events))
+        return results
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from app.core.metrics import SWEEP_PUBLISH_FAILURES, SWEEP_SECONDS, SWEEP_TRANSITIONED
+from app.database.assignment_repo import AssignmentRepo
+from app.schemas.events import AssignmentStatusEvent
+from app.services.assignment_service import AssignmentService
+
+logger = logging.getLogger(__name__)
+
+SWEEP_MODES = ("poll", "timer")
+
+# margine oltre la deadline: lo sweep chiude solo deadline < now (strettamente)
+_TIMER_SLACK = timedelta(milliseconds=5)
+
+
+def _as_utc(ts: datetime) -> datetime:
+    # Mongo restituisce datetime naive (UTC), le richieste possono averli con timezone
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+class DeadlineSweeper:
+    """
+    Loop che chiude gli assignment scaduti.
+
+    - lavora a batch limitati (batch_size) finché ci sono documenti scaduti;
+    - se è configurato un lease, solo la replica che lo detiene esegue la passata;
+    - pubblica eventi solo per i documenti transizionati da questa replica, con concorrenza limitata.
+
+    Modalità:
+    - "poll": una passata ogni interval_seconds;
+    - "timer": min-heap delle prossime deadline (caricate a blocchi dall'indice (deadline, status)
+      e aggiornate da schedule() alla creazione); dorme esattamente fino alla prossima deadline
+      e fa comunque una passata di riconciliazione ogni interval_seconds.
+    """
+
+    def __init__(
+        self,
+        repo: AssignmentRepo,
+        publisher: Any,
+        interval_seconds: float = 30,
+        batch_size: int = 500,
+        publish_concurrency: int = 32,
+        lease: Optional[Any] = None,
+        mode: str = "poll",
+        timer_preload: int = 1000,
+    ) -> None:
+        if mode not in SWEEP_MODES:
+            raise ValueError(f"Modalità sweeper non valida: {mode}")
+        self.repo = repo
+        self.publisher = publisher
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.publish_concurrency = publish_concurrency
+        self.lease = lease
+        self.mode = mode
+        self.timer_preload = timer_preload
+        self._stop = asyncio.Event()
+
+        # stato della modalità timer
+        self._heap: List[datetime] = []
+        self._horizon: Optional[datetime] = None  # ultima deadline caricata; None = caricate tutte
+        self._loaded = False
+        self._wakeup = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def schedule(self, deadline: datetime) -> None:
+        """Notifica una nuova deadline (es. alla creazione di un assignment)."""
+        if self.mode != "timer" or not self._loaded:
+            return
+        deadline = _as_utc(deadline)
+        if self._horizon is not None and deadline > self._horizon:
+            return  # verrà caricata con il prossimo blocco
+        is_earliest = not self._heap or deadline < self._heap[0]
+        heapq.heappush(self._heap, deadline)
+        if is_earliest:
+            self._wakeup.set()
+
+    async def _load_deadlines(self, after: datetime) -> None:
+        deadlines = [_as_utc(d) for d in await self.repo.upcoming_deadlines(after, self.timer_preload)]
+        for d in deadlines:
+            heapq.heappush(self._heap, d)
+        self._horizon = deadlines[-1] if len(deadlines) >= self.timer_preload else None
+        self._loaded = True
+
+    async def sweep_once(self) -> List[str]:
+        """Una passata completa (tutti i batch). Ritorna gli ID chiusi da questa replica."""
+        if self.lease is not None and not await self.lease.acquire():
+            logger.debug("Lease dello sweeper detenuto da un'altra replica: salto la passata.")
+            return []
+
+        transitioned: List[str] = []
+        with SWEEP_SECONDS.time():
+            while not self._stop.is_set():
+                assignment_ids = await AssignmentService.sweep_deadlines(self.repo, batch_size=self.batch_size)
+                if not assignment_ids:
+                    break
+                transitioned.extend(assignment_ids)
+                SWEEP_TRANSITIONED.inc(len(assignment_ids))
+                SWEEP_PUBLISH_FAILURES.inc(await self._publish_completed(assignment_ids))
+                if len(assignment_ids) < self.batch_size:
+                    break
+                if self.lease is not None and not await self.lease.acquire():
+                    # il lease è scaduto durante una passata lunga: lasciamo il resto al nuovo owner
+                    break
+        return transitioned
+
+    async def _publish_completed(self, assignment_ids: List[str]) -> int:
+        events = [AssignmentStatusEvent(assignmentId=a, status="completed") for a in assignment_ids]
+        # pipeline con al massimo publish_concurrency conferme in volo; un fallimento non blocca gli altri
+        results = await self.publisher.publish_many(events, window=self.publish_concurrency)
+        failures = 0
+        for event, r in zip(events, results):
+            if r is not None:
+                failures += 1
+                logger.error("Publish fallito (assignmentId=%s)", event.assignmentId, exc_info=r)
+        return failures
+
+    async def run(self) -> None:
+        try:
+            if self.mode == "timer":
+                await self._run_timer()
+            else:
+                await self._run_poll()
+        finally:
+            if self.lease is not None:
+                try:
+                    await self.lease.release()
+                except Exception:
+                    logger.warning("Rilascio del lease dello sweeper fallito", exc_info=True)
+
+    async def _sweep_safely(self) -> None:
+        try:
+            await self.sweep_once()
+        except Exception:
+            logger.exception("Errore sweep deadlines")
+
+    async def _run_poll(self) -> None:
+        while not self._stop.is_set():
+            await self._sweep_safely()
+            # attesa dell'intervallo o uscita se è stato chiesto lo stop
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_timer(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_reconcile = 0.0
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            due = bool(self._heap) and self._heap[0] + _TIMER_SLACK <= now
+            if due or loop.time() >= next_reconcile:
+                await self._sweep_safely()
+                while self._heap and self._heap[0] + _TIMER_SLACK <= now:
+                    heapq.heappop(self._heap)
+                if loop.time() >= next_reconcile:
+                    # riconciliazione: ricarico lo heap per vedere anche le deadline create da altre repliche
+                    next_reconcile = loop.time() + self.interval_seconds
+                    self._heap.clear()
+                    self._horizon = None
+                    self._loaded = False
+
+            if not self._loaded or (not self._heap and self._horizon is not None):
+                try:
+                    await self._load_deadlines(self._horizon or now)
+                except Exception:
+                    logger.exception("Caricamento delle prossime deadline fallito")
+
+            timeout = next_reconcile - loop.time()
+            if self._heap:
+                until_due = (self._heap[0] + _TIMER_SLACK - datetime.now(timezone.utc)).total_seconds()
+                timeout = min(timeout, until_due)
+
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
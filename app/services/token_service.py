@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+
+from app.core.cache import TTLCache
+from app.schemas.context import UserContext
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidTokenPayload(jwt.InvalidTokenError):
+    """Token valido ma senza i claim che ci servono (sub, role)."""
+
+
+class TokenVerifier:
+    """
+    Verifica dei JWT con:
+    - chiave pubblica/segreta parsata una sola volta (niente re-parse del PEM a ogni richiesta);
+    - JWKS opzionale da file, con lookup per `kid` e ricarica quando il file cambia (rotazione senza restart):
+      al più una ricarica ogni `jwks_min_reload_seconds` (un `kid` a caso non forza I/O a ogni richiesta)
+      e un file mancante o scritto a metà tiene le chiavi già caricate;
+    - cache LRU dei token già verificati (chiave = sha256 del token) valida fino al loro `exp`.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        key: Optional[str] = None,
+        jwks_file: Optional[str] = None,
+        cache_max_entries: int = 10_000,
+        cache_max_ttl_seconds: float = 300,
+        jwks_min_reload_seconds: float = 5.0,
+        clock=time.time,
+    ) -> None:
+        self.algorithm = algorithm
+        self._clock = clock
+        self._key = jwt.get_algorithm_by_name(algorithm).prepare_key(key) if key else None
+        self.jwks_file = jwks_file
+        self._jwks: Dict[str, Any] = {}
+        self._jwks_mtime: Optional[float] = None
+        self.jwks_min_reload_seconds = jwks_min_reload_seconds
+        self._jwks_checked_at = clock()
+        if jwks_file:
+            self._load_jwks()  # all'avvio un file non valido è un errore di configurazione
+        self.cache = TTLCache(max_entries=cache_max_entries, ttl_seconds=cache_max_ttl_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+    def _load_jwks(self) -> None:
+        mtime = os.stat(self.jwks_file).st_mtime
+        if mtime == self._jwks_mtime:
+            return
+        with open(self.jwks_file, "r", encoding="utf-8") as fh:
+            jwk_set = jwt.PyJWKSet.from_dict(json.load(fh))
+        self._jwks = {k.key_id: k for k in jwk_set.keys if k.key_id}
+        self._jwks_mtime = mtime
+        logger.info("JWKS caricato da %s (%s chiavi).", self.jwks_file, len(self._jwks))
+
+    def _reload_jwks(self) -> None:
+        now = self._clock()
+        if now - self._jwks_checked_at < self.jwks_min_reload_seconds:
+            return
+        self._jwks_checked_at = now
+        try:
+            self._load_jwks()
+        except (OSError, ValueError, jwt.PyJWKSetError, jwt.PyJWKError) as exc:
+            # rotazione in corso (file assente o incompleto): restano le chiavi precedenti, il token è un 401
+            logger.error("Ricarica del JWKS da %s fallita (%s): uso le chiavi precedenti.", self.jwks_file, exc)
+
+    def _signing_key(self, token: str) -> Any:
+        if not self.jwks_file:
+            return self._key
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in self._jwks:
+            # kid sconosciuto: forse le chiavi sono ruotate, ricarico il file se è cambiato
+            self._reload_jwks()
+        jwk = self._jwks.get(kid)
+        if jwk is not None:
+            return jwk.key
+        if self._key is not None:
+            return self._key
+        raise jwt.InvalidTokenError(f"Chiave sconosciuta (kid={kid})")
+
+    def _decode(self, token: str) -> UserContext:
+        payload = jwt.decode(token, self._signing_key(token), algorithms=[self.algorithm])
+
+        user_id = payload.get("sub")
+        role = payload.get("role")  # può essere str o list[str] in base a come emetti il token
+        if not user_id or role is None:
+            raise InvalidTokenPayload("Invalid token payload")
+
+        user = UserContext(user_id=user_id, role=role)
+        exp = payload.get("exp")
+        ttl = float(exp) - self._clock() if exp is not None else None
+        if ttl is None or ttl > 0:
+            self.cache.set(self._cache_key(token), (user, exp), ttl_seconds=ttl)
+        return user
+
+    @staticmethod
+    def _cache_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def verify(self, token: str) -> UserContext:
+        cached = self.cache.get(self._cache_key(token))
+        if isinstance(cached, tuple):
+            user, exp = cached
+            if exp is None or exp > self._clock():
+                self.cache.hits += 1
+                return user
+        self.cache.misses += 1
+        return self._decode(token)
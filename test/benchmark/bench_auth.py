@@ -0,0 +1,59 @@
+"""
+Micro-benchmark del costo di autenticazione per richiesta (RS256).
+
+Confronta:
+- "pem_per_request": jwt.decode con il PEM grezzo a ogni chiamata (comportamento precedente);
+- "preparsed_key":   TokenVerifier senza cache (chiave parsata una volta, firma verificata sempre);
+- "cached":          TokenVerifier con cache dei token già verificati (stesso token ripetuto).
+
+    PYTHONPATH=. python test/benchmark/bench_auth.py [--requests 2000]
+"""
+import argparse
+import json
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.services.token_service import TokenVerifier
+
+
+def _keys():
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private, public_pem
+
+
+def _timeit(fn, requests: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    elapsed = time.perf_counter() - start
+    return {"requests": requests, "us_per_request": round(elapsed / requests * 1e6, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    private, public_pem = _keys()
+    token = jwt.encode({"sub": "u1", "role": "student", "exp": int(time.time()) + 3600}, private, algorithm="RS256")
+
+    uncached = TokenVerifier("RS256", key=public_pem, cache_max_entries=0)
+    cached = TokenVerifier("RS256", key=public_pem)
+
+    results = {
+        "pem_per_request": _timeit(lambda: jwt.decode(token, public_pem, algorithms=["RS256"]), args.requests),
+        "preparsed_key": _timeit(lambda: uncached.verify(token), args.requests),
+        "cached": _timeit(lambda: cached.verify(token), args.requests),
+    }
+    results["cached"]["cache"] = cached.stats()
+    print(json.dumps({"benchmark": "auth.verify", "algorithm": "RS256", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
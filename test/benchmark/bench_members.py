@@ -0,0 +1,118 @@
+"""
+Confronto dei due layout delle iscrizioni su un MongoDB reale:
+- "embedded": roster nel campo `students` dell'assignment (indice multikey);
+- "members":  un documento per (assignmentId, studentId) in `assignment_members`.
+
+Per ogni dimensione del roster (default 100, 10k, 100k studenti per assignment) misura
+dimensione BSON del documento, tempo di inserimento, latenza delle letture lato studente
+e dimensione totale degli indici. Usa un database usa-e-getta che viene droppato alla fine.
+
+    PYTHONPATH=. python test/benchmark/bench_members.py [--mongo-uri mongodb://localhost:27017]
+        [--assignments 5] [--sizes 100 10000 100000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.database.mongo_assignment import MongoAssignmentRepository
+from app.database.mongo_members import MEMBERS_COLLECTION, MongoMemberAssignmentRepository
+from app.schemas.assignment import Assignment
+
+LAYOUTS = {"embedded": MongoAssignmentRepository, "members": MongoMemberAssignmentRepository}
+
+
+def _assignments(count: int, students: int) -> list:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    roster = [f"student-{i:06d}" for i in range(students)]
+    return [
+        Assignment(
+            assignmentId=f"as-bench-{students}-{i:04d}",
+            teacherId="teacher-bench",
+            title=f"Assignment {i}",
+            description="benchmark",
+            deadline=now + timedelta(days=7),
+            students=roster,
+            content="x" * 200,
+            createdAt=now + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+async def _timeit(coro_fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await coro_fn()
+    return round((time.perf_counter() - start) / repeat * 1000, 3)
+
+
+async def _index_bytes(db, *collections: str) -> int:
+    total = 0
+    for name in collections:
+        stats = await db.command("collStats", name)
+        total += int(stats.get("totalIndexSize", 0))
+    return total
+
+
+async def _bench_layout(db, layout: str, items: list, repeat: int) -> dict:
+    repo = LAYOUTS[layout](db)
+    await repo.ensure_indexes()
+
+    start = time.perf_counter()
+    for a in items:
+        await repo.create(a)
+    insert_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    # lo studente "centrale" è iscritto a tutti gli assignment
+    student = items[0].students[len(items[0].students) // 2]
+    one = items[-1].assignmentId
+    collections = ["assignments"] + ([MEMBERS_COLLECTION] if layout == "members" else [])
+    return {
+        "doc_bytes": len(bson.encode(repo._to_doc_from_model(items[0]))),
+        "insert_ms_total": insert_ms,
+        "find_for_student_ms": await _timeit(lambda: repo.find_for_student(student), repeat),
+        "find_page_for_student_ms": await _timeit(lambda: repo.find_page_for_student(student, limit=50), repeat),
+        "find_one_for_student_ms": await _timeit(lambda: repo.find_one_for_student(one, student), repeat),
+        "find_one_teacher_ms": await _timeit(lambda: repo.find_one_for_teacher(one, "teacher-bench"), repeat),
+        "index_bytes": await _index_bytes(db, *collections),
+    }
+
+
+async def main_async(args) -> dict:
+    client = AsyncIOMotorClient(args.mongo_uri, uuidRepresentation="standard")
+    results = []
+    try:
+        for size in args.sizes:
+            items = _assignments(args.assignments, size)
+            row = {"students_per_assignment": size, "assignments": args.assignments}
+            for layout in LAYOUTS:
+                db_name = f"bench_members_{layout}_{size}"
+                await client.drop_database(db_name)
+                try:
+                    row[layout] = await _bench_layout(client[db_name], layout, items, args.repeat)
+                finally:
+                    await client.drop_database(db_name)
+            results.append(row)
+    finally:
+        client.close()
+    return {"benchmark": "students.storage", "repeat": args.repeat, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--assignments", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
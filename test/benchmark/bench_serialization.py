@@ -0,0 +1,86 @@
+"""
+Micro-benchmark della serializzazione di una lista di assignment letti da Mongo.
+
+Confronta:
+- "validated": Assignment(**doc) + rivalidazione del response_model + json.dumps (percorso precedente);
+- "fast":      model_construct + dump JSON diretto (percorso usato dal repository).
+
+    PYTHONPATH=. python test/benchmark/bench_serialization.py [--sizes 10,1000,10000] [--rounds 3]
+
+L'equivalenza dei due output è verificata in test/pytest/test_serialization.py.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.schemas.assignment import Assignment, AssignmentView, dump_views_json
+
+_response_adapter = TypeAdapter(List[AssignmentView])
+
+
+def _docs(n: int) -> List[dict]:
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    return [
+        {
+            "_id": f"oid-{i}",
+            "assignmentId": f"as-{i:05d}",
+            "teacherId": "t1",
+            "title": f"Compito {i}",
+            "description": "Descrizione",
+            "deadline": now + timedelta(days=7),
+            "students": [f"s{j}" for j in range(30)],
+            "content": "Testo " * 50,
+            "createdAt": now + timedelta(seconds=i),
+            "status": "open",
+            "completedAt": None,
+            "version": 1,
+            "updatedAt": now + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+def _validated_path(docs: List[dict]) -> bytes:
+    models = [Assignment(**{k: v for k, v in d.items() if k != "_id"}) for d in docs]
+    validated = _response_adapter.validate_python([m.model_dump() for m in models])
+    return json.dumps(_response_adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+
+def _fast_path(docs: List[dict]) -> bytes:
+    return dump_views_json([AssignmentView.model_construct(**d) for d in docs])
+
+
+def _best_of(fn, docs, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for n in (int(s) for s in args.sizes.split(",")):
+        docs = _docs(n)
+        slow = _best_of(_validated_path, docs, args.rounds)
+        fast = _best_of(_fast_path, docs, args.rounds)
+        results[n] = {
+            "validated_ms": round(slow * 1000, 2),
+            "fast_ms": round(fast * 1000, 2),
+            "speedup": round(slow / fast, 1) if fast else None,
+        }
+    print(json.dumps({"benchmark": "serialization", "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
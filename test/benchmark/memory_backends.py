@@ -0,0 +1,26 @@
+"""
+Publisher stub per i benchmark: nessun RabbitMQ, così si misura solo il costo dell'applicazione.
+Il repository in memoria è app.database.memory_assignment.MemoryAssignmentRepository.
+"""
+from typing import Optional, Sequence
+
+from app.schemas.events import AssignmentStatusEvent
+
+
+class StubPublisher:
+    """Publisher che conferma subito tutto (misura il costo lato app, non del broker)."""
+
+    is_ready = True
+
+    def __init__(self):
+        self.published = 0
+
+    async def publish_assignment_status(self, assignmentId: str, status: str, teacherId: Optional[str] = None) -> None:
+        self.published += 1
+
+    async def publish_many(self, events: Sequence[AssignmentStatusEvent], window: int = 256) -> list:
+        self.published += len(events)
+        return [None] * len(events)
+
+    async def close(self) -> None:
+        return None
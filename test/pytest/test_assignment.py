@@ -2,20 +2,22 @@
 import pytest
 from datetime import datetime, timedelta, timezone
 
-from app.services.assignment_service import AssignmentService
-from app.schemas.assignment import AssignmentCreate, Assignment
+from app.services.assignment_service import AssignmentService, parse_fields
+from app.schemas.assignment import AssignmentCreate, Assignment, AssignmentView
 from app.schemas.context import UserContext
 
 # ------------------------- Fake repository -------------------------
 class FakeAssignmentRepo:
     def __init__(self):
         self.items: dict[str, Assignment] = {}
+        self.outbox = []
 
-    async def create(self, assignment: Assignment) -> str:
+    async def create(self, assignment: Assignment, events=()) -> str:
         # NON genera ID: si aspetta assignment.assignmentId già valorizzato
         if not getattr(assignment, "assignmentId", None):
             raise ValueError("assignmentId must be set by the service")
         self.items[assignment.assignmentId] = assignment
+        self.outbox.extend(events)
         return assignment.assignmentId
 
     async def find_for_teacher(self, teacher_id: str):
@@ -24,20 +26,104 @@ class FakeAssignmentRepo:
     async def find_for_student(self, student_id: str):
         return [a for a in self.items.values() if student_id in getattr(a, "students", [])]
 
+    async def create_many(self, assignments, events=()):
+        errors = []
+        for a in assignments:
+            if a.assignmentId in self.items:
+                errors.append("duplicate key")
+            else:
+                self.items[a.assignmentId] = a
+                errors.append(None)
+        inserted = {a.assignmentId for a, e in zip(assignments, errors) if e is None}
+        self.outbox.extend(e for e in events if e.assignmentId in inserted)
+        return errors
+
+    async def delete_many(self, teacher_id, assignment_ids=None, deleted_event=None):
+        owned = [a for a in self.items.values() if a.teacherId == teacher_id]
+        if assignment_ids is not None:
+            owned = [a for a in owned if a.assignmentId in set(assignment_ids)]
+        for a in owned:
+            del self.items[a.assignmentId]
+            if deleted_event is not None:
+                self.outbox.append(deleted_event(a.assignmentId))
+        return [a.assignmentId for a in owned]
+
+    async def shift_deadlines(self, teacher_id, delta, assignment_ids=None, shifted_event=None):
+        shifted = []
+        for a in list(self.items.values()):
+            if a.teacherId != teacher_id or a.status == "completed":
+                continue
+            if assignment_ids is not None and a.assignmentId not in assignment_ids:
+                continue
+            a.deadline = a.deadline + delta
+            shifted.append((a.assignmentId, a.deadline))
+            if shifted_event is not None:
+                self.outbox.append(shifted_event(a.assignmentId, a.deadline))
+        return shifted
+
+    async def enqueue_events(self, events):
+        self.outbox.extend(events)
+
+    def _page(self, items, limit, after, fields):
+        items = sorted(items, key=lambda a: (a.createdAt, a.assignmentId))
+        if after is not None:
+            items = [a for a in items if (a.createdAt, a.assignmentId) > after]
+        if limit:
+            items = items[:limit]
+        include = set(fields) if fields else None
+        return [AssignmentView(**a.model_dump(include=include)) for a in items]
+
+    async def find_page_for_teacher(self, teacher_id: str, limit=None, after=None, fields=None):
+        return self._page([a for a in self.items.values() if a.teacherId == teacher_id], limit, after, fields)
+
+    async def find_page_for_student(self, student_id: str, limit=None, after=None, fields=None):
+        return self._page([a for a in self.items.values() if student_id in a.students], limit, after, fields)
+
+    async def _iter(self, items, fields):
+        for a in self._page(items, None, None, fields):
+            yield a.model_dump(exclude_unset=True)
+
+    def iter_for_teacher(self, teacher_id: str, batch_size: int, fields=None):
+        return self._iter([a for a in self.items.values() if a.teacherId == teacher_id], fields)
+
+    def iter_for_student(self, student_id: str, batch_size: int, fields=None):
+        return self._iter([a for a in self.items.values() if student_id in a.students], fields)
+
     async def find_one(self, assignment_id: str):
         return self.items.get(assignment_id)
 
-    async def delete(self, assignment_id: str):
-        return self.items.pop(assignment_id, None) is not None
+    async def find_one_for_teacher(self, assignment_id: str, teacher_id: str):
+        a = self.items.get(assignment_id)
+        return a if a is not None and a.teacherId == teacher_id else None
+
+    async def find_one_for_student(self, assignment_id: str, student_id: str):
+        a = self.items.get(assignment_id)
+        if a is None or student_id not in a.students:
+            return None
+        return a.model_copy(update={"students": [student_id]})
+
+    async def exists(self, assignment_id: str):
+        return assignment_id in self.items
 
-    async def update_assignment_state(self, now: datetime):
-        changed = 0
-        for a in self.items.values():
-            if a.status != "completed" and a.deadline < now:
-                a.status = "completed"
-                a.completedAt = now
-                changed += 1
-        return changed
+    async def delete(self, assignment_id: str, deleted_event=None):
+        if self.items.pop(assignment_id, None) is None:
+            return False
+        if deleted_event is not None:
+            self.outbox.append(deleted_event(assignment_id))
+        return True
+
+    async def update_assignment_state(self, now: datetime, limit=None):
+        # stesso contratto del repo reale: lista degli ID transizionati, i più vecchi per primi
+        overdue = sorted(
+            (a for a in self.items.values() if a.status != "completed" and a.deadline < now),
+            key=lambda a: a.deadline,
+        )
+        if limit:
+            overdue = overdue[:limit]
+        for a in overdue:
+            a.status = "completed"
+            a.completedAt = now
+        return [a.assignmentId for a in overdue]
 
 
 # ------------------------------- Fixtures -------------------------------------
@@ -95,6 +181,14 @@ async def test_create_ok(repo, teacher):
     assert saved.completedAt is None
     assert isinstance(saved.createdAt, datetime)
 
+@pytest.mark.asyncio
+async def test_create_enqueues_open_event(repo, teacher):
+    new_id = await AssignmentService.create_assignment(_make_create(), teacher, repo)
+    assert len(repo.outbox) == 1
+    event = repo.outbox[0]
+    assert (event.assignmentId, event.status, event.teacherId) == (new_id, "open", "t1")
+    assert event.messageId == f"{new_id}:open"
+
 @pytest.mark.asyncio
 async def test_list_for_teacher(repo, teacher, other_teacher):
     a1 = await AssignmentService.create_assignment(_make_create(title="A"), teacher, repo)
@@ -138,6 +232,24 @@ async def test_get_student_access_ok_and_denied(repo, teacher, student, student2
     with pytest.raises(PermissionError):
         await AssignmentService.get_assignment(aid, student2, repo)
 
+@pytest.mark.asyncio
+async def test_get_student_sees_only_self_in_roster(repo, teacher, student):
+    aid = await AssignmentService.create_assignment(_make_create(students=["s1", "s2", "s3"]), teacher, repo)
+    item = await AssignmentService.get_assignment(aid, student, repo)
+    assert item.students == ["s1"]
+    full = await AssignmentService.get_assignment(aid, teacher, repo)
+    assert full.students == ["s1", "s2", "s3"]
+
+@pytest.mark.asyncio
+async def test_get_not_found_vs_forbidden(repo, teacher, other_teacher, student):
+    assert await AssignmentService.get_assignment("as-99999", teacher, repo) is None
+    assert await AssignmentService.get_assignment("as-99999", student, repo) is None
+    aid = await AssignmentService.create_assignment(_make_create(), teacher, repo)
+    with pytest.raises(PermissionError):
+        await AssignmentService.get_assignment(aid, other_teacher, repo)
+    with pytest.raises(PermissionError):
+        await AssignmentService.get_assignment(aid, student, repo)
+
 @pytest.mark.asyncio
 async def test_delete_requires_teacher(repo, student):
     with pytest.raises(PermissionError):
@@ -146,5 +258,130 @@ async def test_delete_requires_teacher(repo, student):
 @pytest.mark.asyncio
 async def test_delete_ok_and_not_found(repo, teacher):
     aid = await AssignmentService.create_assignment(_make_create(), teacher, repo)
+    repo.outbox.clear()
     assert await AssignmentService.delete_assignment(aid, teacher, repo) is True
     assert await AssignmentService.delete_assignment(aid, teacher, repo) is False
+    # stesso evento della cancellazione in blocco, una sola volta
+    assert [(e.assignmentId, e.status, e.messageId) for e in repo.outbox] == [(aid, "deleted", f"{aid}:deleted")]
+
+@pytest.mark.asyncio
+async def test_list_page_walks_all_items_with_cursor(repo, teacher):
+    created = [
+        await AssignmentService.create_assignment(_make_create(title=f"A{i}"), teacher, repo)
+        for i in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = await AssignmentService.list_assignments_page(teacher, repo, limit=2, cursor=cursor)
+        assert len(items) <= 2
+        seen.extend(a.assignmentId for a in items)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(created)
+    assert len(seen) == len(set(seen))
+
+@pytest.mark.asyncio
+async def test_list_page_projection(repo, teacher):
+    await AssignmentService.create_assignment(_make_create(students=["s1"]), teacher, repo)
+    items, cursor = await AssignmentService.list_assignments_page(
+        teacher, repo, fields=parse_fields("title,deadline")
+    )
+    assert cursor is None
+    dumped = items[0].model_dump(exclude_unset=True)
+    assert set(dumped) == {"assignmentId", "createdAt", "title", "deadline"}
+
+def test_parse_fields_rejects_unknown():
+    assert parse_fields(None) is None
+    with pytest.raises(ValueError):
+        parse_fields("title,password")
+
+@pytest.mark.asyncio
+async def test_list_page_invalid_cursor(repo, teacher):
+    with pytest.raises(ValueError):
+        await AssignmentService.list_assignments_page(teacher, repo, limit=2, cursor="not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_export_streams_user_documents(repo, teacher, other_teacher):
+    a1 = await AssignmentService.create_assignment(_make_create(title="A"), teacher, repo)
+    _ = await AssignmentService.create_assignment(_make_create(title="B"), other_teacher, repo)
+
+    docs = [d async for d in AssignmentService.export_assignments(teacher, repo, batch_size=10)]
+    assert [d["assignmentId"] for d in docs] == [a1]
+
+    other = UserContext(user_id="x1", role="admin")
+    assert [d async for d in AssignmentService.export_assignments(other, repo, batch_size=10)] == []
+
+def test_assignment_ids_are_unique_and_time_ordered():
+    from app.core.ids import is_valid_assignment_id
+    from app.services.assignment_service import create_assignment_id
+
+    ids = [create_assignment_id() for _ in range(5000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(is_valid_assignment_id(i, accept_legacy=False) for i in ids)
+    assert is_valid_assignment_id("as-01234")
+    assert not is_valid_assignment_id("as-01234", accept_legacy=False)
+    assert not is_valid_assignment_id("whatever")
+
+@pytest.mark.asyncio
+async def test_create_batch_reports_per_item_results(repo, teacher):
+    payloads = [
+        _make_create(title="A").model_dump(),
+        {"title": "senza deadline", "description": "D", "students": [], "content": "C"},
+        _make_create(title="B", students=["s1"]).model_dump(),
+        "non un oggetto",
+    ]
+    results, created = await AssignmentService.create_assignments(payloads, teacher, repo)
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert results[0].id and results[2].id and results[1].id is None
+    assert "deadline" in results[1].error
+    assert results[3].id is None and results[3].error
+    assert {a.assignmentId for a in created} == {results[0].id, results[2].id}
+    assert {e.assignmentId for e in repo.outbox} == {results[0].id, results[2].id}
+    assert (await repo.find_one(results[2].id)).students == ["s1"]
+
+@pytest.mark.asyncio
+async def test_create_batch_requires_teacher(repo, student):
+    with pytest.raises(PermissionError):
+        await AssignmentService.create_assignments([], student, repo)
+
+@pytest.mark.asyncio
+async def test_bulk_delete_enforces_ownership(repo, teacher, other_teacher):
+    mine = [await AssignmentService.create_assignment(_make_create(), teacher, repo) for _ in range(3)]
+    theirs = await AssignmentService.create_assignment(_make_create(), other_teacher, repo)
+    repo.outbox.clear()
+
+    deleted = await AssignmentService.delete_assignments(teacher, repo, [mine[0], theirs])
+    assert deleted == [mine[0]]
+    assert await repo.find_one(theirs) is not None
+    assert [(e.assignmentId, e.status) for e in repo.outbox] == [(mine[0], "deleted")]
+
+    deleted = await AssignmentService.delete_assignments(teacher, repo)
+    assert sorted(deleted) == sorted(mine[1:])
+
+@pytest.mark.asyncio
+async def test_bulk_delete_requires_teacher(repo, student):
+    with pytest.raises(PermissionError):
+        await AssignmentService.delete_assignments(student, repo)
+
+@pytest.mark.asyncio
+async def test_shift_deadlines_only_open_owned(repo, teacher, other_teacher):
+    from app.schemas.events import DEADLINE_CHANGED
+
+    aid = await AssignmentService.create_assignment(_make_create(), teacher, repo)
+    done = await AssignmentService.create_assignment(_make_create(), teacher, repo)
+    theirs = await AssignmentService.create_assignment(_make_create(), other_teacher, repo)
+    repo.items[done].status = "completed"
+    before = repo.items[aid].deadline
+    repo.outbox.clear()
+
+    shifted = await AssignmentService.shift_deadlines(teacher, repo, timedelta(days=2))
+    assert shifted == [(aid, before + timedelta(days=2))]
+    assert repo.items[theirs].deadline < repo.items[aid].deadline
+    assert repo.outbox[0].eventType == DEADLINE_CHANGED
+    assert repo.outbox[0].deadline == before + timedelta(days=2)
+
+    with pytest.raises(ValueError):
+        await AssignmentService.shift_deadlines(teacher, repo, timedelta(0))
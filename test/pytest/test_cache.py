@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.database.cached_assignment import CachedAssignmentRepository
+from app.schemas.assignment import Assignment
+
+
+def _assignment(aid: str, teacher: str = "t1", students=("s1",)) -> Assignment:
+    now = datetime.now(timezone.utc)
+    return Assignment(
+        assignmentId=aid, teacherId=teacher, createdAt=now, title="T", description="D",
+        deadline=now + timedelta(days=1), students=list(students), content="C",
+    )
+
+
+class CountingRepo:
+    """Repo minimale che conta le query e può rallentarle per simulare la latenza del DB."""
+
+    def __init__(self, delay: float = 0.0):
+        self.items: dict[str, Assignment] = {}
+        self.calls = 0
+        self.delay = delay
+
+    async def _hit(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def create(self, assignment, events=()):
+        self.items[assignment.assignmentId] = assignment
+        return assignment.assignmentId
+
+    async def find_one(self, assignment_id):
+        await self._hit()
+        return self.items.get(assignment_id)
+
+    async def find_for_teacher(self, teacher_id):
+        await self._hit()
+        return [a for a in self.items.values() if a.teacherId == teacher_id]
+
+    async def find_for_student(self, student_id):
+        await self._hit()
+        return [a for a in self.items.values() if student_id in a.students]
+
+    async def delete(self, assignment_id, deleted_event=None):
+        return self.items.pop(assignment_id, None) is not None
+
+    async def update_assignment_state(self, ts, limit=None):
+        changed = [a.assignmentId for a in self.items.values() if a.status != "completed" and a.deadline < ts]
+        for aid in changed:
+            self.items[aid] = self.items[aid].model_copy(update={"status": "completed", "completedAt": ts})
+        return changed
+
+
+@pytest.mark.asyncio
+async def test_find_one_is_cached_and_counted():
+    inner = CountingRepo()
+    repo = CachedAssignmentRepository(inner)
+    await repo.create(_assignment("a1"))
+
+    assert (await repo.find_one("a1")).assignmentId == "a1"
+    assert (await repo.find_one("a1")).assignmentId == "a1"
+    assert inner.calls == 1
+    assert repo.stats()["hits"] == 1 and repo.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_for_concurrent_misses():
+    inner = CountingRepo(delay=0.01)
+    repo = CachedAssignmentRepository(inner)
+    await repo.create(_assignment("a1"))
+
+    results = await asyncio.gather(*(repo.find_one("a1") for _ in range(20)))
+    assert all(r.assignmentId == "a1" for r in results)
+    assert inner.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_create_invalidates_user_lists():
+    inner = CountingRepo()
+    repo = CachedAssignmentRepository(inner)
+    await repo.create(_assignment("a1"))
+    assert len(await repo.find_for_student("s1")) == 1
+
+    await repo.create(_assignment("a2", students=("s1", "s2")))
+    assert len(await repo.find_for_student("s1")) == 2
+    assert inner.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_and_status_flip_invalidate():
+    inner = CountingRepo()
+    repo = CachedAssignmentRepository(inner)
+    await repo.create(_assignment("a1"))
+    await repo.find_one("a1")
+    await repo.find_for_teacher("t1")
+
+    changed = await repo.update_assignment_state(datetime.now(timezone.utc) + timedelta(days=2))
+    assert changed == ["a1"]
+    assert (await repo.find_one("a1")).status == "completed"
+    assert (await repo.find_for_teacher("t1"))[0].status == "completed"
+
+    await repo.delete("a1")
+    assert await repo.find_one("a1") is None
+    assert await repo.find_for_teacher("t1") == []
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_lru_eviction():
+    now = [0.0]
+    cache = TTLCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+
+    async def load(v):
+        return v
+
+    await cache.get_or_load("a", lambda: load(1))
+    await cache.get_or_load("b", lambda: load(2))
+    await cache.get_or_load("a", lambda: load(1))  # "a" diventa la più recente
+    await cache.get_or_load("c", lambda: load(3))  # evict di "b"
+    assert cache.evictions == 1
+    assert "b" not in cache._data and "a" in cache._data
+
+    now[0] = 11
+    await cache.get_or_load("a", lambda: load(10))
+    assert cache.get("a") == 10
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database.content_repo import InlineContent, content_ref
+from app.database.memory_assignment import MemoryAssignmentRepository
+from app.schemas.assignment import Assignment
+from app.schemas.context import UserContext
+from app.services.assignment_service import AssignmentService
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_byte_ranges():
+    pytest.importorskip("fastapi")
+    from app.core.responses import parse_byte_range
+
+    assert parse_byte_range(None, 10) is None
+    assert parse_byte_range("bytes=2-4", 10) == (2, 4)
+    assert parse_byte_range("bytes=5-", 10) == (5, 9)
+    assert parse_byte_range("bytes=-3", 10) == (7, 9)
+    assert parse_byte_range("bytes=8-100", 10) == (8, 9)
+    # più intervalli o sintassi non valida: contenuto intero
+    assert parse_byte_range("bytes=0-1,4-5", 10) is None
+    assert parse_byte_range("items=0-1", 10) is None
+    assert parse_byte_range("bytes=4-2", 10) is None
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=10-", 10)
+
+
+async def _read(blob, start: int, end: int) -> bytes:
+    return b"".join([chunk async for chunk in blob.iter_range(start, end)])
+
+
+@pytest.mark.asyncio
+async def test_open_content_checks_access_and_serves_ranges():
+    repo = MemoryAssignmentRepository()
+    content = "è" * 300_000  # più chunk, caratteri multi-byte
+    await repo.create(Assignment(
+        assignmentId="a1", teacherId="t1", createdAt=NOW, title="T", description="D",
+        deadline=NOW + timedelta(days=1), students=["s1"], content=content,
+    ))
+
+    blob, etag = await AssignmentService.open_content("a1", UserContext(user_id="s1", role="student"), repo)
+    data = content.encode("utf-8")
+    assert isinstance(blob, InlineContent) and blob.length == len(data)
+    assert etag == f'"{content_ref(data)}"'
+    assert await _read(blob, 0, blob.length - 1) == data
+    assert await _read(blob, 100, 300_000) == data[100:300_001]
+
+    with pytest.raises(PermissionError):
+        await AssignmentService.open_content("a1", UserContext(user_id="s2", role="student"), repo)
+    assert await AssignmentService.open_content("a2", UserContext(user_id="t1", role="teacher"), repo) is None
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database.eventing_assignment import EventingAssignmentRepository
+from app.database.memory_assignment import MemoryAssignmentRepository
+from app.schemas.assignment import Assignment
+from app.schemas.events import CREATED, DELETED, STATUS_CHANGED, AssignmentChange
+from app.services.event_bus import AssignmentEventBus, sse_stream
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _change(aid: str, kind: str = CREATED) -> AssignmentChange:
+    return AssignmentChange(type=kind, assignmentId=aid, status="open")
+
+
+async def _next_event(stream) -> bytes:
+    # salta retry e keep-alive
+    while True:
+        chunk = await asyncio.wait_for(stream.__anext__(), timeout=1)
+        if chunk.startswith(b"id:") or chunk.startswith(b"event:"):
+            return chunk
+
+
+@pytest.mark.asyncio
+async def test_fan_out_only_to_audience_with_bounded_queue():
+    bus = AssignmentEventBus(queue_size=2)
+    s1, s2 = bus.subscribe("s1"), bus.subscribe("s2")
+
+    bus.publish(_change("a1"), ["t1", "s1"])
+    assert s1.queue.qsize() == 1 and s2.queue.qsize() == 0
+
+    for i in range(3):
+        bus.publish(_change(f"a{i + 2}"), ["s1"])
+    assert s1.lagged and bus.stats()["dropped"] == 1  # coda piena: il client non blocca il fan-out
+
+    bus.unsubscribe(s1)
+    bus.unsubscribe(s2)
+    assert not bus.has_subscribers()
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_missed_events_or_resets():
+    bus = AssignmentEventBus(replay_size=3)
+    first = bus.publish(_change("a1"), ["s1"])
+    bus.publish(_change("a2"), ["s2"])
+    bus.publish(_change("a3", DELETED), ["s1"])
+
+    stream = sse_stream(bus, "s1", last_event_id=first, heartbeat_seconds=0.01)
+    replayed = await _next_event(stream)
+    assert b"event: assignment.deleted" in replayed and b'"assignmentId":"a3"' in replayed
+
+    bus.publish(_change("a4"), ["s1"])
+    assert b'"assignmentId":"a4"' in await _next_event(stream)
+    await stream.aclose()
+    assert not bus.has_subscribers()
+
+    # id uscito dallo storico: il client ricarica una volta
+    bus.publish(_change("a5"), ["s1"])
+    stale = sse_stream(bus, "s1", last_event_id=first)
+    assert b"event: reset" in await _next_event(stale)
+    await stale.aclose()
+
+
+@pytest.mark.asyncio
+async def test_in_process_source_publishes_repository_writes():
+    bus = AssignmentEventBus()
+    repo = EventingAssignmentRepository(MemoryAssignmentRepository(), bus)
+    student = bus.subscribe("s1")
+
+    await repo.create(Assignment(
+        assignmentId="a1", teacherId="t1", createdAt=NOW, title="T", description="D",
+        deadline=NOW - timedelta(minutes=1), students=["s1"], content="C",
+    ))
+    assert await repo.update_assignment_state(NOW) == ["a1"]
+    assert await repo.delete_many("t1") == ["a1"]
+
+    kinds = [student.queue.get_nowait()[1].type for _ in range(student.queue.qsize())]
+    assert kinds == [CREATED, STATUS_CHANGED, DELETED]
+
+
+def test_change_stream_documents_map_to_notifications():
+    pytest.importorskip("motor")
+    from app.services.change_stream_service import change_from_stream
+
+    doc = {"assignmentId": "a1", "teacherId": "t1", "students": ["s1"], "status": "completed"}
+    update = {"operationType": "update", "fullDocument": doc, "updateDescription": {"updatedFields": {"status": "completed"}}}
+    notice, source = change_from_stream(update)
+    assert notice.type == STATUS_CHANGED and source is doc
+
+    assert change_from_stream({"operationType": "delete", "documentKey": {"_id": 1}}) is None  # senza pre-image
+    deleted, _ = change_from_stream({"operationType": "delete", "fullDocumentBeforeChange": doc})
+    assert deleted.type == DELETED
+
+
+@pytest.mark.asyncio
+async def test_change_stream_feeds_deadlines_of_every_worker():
+    pytest.importorskip("motor")
+    from app.services.change_stream_service import ChangeStreamWatcher
+
+    db = {"assignments": None}
+    watcher = ChangeStreamWatcher(db, AssignmentEventBus(), MemoryAssignmentRepository())
+    scheduled = []
+    watcher.on_deadline = scheduled.append
+
+    doc = {"assignmentId": "a1", "teacherId": "t1", "students": ["s1"], "status": "open", "deadline": NOW}
+    await watcher.handle({"_id": {"_data": "1"}, "operationType": "insert", "fullDocument": doc})
+    moved = dict(doc, deadline=NOW + timedelta(hours=1))
+    await watcher.handle({
+        "_id": {"_data": "2"}, "operationType": "update", "fullDocument": moved,
+        "updateDescription": {"updatedFields": {"deadline": moved["deadline"]}},
+    })
+    closed = dict(doc, status="completed")
+    await watcher.handle({
+        "_id": {"_data": "3"}, "operationType": "update", "fullDocument": closed,
+        "updateDescription": {"updatedFields": {"status": "completed"}},
+    })
+    assert scheduled == [NOW, NOW + timedelta(hours=1)]
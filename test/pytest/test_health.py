@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.health_service import HealthMonitor
+
+
+class ProbeRepo:
+    def __init__(self, ping_delay: float = 0.0, fail: bool = False, overdue_age: float = 0.0):
+        self.ping_delay = ping_delay
+        self.fail = fail
+        self.overdue_age = overdue_age
+
+    async def ping(self):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        await asyncio.sleep(self.ping_delay)
+
+    async def oldest_overdue(self, now):
+        if not self.overdue_age:
+            return None
+        # naive UTC, come la restituisce Mongo
+        return (now - timedelta(seconds=self.overdue_age)).replace(tzinfo=None)
+
+
+class StatePublisher:
+    def __init__(self, ready: bool = True):
+        self.is_ready = ready
+
+
+@pytest.mark.asyncio
+async def test_ready_when_dependencies_ok():
+    monitor = HealthMonitor(ProbeRepo(), StatePublisher())
+    assert monitor.snapshot()["ready"] is False  # prima del primo check
+
+    snap = await monitor.check_once()
+    assert snap["ready"] is True and snap["status"] == "ok"
+    assert snap["checks"]["mongo"]["ok"] and "latencyMs" in snap["checks"]["mongo"]
+    assert snap["checks"]["sweeper"]["lagSeconds"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_not_ready_on_mongo_timeout_error_or_dead_publisher():
+    slow = HealthMonitor(ProbeRepo(ping_delay=0.2), StatePublisher(), timeout_seconds=0.05)
+    snap = await slow.check_once()
+    assert snap["ready"] is False and "timeout" in snap["checks"]["mongo"]["error"]
+
+    down = await HealthMonitor(ProbeRepo(fail=True), StatePublisher()).check_once()
+    assert down["status"] == "fail" and down["checks"]["mongo"]["error"] == "mongo down"
+
+    no_rabbit = await HealthMonitor(ProbeRepo(), StatePublisher(ready=False)).check_once()
+    assert no_rabbit["ready"] is False and no_rabbit["checks"]["rabbitmq"]["ok"] is False
+
+    http_only = await HealthMonitor(ProbeRepo(), None).check_once()  # worker senza publisher
+    assert http_only["ready"] is True and "skipped" in http_only["checks"]["rabbitmq"]
+
+    # avvio in background: il broker non ancora connesso non toglie il pod dal bilanciamento
+    connecting = await HealthMonitor(ProbeRepo(), StatePublisher(ready=False), require_publisher=False).check_once()
+    assert connecting["ready"] is True and connecting["status"] == "degraded"
+
+
+@pytest.mark.asyncio
+async def test_sweeper_lag_degrades_but_keeps_ready():
+    monitor = HealthMonitor(ProbeRepo(overdue_age=600), StatePublisher(), max_sweep_lag_seconds=300)
+    snap = await monitor.check_once()
+    assert snap["ready"] is True and snap["status"] == "degraded"
+    assert snap["checks"]["sweeper"]["lagSeconds"] >= 600
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_not_ready():
+    now = [100.0]
+    monitor = HealthMonitor(ProbeRepo(), StatePublisher(), interval_seconds=5, clock=lambda: now[0])
+    await monitor.check_once()
+    assert monitor.snapshot()["ready"] is True
+    now[0] += 60
+    assert monitor.snapshot()["status"] == "stale" and monitor.snapshot()["ready"] is False
+
+
+class NeverReadyPublisher:
+    """Broker mai raggiungibile: wait_ready non ritorna."""
+
+    is_ready = False
+
+    def __init__(self):
+        self.waiting = False
+
+    async def wait_ready(self):
+        self.waiting = True
+        await asyncio.Event().wait()
+
+
+def test_background_startup_serves_without_the_broker(monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    from app.core.config import settings
+    from app.main import create_app
+    from app.schemas.assignment import Assignment
+
+    for name, value in {
+        "startup_mode": "background", "storage_backend": "memory", "background_tasks": "always",
+        "sweep_interval_seconds": 0.01, "health_interval_seconds": 0.05,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    publisher = NeverReadyPublisher()
+    now = datetime.now(timezone.utc)
+
+    with TestClient(create_app(publisher=publisher)) as client:
+        repo = client.app.state.assignment_repo
+        client.portal.call(repo.create, Assignment(
+            assignmentId="as-00001", teacherId="t1", createdAt=now, title="T", description="D",
+            deadline=now - timedelta(minutes=1), students=["s1"], content="C",
+        ))
+        assert client.get("/api/v1/assignments/health/live").status_code == 200
+        for _ in range(50):
+            ready = client.get("/api/v1/assignments/health/ready")
+            if ready.json()["status"] != "starting":
+                break
+            client.portal.call(asyncio.sleep, 0.02)
+        # ready senza RabbitMQ, ma segnalato come degraded
+        assert ready.status_code == 200 and ready.json()["status"] == "degraded"
+        assert ready.json()["checks"]["rabbitmq"]["ok"] is False
+
+        # lo sweeper aspetta il broker: l'assignment scaduto resta aperto
+        client.portal.call(asyncio.sleep, 0.1)
+        assert publisher.waiting
+        assert client.portal.call(repo.find_one, "as-00001").status == "open"
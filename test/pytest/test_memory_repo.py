@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database.memory_assignment import MemoryAssignmentRepository, MemoryOutboxRepository
+from app.schemas.assignment import Assignment, AssignmentCreate
+from app.schemas.context import UserContext
+from app.schemas.events import AssignmentStatusEvent
+from app.services.assignment_service import AssignmentService, assignment_etag, parse_fields
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _assignment(i: int, teacher: str = "t1", students=("s1",), deadline_offset: int = 60) -> Assignment:
+    return Assignment(
+        assignmentId=f"as-{i:05d}", teacherId=teacher, createdAt=NOW + timedelta(seconds=i),
+        title=f"T{i}", description="D", deadline=NOW + timedelta(seconds=deadline_offset),
+        students=list(students), content="C",
+    )
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_follow_indexes():
+    repo = MemoryAssignmentRepository()
+    await repo.create_many([_assignment(i, students=("s1", f"s{i}")) for i in range(10)])
+    assert len(repo) == 10
+
+    first = await repo.find_page_for_teacher("t1", limit=4)
+    rest = await repo.find_page_for_teacher("t1", limit=10, after=(first[-1].createdAt, first[-1].assignmentId))
+    assert [v.assignmentId for v in first + rest] == [f"as-{i:05d}" for i in range(10)]
+
+    only = await repo.find_page_for_student("s3", fields=["title"])
+    assert [v.title for v in only] == ["T3"] and only[0].assignmentId is None
+    assert [a.assignmentId for a in await repo.find_for_student("s1")][:2] == ["as-00000", "as-00001"]
+
+    # naive (UTC, come da Mongo) e aware sono la stessa chiave
+    naive_after = (NOW.replace(tzinfo=None) + timedelta(seconds=8), "as-00008")
+    assert [v.assignmentId for v in await repo.find_page_for_teacher("t1", after=naive_after)] == ["as-00009"]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_ids_and_deletes_update_indexes():
+    repo = MemoryAssignmentRepository()
+    errors = await repo.create_many([_assignment(1), _assignment(1), _assignment(2, teacher="t2")])
+    assert errors[0] is None and errors[1] is not None and errors[2] is None
+
+    assert await repo.delete_many("t1", ["as-00001", "as-00002"]) == ["as-00001"]  # as-00002 è di t2
+    assert [v.assignmentId for v in await repo.find_page_for_student("s1")] == ["as-00002"]
+    assert await repo.exists("as-00001") is False
+    assert await repo.oldest_overdue(NOW + timedelta(days=1)) is not None
+
+
+@pytest.mark.asyncio
+async def test_sweep_takes_overdue_prefix_in_deadline_order():
+    repo = MemoryAssignmentRepository()
+    for i, offset in enumerate((30, -30, -10, -20)):
+        await repo.create(_assignment(i, deadline_offset=offset))
+
+    assert await repo.oldest_overdue(NOW) == NOW - timedelta(seconds=30)
+    assert await repo.update_assignment_state(NOW, limit=2) == ["as-00001", "as-00003"]
+    assert await repo.update_assignment_state(NOW) == ["as-00002"]
+    assert await repo.update_assignment_state(NOW) == []
+    assert (await repo.find_one("as-00001")).status == "completed"
+    assert await repo.upcoming_deadlines(NOW, 10) == [NOW + timedelta(seconds=30)]
+
+    # le deadline spostate vengono reindicizzate
+    await repo.shift_deadlines("t1", timedelta(seconds=-60))
+    assert await repo.update_assignment_state(NOW) == ["as-00000"]
+
+
+@pytest.mark.asyncio
+async def test_service_round_trip_and_outbox():
+    outbox = MemoryOutboxRepository()
+    repo = MemoryAssignmentRepository(outbox)
+    teacher = UserContext(user_id="t1", role="teacher")
+    student = UserContext(user_id="s1", role="student")
+
+    payload = AssignmentCreate(
+        title="T", description="D", deadline=NOW + timedelta(days=1), students=["s1", "s2"], content="C"
+    )
+    aid = await AssignmentService.create_assignment(payload, teacher, repo)
+    assert len(outbox) == 1
+
+    items, cursor = await AssignmentService.list_assignments_page(student, repo, limit=1, cursor=None, fields=None)
+    assert [v.assignmentId for v in items] == [aid] and cursor is None  # nessuna pagina successiva
+    assert (await AssignmentService.get_assignment(aid, student, repo)).students == ["s1"]
+
+    claimed = await outbox.claim_batch(datetime.now(timezone.utc), 10, claim_seconds=30)
+    assert [e.assignmentId for _, e in claimed] == [aid]
+    assert await outbox.claim_batch(datetime.now(timezone.utc), 10, claim_seconds=30) == []
+    await outbox.ack([mid for mid, _ in claimed])
+    assert len(outbox) == 0
+
+    outbox.add([AssignmentStatusEvent(assignmentId=aid, status="completed", messageId="m1")])
+    await outbox.retry(["m1"], datetime.now(timezone.utc), base_delay_seconds=60)
+    assert await outbox.claim_batch(datetime.now(timezone.utc), 10, claim_seconds=30) == []
+
+
+@pytest.mark.asyncio
+async def test_etags_follow_versions_and_page_stamps():
+    repo = MemoryAssignmentRepository()
+    teacher = UserContext(user_id="t1", role="teacher")
+    student = UserContext(user_id="s1", role="student")
+    for i in range(3):
+        await repo.create(_assignment(i, deadline_offset=60 if i else -60))
+
+    items, cursor, etag = await AssignmentService.list_assignments_page_tagged(student, repo, limit=2)
+    # l'impronta sull'indice coincide con quella calcolata sui documenti restituiti
+    assert cursor is not None and etag == await AssignmentService.current_page_etag(student, repo, limit=2)
+    assert etag != await AssignmentService.current_page_etag(teacher, repo, limit=2)  # roster diverso
+
+    detail = await AssignmentService.current_assignment_etag("as-00000", student, repo)
+    assert detail == assignment_etag("as-00000", student, 1)
+    assert await AssignmentService.current_assignment_etag("as-00000", UserContext(user_id="s9", role="student"), repo) is None
+
+    await repo.update_assignment_state(NOW)  # chiude as-00000: version 2, updatedAt = NOW
+    assert (await repo.find_one("as-00000")).version == 2
+    assert await AssignmentService.current_assignment_etag("as-00000", student, repo) != detail
+    assert await AssignmentService.current_page_etag(student, repo, limit=2) != etag
+
+    # la proiezione non espone updatedAt se non richiesto, ma l'ETag resta lo stesso
+    projected, _, projected_etag = await AssignmentService.list_assignments_page_tagged(
+        student, repo, limit=2, fields=parse_fields("title")
+    )
+    assert "updatedAt" not in projected[0].model_dump(exclude_unset=True)
+    assert projected_etag == await AssignmentService.current_page_etag(student, repo, limit=2)
+
+
+@pytest.mark.asyncio
+async def test_page_etag_changes_when_a_document_leaves_the_window():
+    repo = MemoryAssignmentRepository()
+    teacher = UserContext(user_id="t1", role="teacher")
+    for i in range(4):
+        await repo.create(_assignment(i, deadline_offset=30 if i == 0 else 3600))
+    await repo.update_assignment_state(NOW + timedelta(seconds=60))  # as-00000: version 2, updatedAt più recente
+
+    # finestra [as-00000, as-00001] -> [as-00000, as-00002]: stesso numero, stesse version, stesso updatedAt
+    etag = await AssignmentService.current_page_etag(teacher, repo, limit=1)
+    assert await repo.delete("as-00001") is True
+    assert await AssignmentService.current_page_etag(teacher, repo, limit=1) != etag
+    _, _, listed = await AssignmentService.list_assignments_page_tagged(teacher, repo, limit=1)
+    assert listed == await AssignmentService.current_page_etag(teacher, repo, limit=1)
+
+
+@pytest.mark.asyncio
+async def test_teacher_stats_follow_writes_and_rebuild():
+    repo = MemoryAssignmentRepository()
+    teacher = UserContext(user_id="t1", role="teacher")
+    await repo.create_many([_assignment(i, deadline_offset=-60 if i < 2 else 60 * i) for i in range(5)])
+    await repo.create(_assignment(9, teacher="t2"))
+
+    stats = await repo.stats_for_teacher("t1", NOW, upcoming=2)
+    assert (stats.total, stats.open, stats.completed, stats.overdue) == (5, 5, 0, 2)
+    assert (await AssignmentService.teacher_stats(teacher, repo)).total == 5
+    assert [d.assignmentId for d in stats.upcomingDeadlines] == ["as-00002", "as-00003"]
+
+    await repo.update_assignment_state(NOW)  # chiude i due scaduti
+    await repo.delete("as-00002")
+    await repo.shift_deadlines("t1", timedelta(hours=1), ["as-00003"])
+    stats = await repo.stats_for_teacher("t1", NOW, upcoming=5)
+    assert (stats.total, stats.open, stats.completed, stats.overdue) == (4, 2, 2, 0)
+    assert [d.assignmentId for d in stats.upcomingDeadlines] == ["as-00004", "as-00003"]
+
+    before = stats.model_dump()
+    assert await repo.rebuild_stats() == 2
+    assert (await repo.stats_for_teacher("t1", NOW, upcoming=5)).model_dump() == before
+
+    with pytest.raises(PermissionError):
+        await AssignmentService.teacher_stats(UserContext(user_id="s1", role="student"), repo)
@@ -0,0 +1,71 @@
+import pytest
+
+from app.core.metrics import Histogram, MetricsMiddleware, Registry
+from app.database.instrumented_assignment import InstrumentedAssignmentRepository
+
+
+def test_render_prometheus_text_format():
+    registry = Registry()
+    hist = registry.histogram("req_seconds", "Latenza.", ("route",), buckets=(0.1, 1.0))
+    counter = registry.counter("swept_total", "Chiusi.")
+    registry.gauge_callback("cache", "Statistiche.", "stat", lambda: {"hits": 3, "misses": 1})
+
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(5.0, "/a")
+    counter.inc(2)
+
+    text = registry.render()
+    assert '# TYPE req_seconds histogram' in text
+    assert 'req_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'req_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'req_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'req_seconds_count{route="/a"} 3' in text
+    assert "swept_total 2" in text
+    assert 'cache{stat="hits"} 3' in text
+    assert text.endswith("\n")
+
+
+class _Route:
+    path = "/api/v1/assignments/{assignment_id}"
+
+
+async def _app(scope, receive, send):
+    scope["route"] = _Route()  # come fa il router di Starlette dopo il match
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+@pytest.mark.asyncio
+async def test_middleware_labels_by_route_template_and_skips_other_paths():
+    hist = Histogram("h", "h", ("method", "route", "status"))
+    app = MetricsMiddleware(_app, histogram=hist)
+
+    async def send(message):
+        pass
+
+    for path in ("/api/v1/assignments/as-1", "/api/v1/assignments/as-2", "/docs"):
+        await app({"type": "http", "path": path, "method": "GET"}, None, send)
+
+    assert hist.count("GET", "/api/v1/assignments/{assignment_id}", "404") == 2
+    assert len(hist._series) == 1
+
+
+class _Repo:
+    async def find_one(self, assignment_id):
+        if assignment_id == "boom":
+            raise RuntimeError("db down")
+        return None
+
+
+@pytest.mark.asyncio
+async def test_instrumented_repo_records_outcome():
+    hist = Histogram("repo", "repo", ("method", "outcome"))
+    repo = InstrumentedAssignmentRepository(_Repo(), histogram=hist)
+
+    assert await repo.find_one("as-1") is None
+    with pytest.raises(RuntimeError):
+        await repo.find_one("boom")
+
+    assert hist.count("find_one", "ok") == 1
+    assert hist.count("find_one", "error") == 1
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+import mongomock.gridfs  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+from app.database import migrate_content  # noqa: E402
+from app.database.content_repo import content_ref  # noqa: E402
+from app.database.mongo_assignment import MongoAssignmentRepository  # noqa: E402
+from app.database.mongo_content import MongoContentStore  # noqa: E402
+from app.schemas.assignment import Assignment  # noqa: E402
+from app.schemas.context import UserContext  # noqa: E402
+
+mongomock.gridfs.enable_gridfs_integration()
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+DATA = b"contenuto " * 40_000  # più chunk
+REF = content_ref(DATA)
+
+
+def _assignment(i: int, content: str) -> Assignment:
+    return Assignment(
+        assignmentId=f"as-{i:05d}", teacherId="t1", createdAt=NOW + timedelta(seconds=i),
+        title=f"T{i}", description="D", deadline=NOW + timedelta(days=1), students=["s1"], content=content,
+    )
+
+
+async def _read(blob) -> bytes:
+    return b"".join([chunk async for chunk in blob.iter_range(0, blob.length - 1)])
+
+
+async def _age(store: MongoContentStore, ref: str, age: timedelta) -> None:
+    """Riporta a `age` fa il ref e il suo file."""
+    then = datetime.now(timezone.utc) - age
+    published = await store.refs.find_one_and_update({"_id": ref}, {"$set": {"uploadDate": then}})
+    await store.files.update_one({"_id": published["fileId"]}, {"$set": {"uploadDate": then}})
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["unit_test"]
+
+
+@pytest_asyncio.fixture
+async def store(db):
+    return MongoContentStore(db)
+
+
+@pytest.mark.asyncio
+async def test_put_deduplicates_and_refreshes_the_upload_date(store):
+    await store.put(REF, DATA)
+    chunks = await store.chunks.count_documents({})
+    await _age(store, REF, timedelta(days=1))
+
+    await store.put(REF, DATA)
+    assert await store.files.count_documents({}) == 1 and await store.chunks.count_documents({}) == chunks
+    uploaded = (await store.refs.find_one({"_id": REF}))["uploadDate"].replace(tzinfo=timezone.utc)
+    assert uploaded > datetime.now(timezone.utc) - timedelta(minutes=1)
+    assert await _read(await store.open(REF)) == DATA
+    assert await store.open("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_puts_never_share_chunks(store, monkeypatch):
+    # A non trova il ref e carica; nel frattempo B carica e pubblica tutto; poi A perde l'insert
+    upload = store.bucket.upload_from_stream_with_id
+    b_done = asyncio.Event()
+    uploads = []
+
+    async def interleaved(file_id, filename, source):
+        uploads.append(file_id)
+        if len(uploads) == 1:
+            await upload(file_id, filename, source)
+            await b_done.wait()
+        else:
+            await upload(file_id, filename, source)
+
+    async def put_b():
+        await asyncio.sleep(0)
+        await store.put(REF, DATA)
+        b_done.set()
+
+    monkeypatch.setattr(store.bucket, "upload_from_stream_with_id", interleaved)
+    await asyncio.gather(store.put(REF, DATA), put_b())
+
+    loser, winner = uploads
+    assert (await store.refs.find_one({"_id": REF}))["fileId"] == winner
+    assert await store.files.distinct("_id") == [winner]
+    assert await store.chunks.count_documents({"files_id": loser}) == 0
+    assert await store.chunks.count_documents({"files_id": winner}) > 1
+    assert await _read(await store.open(REF)) == DATA
+
+
+@pytest.mark.asyncio
+async def test_legacy_files_keyed_by_hash_stay_readable(store):
+    await store.bucket.upload_from_stream_with_id(REF, REF, DATA)  # layout precedente ai refs
+    assert await _read(await store.open(REF)) == DATA
+    await store.put(REF, DATA)  # da qui il contenuto passa dal ref
+    assert await _read(await store.open(REF)) == DATA and await store.files.count_documents({}) == 2
+
+
+@pytest.mark.asyncio
+async def test_collect_garbage_spares_referenced_young_and_reuploaded_contents(store, db, monkeypatch):
+    assignments = db["assignments"]
+    refs = {name: content_ref(name.encode() * 100_000) for name in ("orphan", "referenced", "young", "reused")}
+    for name, ref in refs.items():
+        await store.put(ref, name.encode() * 100_000)
+        if name != "young":
+            await _age(store, ref, timedelta(hours=2))
+    await assignments.insert_one({"assignmentId": "as-00001", "contentRef": refs["referenced"]})
+    # file senza ref: upload interrotto prima dell'insert, e un vecchio file per hash non più usato
+    interrupted = ObjectId()
+    await store.bucket.upload_from_stream_with_id(interrupted, "x", b"interrotto")
+    await store.bucket.upload_from_stream_with_id("legacy", "legacy", b"legacy")
+    await store.files.update_many({"_id": {"$in": [interrupted, "legacy"]}}, {"$set": {"uploadDate": NOW}})
+
+    # put concorrente: appena la GC toglie il ref "reused", un nuovo assignment lo ricarica
+    delete_one = store.refs.delete_one
+
+    async def racing_delete(filt, *args, **kwargs):
+        res = await delete_one(filt, *args, **kwargs)
+        if filt["_id"] == refs["reused"]:
+            await store.put(refs["reused"], b"reused" * 100_000)
+        return res
+
+    monkeypatch.setattr(store.refs, "delete_one", racing_delete)
+    assert await store.collect_garbage(assignments, grace=timedelta(hours=1)) == 4
+    assert set(await store.refs.distinct("_id")) == {refs["referenced"], refs["young"], refs["reused"]}
+    assert await store.files.count_documents({}) == 3
+    assert await store.open(refs["orphan"]) is None
+    # il file ricaricato dal put non è stato toccato
+    assert await _read(await store.open(refs["reused"])) == b"reused" * 100_000
+
+
+@pytest.mark.asyncio
+async def test_offload_migration_and_missing_content(db, monkeypatch):
+    repo = MongoAssignmentRepository(db)
+    repo._transactions = False
+    big, small = "è" * 40_000, "breve"
+    await repo.create_many([_assignment(0, big), _assignment(1, small), _assignment(2, big)])
+
+    # mongomock non implementa $strLenCP: la soglia resta verificata in byte da offload_contents
+    monkeypatch.setattr(migrate_content, "_candidates", lambda threshold: {"content": {"$type": "string"}})
+    assert await migrate_content.offload_contents(db, threshold=1024, batch_size=2) == 2
+    assert await migrate_content.offload_contents(db, threshold=1024, batch_size=2) == 0  # idempotente
+    doc = await db["assignments"].find_one({"assignmentId": "as-00002"})
+    assert "content" not in doc and doc["contentRef"] == content_ref(big.encode()) and doc["version"] == 2
+    assert await db["assignment_content.files"].count_documents({}) == 1  # stesso contenuto, un file
+    assert (await db["assignments"].find_one({"assignmentId": "as-00001"}))["content"] == small
+
+    # contentRef senza file: il service lo segnala, la route risponde 503 invece di un 404
+    from app.services.assignment_service import AssignmentService
+
+    await db["assignment_content.files"].delete_many({})  # ref senza file
+    teacher = UserContext(user_id="t1", role="teacher")
+    with pytest.raises(LookupError):
+        await AssignmentService.open_content("as-00000", teacher, repo)
+    pytest.importorskip("fastapi")
+    from fastapi import HTTPException
+
+    from app.routers.v1.assignment import get_assignment_content_endpoint
+
+    with pytest.raises(HTTPException) as exc:
+        await get_assignment_content_endpoint("as-00000", teacher, repo)
+    assert exc.value.status_code == 503
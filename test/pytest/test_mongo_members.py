@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.database import mongo_assignment  # noqa: E402
+from app.database.eventing_assignment import EventingAssignmentRepository  # noqa: E402
+from app.database.migrate_members import migrate_to_embedded, migrate_to_members  # noqa: E402
+from app.database.mongo_assignment import MongoAssignmentRepository  # noqa: E402
+from app.database.mongo_members import MEMBERS_COLLECTION, MongoMemberAssignmentRepository  # noqa: E402
+from app.schemas.assignment import Assignment  # noqa: E402
+from app.schemas.context import UserContext  # noqa: E402
+from app.schemas.events import CREATED, DELETED  # noqa: E402
+from app.services.assignment_service import AssignmentService, status_event  # noqa: E402
+from app.services.change_stream_service import ChangeStreamWatcher  # noqa: E402
+from app.services.event_bus import AssignmentEventBus  # noqa: E402
+from test_mongo_repo import transactional  # noqa: E402
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _assignment(i: int, teacher: str = "t1", students=("s1",)) -> Assignment:
+    return Assignment(
+        assignmentId=f"as-{i:05d}", teacherId=teacher, createdAt=NOW + timedelta(seconds=i),
+        title=f"T{i}", description="D", deadline=NOW + timedelta(days=1),
+        students=list(students), content="C",
+    )
+
+
+def _ids(items) -> list:
+    return [a.assignmentId for a in items]
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["unit_test"]
+
+
+@pytest_asyncio.fixture
+async def repo(db):
+    repo = MongoMemberAssignmentRepository(db)
+    await repo.ensure_indexes()
+    repo._transactions = False  # mongod standalone
+    # s1 in tutti, s2 nei pari, s3 nel solo as-00004 (con un duplicato nel roster)
+    await repo.create_many([_assignment(i, students=("s1", "s2") if i % 2 == 0 else ("s1",)) for i in range(4)])
+    await repo.create(_assignment(4, students=("s3", "s1", "s3")))
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_documents_keep_only_the_student_count(repo, db):
+    doc = await db["assignments"].find_one({"assignmentId": "as-00004"})
+    assert "students" not in doc and doc["studentCount"] == 2
+    assert await db[MEMBERS_COLLECTION].count_documents({}) == 4 + 2 + 2
+
+
+@pytest.mark.asyncio
+async def test_student_pages_come_from_the_members_index(repo):
+    first = await repo.find_page_for_student("s1", limit=2)
+    rest = await repo.find_page_for_student("s1", after=(first[-1].createdAt, first[-1].assignmentId))
+    assert _ids(first + rest) == [f"as-{i:05d}" for i in range(5)]
+    assert _ids(await repo.find_page_for_student("s2")) == ["as-00000", "as-00002"]
+    assert await repo.find_page_for_student("s9") == []
+
+    # agli studenti il roster contiene solo sé stessi, anche per le altre letture
+    assert {tuple(v.students) for v in first + rest} == {("s1",)}
+    assert [a.students for a in await repo.find_for_student("s2")] == [["s2"], ["s2"]]
+    assert (await repo.find_one_for_student("as-00004", "s3")).students == ["s3"]
+    assert await repo.find_one_for_student("as-00004", "s2") is None
+    assert [d["students"] async for d in repo.iter_for_student("s3", batch_size=1)] == [["s3"]]
+
+    # proiezione senza roster né chiave di join
+    projected = await repo.find_page_for_student("s2", fields=["title"])
+    assert [v.title for v in projected] == ["T0", "T2"] and projected[0].assignmentId is None
+
+
+@pytest.mark.asyncio
+async def test_teacher_reads_rebuild_full_rosters(repo):
+    await repo.create(_assignment(9, teacher="t2", students=("s1",)))
+
+    page = await repo.find_page_for_teacher("t1", limit=3)
+    assert _ids(page) == ["as-00000", "as-00001", "as-00002"]
+    assert [v.students for v in page] == [["s1", "s2"], ["s1"], ["s1", "s2"]]
+    assert (await repo.find_one("as-00004")).students == ["s1", "s3"]
+    assert await repo.find_one_for_teacher("as-00009", "t1") is None
+    assert _ids(await repo.find_for_teacher("t2")) == ["as-00009"]
+
+    exported = [d async for d in repo.iter_for_teacher("t1", batch_size=2, fields=["students"])]
+    assert exported[4] == {"students": ["s1", "s3"]} and len(exported) == 5
+    # senza roster richiesto nessun join con i membri
+    assert [v.title for v in await repo.find_page_for_teacher("t1", fields=["title"])][:2] == ["T0", "T1"]
+
+
+@pytest.mark.asyncio
+async def test_members_are_written_in_the_assignment_transaction(repo, db, monkeypatch):
+    session = transactional(repo, db, MEMBERS_COLLECTION)
+    inc_stats = repo._inc_stats
+    seen = []
+
+    # i contatori sono l'ultima scrittura del callback: i membri devono già esserci, prima del commit
+    async def stats_after_members(delta, session=None):
+        seen.append(await db[MEMBERS_COLLECTION].count_documents({"studentId": {"$in": ["s7", "s8"]}}))
+        if len(seen) <= 2:
+            raise RuntimeError("contatori non disponibili")
+        await inc_stats(delta, session=session)
+
+    monkeypatch.setattr(repo, "_inc_stats", stats_after_members)
+    with pytest.raises(RuntimeError):
+        await repo.create(_assignment(7, students=("s7",)))
+    with pytest.raises(RuntimeError):
+        await repo.create_many([_assignment(8, students=("s8",))])
+    assert seen == [1, 1]
+    # la transazione annullata porta via assignment e membri
+    assert await db["assignments"].count_documents({"assignmentId": {"$in": ["as-00007", "as-00008"]}}) == 0
+    assert await db[MEMBERS_COLLECTION].count_documents({"studentId": {"$in": ["s7", "s8"]}}) == 0
+
+    # membri rimasti da una delete interrotta: sostituiti, non sommati al nuovo roster
+    await db[MEMBERS_COLLECTION].insert_one({"assignmentId": "as-00007", "studentId": "old", "createdAt": NOW})
+    await repo.create(_assignment(7, students=("s7",)))
+    assert (await repo.find_one("as-00007")).students == ["s7"]
+    assert seen == [1, 1, 1] and (session.aborts, session.commits) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_change_stream_audience_reads_the_roster(repo, db):
+    bus = AssignmentEventBus()
+    watcher = ChangeStreamWatcher(db, bus, repo)
+    s1, s3 = bus.subscribe("s1"), bus.subscribe("s3")
+
+    doc = await db["assignments"].find_one({"assignmentId": "as-00004"}, {"_id": 0})
+    await watcher.handle({"_id": {"_data": "1"}, "operationType": "insert", "fullDocument": doc})
+    for sub in (s1, s3):
+        assert sub.queue.get_nowait()[1].type == CREATED
+
+
+@pytest.mark.asyncio
+async def test_event_audiences_read_only_the_needed_fields(repo, monkeypatch):
+    monkeypatch.setattr(mongo_assignment, "BULK_CHUNK_SIZE", 2)
+    find = repo.col.find
+    queries = []
+
+    def recording_find(filt, projection=None, *args, **kwargs):
+        queries.append((filt, projection))
+        return find(filt, projection, *args, **kwargs)
+
+    monkeypatch.setattr(repo.col, "find", recording_find)
+    views = await repo.find_audiences(["as-00004", "as-00000", "missing", "as-00004", "as-00001"])
+    assert sorted((v.assignmentId, tuple(v.students)) for v in views) == [
+        ("as-00000", ("s1", "s2")), ("as-00001", ("s1",)), ("as-00004", ("s1", "s3")),
+    ]
+    assert all(v.teacherId == "t1" and v.status == "open" and v.content is None for v in views)
+    assert [len(f["assignmentId"]["$in"]) for f, _ in queries] == [2, 2]
+    assert queries[0][1] == {"assignmentId": 1, "teacherId": 1, "students": 1, "status": 1, "_id": 0}
+
+    # delete senza ID con client SSE collegati: pubblico dalla proiezione, niente documenti completi
+    bus = AssignmentEventBus()
+    eventing = EventingAssignmentRepository(repo, bus)
+    s3 = bus.subscribe("s3")
+    monkeypatch.setattr(repo, "find_for_teacher", None)
+    monkeypatch.setattr(repo, "find_one", None)
+    assert len(await eventing.delete_many("t1")) == 5
+    assert s3.queue.get_nowait()[1].type == DELETED and s3.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_deletes_remove_members(repo, db):
+    assert await repo.delete("as-00004") is True
+    assert await db[MEMBERS_COLLECTION].count_documents({"assignmentId": "as-00004"}) == 0
+    assert _ids(await repo.find_page_for_student("s3")) == []
+
+    deleted = await repo.delete_many("t1", ["as-00000", "as-00001"], lambda a: status_event(a, "deleted"))
+    assert deleted == ["as-00000", "as-00001"]
+    assert sorted(await db[MEMBERS_COLLECTION].distinct("assignmentId")) == ["as-00002", "as-00003"]
+    assert _ids(await repo.find_page_for_student("s2")) == ["as-00002"]
+    assert await db["assignment_outbox"].count_documents({}) == 2
+
+
+@pytest.mark.asyncio
+async def test_student_page_stamps_match_the_page(repo):
+    student = UserContext(user_id="s2", role="student")
+    items, cursor, etag = await AssignmentService.list_assignments_page_tagged(student, repo, limit=1)
+    assert _ids(items) == ["as-00000"] and cursor is not None
+    assert await AssignmentService.current_page_etag(student, repo, limit=1) == etag
+    assert await repo.page_stamp_for_student("s9") == (0, 0, None, [])
+    assert await repo.version_for_student("as-00000", "s2") == 1
+    assert await repo.version_for_student("as-00001", "s2") is None
+
+    # una delete nella finestra cambia l'ETag anche se somme e updatedAt restano uguali
+    await repo.delete("as-00000")
+    assert await AssignmentService.current_page_etag(student, repo, limit=1) != etag
+
+
+@pytest.mark.asyncio
+async def test_migration_round_trip(db):
+    embedded = MongoAssignmentRepository(db)
+    embedded._transactions = False
+    await embedded.create_many([_assignment(i, students=("s1", f"s{i + 2}")) for i in range(3)])
+
+    assert await migrate_to_members(db, batch_size=2) == 3
+    assert await migrate_to_members(db, batch_size=2) == 0  # idempotente
+    members = MongoMemberAssignmentRepository(db)
+    assert await db["assignments"].count_documents({"students": {"$exists": True}}) == 0
+    assert _ids(await members.find_page_for_student("s3")) == ["as-00001"]
+    assert (await members.find_one("as-00002")).students == ["s1", "s4"]
+
+    assert await migrate_to_embedded(db, batch_size=2) == 3
+    assert await migrate_to_embedded(db, batch_size=2) == 0
+    assert await db[MEMBERS_COLLECTION].count_documents({}) == 0
+    assert await db["assignments"].count_documents({"studentCount": {"$exists": True}}) == 0
+    assert (await embedded.find_one("as-00002")).students == ["s1", "s4"]
+    assert _ids(await embedded.find_page_for_student("s3")) == ["as-00001"]
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.database.mongo_assignment import MongoAssignmentRepository  # noqa: E402
+from app.database.mongo_indexes import IndexSet  # noqa: E402
+from app.schemas.assignment import Assignment  # noqa: E402
+from app.services.assignment_service import status_event  # noqa: E402
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeTransaction:
+    """
+    Sessione per mongomock, che non gestisce le sessioni: with_transaction esegue il callback e,
+    se fallisce, ripristina le collection com'erano (abort). È falsy perché mongomock
+    rifiuta qualsiasi sessione "vera", ma il repository la vede comunque come sessione (non None).
+    """
+
+    def __init__(self, db, collections):
+        self.db = db
+        self.collections = collections
+        self.commits = 0
+        self.aborts = 0
+
+    def __bool__(self):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def with_transaction(self, callback):
+        snapshot = {name: await self.db[name].find().to_list(length=None) for name in self.collections}
+        try:
+            result = await callback(self)
+        except Exception:
+            self.aborts += 1
+            for name, docs in snapshot.items():
+                await self.db[name].delete_many({})
+                if docs:
+                    await self.db[name].insert_many(docs)
+            raise
+        self.commits += 1
+        return result
+
+
+def _assignment(i: int, teacher: str = "t1", students=("s1",), deadline_offset: int = 60) -> Assignment:
+    return Assignment(
+        assignmentId=f"as-{i:05d}", teacherId=teacher, createdAt=NOW + timedelta(seconds=i),
+        title=f"T{i}", description="D", deadline=NOW + timedelta(seconds=deadline_offset),
+        students=list(students), content="C",
+    )
+
+
+def _events(assignments):
+    return [status_event(a.assignmentId, "open", teacher_id=a.teacherId) for a in assignments]
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["unit_test"]
+
+
+@pytest_asyncio.fixture
+async def repo(db):
+    repo = MongoAssignmentRepository(db)
+    await repo.ensure_indexes()
+    repo._transactions = False  # mongod standalone
+    return repo
+
+
+def transactional(repo, db, *collections: str) -> FakeTransaction:
+    session = FakeTransaction(db, ["assignments", "assignment_outbox", "assignment_stats", *collections])
+
+    async def start_session():
+        return session
+
+    repo.client = type("Client", (), {"start_session": staticmethod(start_session)})()
+    repo._transactions = None
+    return session
+
+
+async def _outbox_ids(db):
+    return sorted([d["event"]["assignmentId"] async for d in db["assignment_outbox"].find()])
+
+
+@pytest.mark.asyncio
+async def test_create_many_reports_duplicates_without_transactions(repo, db):
+    await repo.create(_assignment(1))
+    batch = [_assignment(0), _assignment(1), _assignment(2)]
+
+    errors = await repo.create_many(batch, events=_events(batch))
+    assert errors[0] is None and errors[2] is None and "E11000" in errors[1]
+    assert await _outbox_ids(db) == ["as-00000", "as-00002"]
+    assert (await db["assignment_stats"].find_one({"_id": "t1"}))["open"] == 3
+
+
+@pytest.mark.asyncio
+async def test_create_many_retries_the_transaction_without_rejected_documents(repo, db):
+    await repo.create(_assignment(1))
+    session = transactional(repo, db)
+    batch = [_assignment(0), _assignment(1), _assignment(2), _assignment(1)]
+
+    errors = await repo.create_many(batch, events=_events(batch))
+    assert [e is None for e in errors] == [True, False, True, False]
+    assert (session.aborts, session.commits) == (1, 1)
+    # assignment, eventi e contatori solo per gli inseriti, una volta sola
+    assert await db["assignments"].count_documents({}) == 3
+    assert await _outbox_ids(db) == ["as-00000", "as-00002"]
+    assert (await db["assignment_stats"].find_one({"_id": "t1"}))["open"] == 3
+
+
+@pytest.mark.asyncio
+async def test_deletes_enqueue_their_events_in_the_same_transaction(repo, db, monkeypatch):
+    await repo.create_many([_assignment(i) for i in range(3)])
+    await repo.create(_assignment(9, teacher="t2"))
+    session = transactional(repo, db)
+
+    def deleted(a):
+        return status_event(a, "deleted", teacher_id="t1")
+
+    # l'outbox fallisce: il blocco cancellato torna com'era
+    async def broken(events, session=None):
+        raise RuntimeError("outbox non disponibile")
+
+    monkeypatch.setattr(repo, "_enqueue", broken)
+    with pytest.raises(RuntimeError):
+        await repo.delete_many("t1", ["as-00000", "as-00009"], deleted)
+    assert await db["assignments"].count_documents({}) == 4
+    monkeypatch.undo()
+
+    assert await repo.delete_many("t1", ["as-00000", "as-00009"], deleted) == ["as-00000"]
+    assert await repo.delete("as-00001", deleted) is True
+    assert await repo.delete("as-00001", deleted) is False
+    assert await _outbox_ids(db) == ["as-00000", "as-00001"]
+    assert (await db["assignment_stats"].find_one({"_id": "t1"}))["open"] == 1
+    assert (session.aborts, session.commits) == (1, 3)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_stats_keeps_counters_touched_during_the_rebuild(repo, db, monkeypatch):
+    await repo.create_many([_assignment(i) for i in range(2)])
+    old = NOW - timedelta(days=1)
+    await repo.stats.insert_many([
+        {"_id": "t2", "open": 4, "completed": 0, "reconciledAt": old},  # nessun assignment: va rimosso
+        {"_id": "t3", "open": 0, "completed": 0, "reconciledAt": old},  # riceve un assignment a metà ricostruzione
+    ])
+
+    # mongomock non implementa $merge: stesso $group, poi replace dei risultati come farebbe $merge,
+    # con una create di t3 dopo lo snapshot del $group
+    aggregate = repo.col.aggregate
+
+    class Rebuild:
+        def __init__(self, pipeline):
+            self.pipeline = pipeline
+
+        async def to_list(self, length=None):
+            rows = await aggregate(self.pipeline[:-1]).to_list(length=None)
+            await repo.create(_assignment(5, teacher="t3"))
+            for row in rows:
+                await repo.stats.replace_one({"_id": row["_id"]}, row, upsert=True)
+            return []
+
+    monkeypatch.setattr(repo.col, "aggregate", Rebuild)
+    assert await repo.rebuild_stats() == 1
+    stats = {d["_id"]: d async for d in repo.stats.find()}
+    assert sorted(stats) == ["t1", "t3"]
+    assert stats["t1"]["open"] == 2 and stats["t3"]["open"] == 1 and "staleSince" not in stats["t3"]
+
+
+@pytest.mark.asyncio
+async def test_index_set_creates_only_missing_indexes(db, monkeypatch):
+    col = db["indexed"]
+    assert (await IndexSet.load(col)).names == set()  # collection non ancora creata
+    await col.create_index([("teacherId", 1), ("createdAt", -1)], name="custom", unique=True)
+
+    indexes = await IndexSet.load(col)
+    created = []
+    create_index = col.create_index
+
+    async def counting(keys, **kwargs):
+        created.append(keys)
+        return await create_index(keys, **kwargs)
+
+    monkeypatch.setattr(col, "create_index", counting)
+    # stesse chiavi con altre opzioni (o altro nome): già presente, nessun createIndex che fallirebbe
+    assert indexes.has([("teacherId", 1), ("createdAt", -1)])
+    await indexes.ensure([("teacherId", 1), ("createdAt", -1)], name="other", unique=False)
+    await indexes.ensure("_id")
+    assert created == []
+
+    await indexes.ensure("status")
+    await indexes.ensure([("status", 1)])
+    assert created == ["status"] and "status_1" in indexes.names and indexes.has("status")
+    assert not indexes.has([("createdAt", -1), ("teacherId", 1)])  # l'ordine delle chiavi conta
+    assert "status_1" in (await IndexSet.load(col)).names
+
+
+def test_index_set_normalises_double_directions():
+    indexes = IndexSet(None, {"a_1_b_-1": {"key": [("a", 1.0), ("b", -1.0)]}, "t_text": {"key": [("t", "text")]}})
+    assert indexes.has([("a", 1), ("b", -1)]) and indexes.has([("t", "text")])
+    assert not indexes.has([("a", 1), ("b", 1)])
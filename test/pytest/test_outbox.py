@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.schemas.events import AssignmentStatusEvent
+from app.services.outbox_service import OutboxRelay
+
+
+class MemoryOutbox:
+    def __init__(self, events):
+        self.pending = {e.messageId: (e, datetime.min.replace(tzinfo=timezone.utc), 0) for e in events}
+
+    async def claim_batch(self, now, limit, claim_seconds):
+        ready = [(k, v) for k, v in self.pending.items() if v[1] <= now][:limit]
+        for k, (event, _, attempts) in ready:
+            self.pending[k] = (event, now + timedelta(seconds=claim_seconds), attempts)
+        return [(k, v[0]) for k, v in ready]
+
+    async def ack(self, ids):
+        for k in ids:
+            del self.pending[k]
+
+    async def retry(self, ids, now, base_delay_seconds):
+        for k in ids:
+            event, _, attempts = self.pending[k]
+            self.pending[k] = (event, now + timedelta(seconds=base_delay_seconds * 2 ** attempts), attempts + 1)
+
+
+class FlakyPublisher:
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.published = []
+
+    async def publish_many(self, events, window=256):
+        results = []
+        for e in events:
+            if e.messageId in self.fail_once:
+                self.fail_once.discard(e.messageId)
+                results.append(RuntimeError("broker giù"))
+            else:
+                self.published.append(e.messageId)
+                results.append(None)
+        return results
+
+
+def _events(n):
+    return [AssignmentStatusEvent(assignmentId=f"a{i}", status="open", messageId=f"a{i}:open") for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_relay_acks_published_and_retries_failures():
+    outbox = MemoryOutbox(_events(5))
+    publisher = FlakyPublisher(fail_once={"a2:open"})
+    relay = OutboxRelay(outbox, publisher, batch_size=10, retry_base_seconds=0)
+
+    assert await relay.relay_once() == 5
+    assert set(outbox.pending) == {"a2:open"}
+    assert outbox.pending["a2:open"][2] == 1  # un tentativo registrato
+
+    assert await relay.relay_once() == 1
+    assert outbox.pending == {}
+    assert sorted(publisher.published) == sorted(f"a{i}:open" for i in range(5))
+
+
+@pytest.mark.asyncio
+async def test_relay_drains_backlog_in_batches_and_wakes_on_notify():
+    outbox = MemoryOutbox(_events(25))
+    publisher = FlakyPublisher()
+    relay = OutboxRelay(outbox, publisher, batch_size=10, poll_seconds=60)
+    task = asyncio.create_task(relay.run())
+    try:
+        await asyncio.sleep(0.05)
+        assert outbox.pending == {}
+
+        extra = AssignmentStatusEvent(assignmentId="late", status="open", messageId="late:open")
+        outbox.pending[extra.messageId] = (extra, datetime.now(timezone.utc), 0)
+        relay.notify()
+        await asyncio.sleep(0.05)
+        assert "late:open" in publisher.published
+    finally:
+        relay.stop()
+        await asyncio.wait_for(task, timeout=1)
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aio_pika")
+
+from app.schemas.events import AssignmentStatusEvent  # noqa: E402
+from app.services.publisher_service import AssignmentPublisher  # noqa: E402
+
+
+class StandInExchange:
+    """Exchange finto: ogni publish attende una "conferma" dopo `rtt` secondi."""
+
+    def __init__(self, rtt=0.001, fail=()):
+        self.rtt = rtt
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.published = []
+
+    async def publish(self, message, routing_key, mandatory=True):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.rtt)
+            if message.message_id in self.fail:
+                raise RuntimeError("nack")
+            self.published.append(message.message_id)
+        finally:
+            self.in_flight -= 1
+
+
+def _publisher(exchange) -> AssignmentPublisher:
+    publisher = AssignmentPublisher(rabbitmq_url="amqp://stand-in", heartbeat=30, channel_pool_size=1)
+    publisher._conn = SimpleNamespace(is_closed=False)
+    publisher._channels = [SimpleNamespace(is_closed=False)]
+    publisher._exchanges = [exchange]
+    return publisher
+
+
+@pytest.mark.asyncio
+async def test_publish_many_pipelines_and_reports_failures():
+    exchange = StandInExchange(fail={"a7"})
+    publisher = _publisher(exchange)
+    events = [AssignmentStatusEvent(assignmentId=f"a{i}", status="completed") for i in range(50)]
+
+    results = await publisher.publish_many(events, window=8)
+
+    assert len(results) == 50
+    assert [i for i, r in enumerate(results) if r is not None] == [7]
+    assert len(exchange.published) == 49
+    assert 1 < exchange.max_in_flight <= 8
+
+
+@pytest.mark.asyncio
+async def test_publish_round_robin_over_channel_pool():
+    exchanges = [StandInExchange(rtt=0), StandInExchange(rtt=0)]
+    publisher = AssignmentPublisher(rabbitmq_url="amqp://stand-in", heartbeat=30, channel_pool_size=2)
+    publisher._conn = SimpleNamespace(is_closed=False)
+    publisher._channels = [SimpleNamespace(is_closed=False), SimpleNamespace(is_closed=False)]
+    publisher._exchanges = exchanges
+
+    for i in range(4):
+        await publisher.publish_assignment_status(assignmentId=f"a{i}", status="open")
+    assert [len(e.published) for e in exchanges] == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_fail_fast_with_single_background_reconnect(monkeypatch):
+    import aio_pika
+    from app.services.publisher_service import PublisherUnavailableError
+
+    attempts = []
+
+    async def broker_down(*args, **kwargs):
+        attempts.append(1)
+        raise ConnectionError("broker giù")
+
+    monkeypatch.setattr(aio_pika, "connect_robust", broker_down)
+    publisher = AssignmentPublisher(rabbitmq_url="amqp://stand-in", heartbeat=30, reconnect_delay=60)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(5):
+        with pytest.raises(PublisherUnavailableError):
+            await publisher.publish_assignment_status(assignmentId="a1", status="open")
+    assert loop.time() - start < 0.5
+
+    await asyncio.sleep(0.01)
+    assert len(attempts) == 1  # un solo supervisore, nessun retry nel path della richiesta
+    await publisher.close()
@@ -0,0 +1,54 @@
+# Il fast path usato sui documenti letti da Mongo (model_construct + dump JSON diretto) deve produrre
+# lo stesso JSON del percorso "validato" (Assignment(**doc) + rivalidazione del response_model + json.dumps).
+# I tempi dei due percorsi sono in test/benchmark/bench_serialization.py.
+import json
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from app.schemas.assignment import Assignment, AssignmentView, dump_views_json
+
+
+def _docs(n: int) -> List[dict]:
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    return [
+        {
+            "_id": f"oid-{i}",
+            "assignmentId": f"as-{i:05d}",
+            "teacherId": "t1",
+            "title": f"Compito {i}",
+            "description": "Descrizione",
+            "deadline": now + timedelta(days=7),
+            "students": [f"s{j}" for j in range(30)],
+            "content": "Testo " * 50,
+            "createdAt": now + timedelta(seconds=i),
+            "status": "open",
+            "completedAt": None,
+            "version": 1,
+            "updatedAt": now + timedelta(seconds=i),
+            "contentRef": None,
+            "contentLength": None,
+        }
+        for i in range(n)
+    ]
+
+
+_response_adapter = TypeAdapter(List[AssignmentView])
+
+
+def _validated_path(docs: List[dict]) -> bytes:
+    models = [Assignment(**{k: v for k, v in d.items() if k != "_id"}) for d in docs]
+    validated = _response_adapter.validate_python([m.model_dump() for m in models])
+    return json.dumps(_response_adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+
+def _fast_path(docs: List[dict]) -> bytes:
+    return dump_views_json([AssignmentView.model_construct(**d) for d in docs])
+
+
+@pytest.mark.parametrize("n", [0, 10, 1_000])
+def test_fast_path_matches_validated_path(n):
+    docs = _docs(n)
+    assert json.loads(_fast_path(docs)) == json.loads(_validated_path(docs))
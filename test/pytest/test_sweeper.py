@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from app.services.sweeper_service import DeadlineSweeper
+
+
+class BatchRepo:
+    """Restituisce gli ID scaduti a blocchi di `limit`, come update_assignment_state."""
+
+    def __init__(self, overdue):
+        self.overdue = list(overdue)
+        self.limits = []
+
+    async def update_assignment_state(self, ts, limit=None):
+        self.limits.append(limit)
+        batch, self.overdue = self.overdue[:limit], self.overdue[limit:]
+        return batch
+
+
+class RecordingPublisher:
+    def __init__(self, fail=()):
+        self.published = []
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def publish_assignment_status(self, assignmentId, status, teacherId=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        if assignmentId in self.fail:
+            raise RuntimeError("broker giù")
+        self.published.append((assignmentId, status))
+
+    async def publish_many(self, events, window=256):
+        semaphore = asyncio.Semaphore(window)
+
+        async def one(event):
+            async with semaphore:
+                await self.publish_assignment_status(event.assignmentId, event.status, event.teacherId)
+
+        return [
+            r if isinstance(r, BaseException) else None
+            for r in await asyncio.gather(*(one(e) for e in events), return_exceptions=True)
+        ]
+
+
+class StaticLease:
+    def __init__(self, held):
+        self.held = held
+        self.released = False
+
+    async def acquire(self):
+        return self.held
+
+    async def release(self):
+        self.released = True
+
+
+@pytest.mark.asyncio
+async def test_sweep_processes_all_batches_with_bounded_publish():
+    repo = BatchRepo([f"a{i}" for i in range(25)])
+    publisher = RecordingPublisher(fail={"a3"})
+    sweeper = DeadlineSweeper(repo, publisher, batch_size=10, publish_concurrency=4)
+
+    closed = await sweeper.sweep_once()
+
+    assert closed == [f"a{i}" for i in range(25)]
+    assert repo.limits == [10, 10, 10]
+    assert len(publisher.published) == 24
+    assert all(status == "completed" for _, status in publisher.published)
+    assert publisher.max_in_flight <= 4
+
+
+@pytest.mark.asyncio
+async def test_sweep_skipped_without_lease():
+    repo = BatchRepo(["a1"])
+    publisher = RecordingPublisher()
+    sweeper = DeadlineSweeper(repo, publisher, lease=StaticLease(held=False))
+
+    assert await sweeper.sweep_once() == []
+    assert repo.limits == []
+    assert publisher.published == []
+
+
+@pytest.mark.asyncio
+async def test_run_stops_and_releases_lease():
+    lease = StaticLease(held=True)
+    sweeper = DeadlineSweeper(BatchRepo([]), RecordingPublisher(), interval_seconds=60, lease=lease)
+    task = asyncio.create_task(sweeper.run())
+    await asyncio.sleep(0.01)
+    sweeper.stop()
+    await asyncio.wait_for(task, timeout=1)
+    assert lease.released
+
+
+class DeadlineRepo:
+    def __init__(self):
+        self.open = {}  # assignmentId -> deadline
+        self.sweeps = 0
+
+    async def update_assignment_state(self, ts, limit=None):
+        self.sweeps += 1
+        due = [aid for aid, d in self.open.items() if d < ts][:limit]
+        for aid in due:
+            del self.open[aid]
+        return due
+
+    async def upcoming_deadlines(self, after, limit):
+        return sorted(d for d in self.open.values() if d >= after)[:limit]
+
+
+@pytest.mark.asyncio
+async def test_timer_mode_closes_at_deadline_and_on_schedule():
+    from datetime import datetime, timedelta, timezone
+
+    repo = DeadlineRepo()
+    repo.open["a1"] = datetime.now(timezone.utc) + timedelta(milliseconds=50)
+    publisher = RecordingPublisher()
+    sweeper = DeadlineSweeper(repo, publisher, interval_seconds=60, mode="timer")
+    task = asyncio.create_task(sweeper.run())
+    try:
+        await asyncio.sleep(0.2)
+        assert publisher.published == [("a1", "completed")]
+
+        # nuova deadline notificata alla creazione: niente attesa della riconciliazione
+        deadline = datetime.now(timezone.utc) + timedelta(milliseconds=50)
+        repo.open["a2"] = deadline
+        sweeper.schedule(deadline)
+        await asyncio.sleep(0.2)
+        assert publisher.published[-1] == ("a2", "completed")
+        # riconciliazione iniziale + una passata per deadline, nessun polling
+        assert repo.sweeps == 3
+    finally:
+        sweeper.stop()
+        await asyncio.wait_for(task, timeout=1)
+
+
+def test_invalid_mode_rejected():
+    with pytest.raises(ValueError):
+        DeadlineSweeper(BatchRepo([]), RecordingPublisher(), mode="cron")
@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+import time
+
+import pytest
+
+jwt = pytest.importorskip("jwt")
+
+from app.services.token_service import InvalidTokenPayload, TokenVerifier  # noqa: E402
+
+SECRET = "unit-test-secret-unit-test-secret!"
+
+
+def _token(secret=SECRET, kid=None, **claims):
+    payload = {"sub": "u1", "role": "teacher", "exp": int(time.time()) + 60, **claims}
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(payload, secret, algorithm="HS256", headers=headers)
+
+
+def test_verified_tokens_are_cached_until_exp():
+    now = [time.time()]
+    verifier = TokenVerifier("HS256", key=SECRET, clock=lambda: now[0])
+    token = _token()
+
+    assert verifier.verify(token).user_id == "u1"
+    assert verifier.verify(token).role == "teacher"
+    assert verifier.stats()["hits"] == 1 and verifier.stats()["misses"] == 1
+
+    now[0] += 120  # oltre l'exp: la entry in cache non vale più, il token viene riverificato
+    verifier.verify(token)
+    assert verifier.stats()["misses"] == 2
+
+
+def test_expired_token_rejected():
+    verifier = TokenVerifier("HS256", key=SECRET)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(_token(exp=int(time.time()) - 10))
+
+
+def test_invalid_tokens_are_rejected_and_not_cached():
+    verifier = TokenVerifier("HS256", key=SECRET)
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(_token(secret="another-secret-another-secret-xx"))
+    with pytest.raises(InvalidTokenPayload):
+        verifier.verify(_token(role=None))
+    assert verifier.stats()["size"] == 0
+
+
+def _jwk(secret, kid):
+    k = base64.urlsafe_b64encode(secret.encode()).decode().rstrip("=")
+    return {"kty": "oct", "k": k, "kid": kid, "alg": "HS256"}
+
+
+def test_jwks_rotation_without_restart(tmp_path):
+    jwks = tmp_path / "jwks.json"
+    jwks.write_text(json.dumps({"keys": [_jwk(SECRET, "k1")]}))
+    now = [time.time()]
+    verifier = TokenVerifier("HS256", jwks_file=str(jwks), jwks_min_reload_seconds=5, clock=lambda: now[0])
+    assert verifier.verify(_token(kid="k1")).user_id == "u1"
+
+    rotated = "rotated-secret-rotated-secret-xxx"
+    jwks.write_text(json.dumps({"keys": [_jwk(SECRET, "k1"), _jwk(rotated, "k2")]}))
+    os.utime(jwks, (time.time() + 5, time.time() + 5))
+    now[0] += 10
+    assert verifier.verify(_token(secret=rotated, kid="k2")).user_id == "u1"
+
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(_token(kid="unknown"))
+
+
+@pytest.mark.parametrize("broken", ["deleted", "garbled", "empty"])
+def test_jwks_reload_failures_keep_the_previous_keys(tmp_path, monkeypatch, broken):
+    jwks = tmp_path / "jwks.json"
+    jwks.write_text(json.dumps({"keys": [_jwk(SECRET, "k1")]}))
+    now = [time.time()]
+    verifier = TokenVerifier("HS256", jwks_file=str(jwks), jwks_min_reload_seconds=5, clock=lambda: now[0])
+
+    if broken == "deleted":
+        jwks.unlink()
+    else:
+        jwks.write_text('{"keys": [' if broken == "garbled" else json.dumps({"keys": []}))
+        os.utime(jwks, (time.time() + 5, time.time() + 5))
+    now[0] += 10
+    # kid nuovo durante la rotazione: un InvalidTokenError (401), non un errore del server
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(_token(kid="k2"))
+    assert verifier.verify(_token(kid="k1")).user_id == "u1"
+
+    # kid a caso: al più una ricarica per intervallo
+    stats = []
+    monkeypatch.setattr(os, "stat", lambda *a, **kw: stats.append(a) or (_ for _ in ()).throw(OSError("nope")))
+    for _ in range(3):
+        with pytest.raises(jwt.InvalidTokenError):
+            verifier.verify(_token(kid="random"))
+    assert stats == []
+    now[0] += 10
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(_token(kid="random"))
+    assert len(stats) == 1
+
+
+def test_settings_require_a_verification_key(monkeypatch):
+    from pydantic import ValidationError
+
+    from app.core.config import Settings
+
+    monkeypatch.delenv("JWT_PUBLIC_KEY", raising=False)
+    monkeypatch.delenv("JWT_JWKS_FILE", raising=False)
+    with pytest.raises(ValidationError, match="JWT_PUBLIC_KEY"):
+        Settings()
+    assert Settings(jwt_jwks_file="/etc/jwks.json").jwt_jwks_file == "/etc/jwks.json"
+    assert Settings(jwt_public_key=SECRET).jwt_public_key == SECRET
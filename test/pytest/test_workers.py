@@ -0,0 +1,39 @@
+import pytest
+
+from app.core.workers import claim_background_role
+
+
+def test_single_background_worker_per_lock_file(tmp_path):
+    lock_file = str(tmp_path / "background.lock")
+
+    first = claim_background_role("auto", lock_file)
+    assert first is not None
+    assert claim_background_role("auto", lock_file) is None  # un altro worker: solo HTTP
+
+    first.release()
+    second = claim_background_role("auto", lock_file)  # il ruolo passa al prossimo worker
+    assert second is not None
+    second.release()
+
+
+def test_explicit_modes(tmp_path):
+    lock_file = str(tmp_path / "background.lock")
+    assert claim_background_role("never", lock_file) is None
+    assert claim_background_role("always", lock_file) is not None
+    assert claim_background_role("always", lock_file) is not None  # nessun lock
+    with pytest.raises(ValueError):
+        claim_background_role("sometimes", lock_file)
+
+
+def test_in_process_events_require_a_single_worker():
+    from pydantic import ValidationError
+
+    from app.core.config import Settings
+
+    with pytest.raises(ValidationError, match="WEB_WORKERS=1"):
+        Settings(web_workers=4, events_source="in_process")
+    with pytest.raises(ValidationError, match="WEB_WORKERS=1"):
+        Settings(web_workers=0, events_source="in_process")  # una per CPU
+    assert Settings(web_workers=1, events_source="in_process").web_workers == 1
+    assert Settings(web_workers=4, events_source="in_process", events_enabled=False).web_workers == 4
+    assert Settings(web_workers=4).events_source == "auto"